@@ -0,0 +1,98 @@
+"""
+Бенчмарк /embeddings: перебор размера пакета и числа параллельных запросов.
+
+Для каждой комбинации выводятся векторов в секунду и задержка пакета.
+По умолчанию работает против локальной заглушки (tests/stub_server.py) с
+задержкой, похожей на настоящий API; с --real - против GigaChat API
+(настройки из .env, как у тестов).
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_embeddings
+    python -m benchmarks.bench_embeddings --texts 2048 --batch-sizes 16,64,256 --concurrency 1,4,8
+    python -m benchmarks.bench_embeddings --real --model EmbeddingsGigaR --json results.json
+"""
+import argparse
+import json
+import time
+
+from tests.embeddings import DEFAULT_MODEL, EmbeddingsClient, throughput
+from tests.http_client import GigaChatSession
+from tests.stub_server import StubConfig, StubServer
+
+
+def _int_list(value):
+    return [int(v) for v in value.split(",") if v]
+
+
+def run(client, texts, batch_sizes, concurrencies):
+    """
+    Перебирает все комбинации и возвращает список сводок throughput.
+    Векторы сразу отбрасываются - бенчмарк не держит их в памяти.
+    """
+    results = []
+    for batch_size in batch_sizes:
+        for concurrency in concurrencies:
+            started = time.perf_counter()
+            batches = []
+            vector_bytes = 0
+            for batch in client.iter_batches(texts, batch_size, concurrency):
+                if batch.vectors is not None:
+                    vector_bytes = max(vector_bytes, batch.vectors.nbytes // max(1, len(batch.vectors)))
+                batch.vectors = batch.data = None
+                batches.append(batch)
+            summary = throughput(batches, time.perf_counter() - started)
+            results.append({"batch_size": batch_size, "concurrency": concurrency,
+                            "bytes_per_vector": vector_bytes, **summary})
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк GigaChat /embeddings")
+    parser.add_argument("--texts", type=int, default=512, help="Сколько текстов отправить в каждой комбинации")
+    parser.add_argument("--batch-sizes", type=_int_list, default=[1, 8, 32, 128])
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 2, 4])
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--real", action="store_true", help="Против настоящего API, а не заглушки")
+    parser.add_argument("--stub-latency", default="lognormal:0.15,0.3",
+                        help="Задержка заглушки на запрос (см. stub_server.parse_latency)")
+    parser.add_argument("--stub-item-delay", type=float, default=0.002,
+                        help="Дополнительная задержка заглушки на каждый текст пакета, сек")
+    parser.add_argument("--json", help="Сохранить результаты в JSON файл")
+    args = parser.parse_args(argv)
+
+    texts = [f"Документ {i}: текст для индексации, пример строки корпуса номер {i}" for i in range(args.texts)]
+    pool_maxsize = max(args.concurrency)
+    stub = None
+    if args.real:
+        from tests.conftest import GIGACHAT_API_BASE_URL, fetch_token, get_verify_setting, make_api_headers
+
+        session = GigaChatSession(verify=get_verify_setting(), pool_maxsize=pool_maxsize)
+        token = fetch_token(session)["access_token"]
+        base_url = GIGACHAT_API_BASE_URL
+    else:
+        stub = StubServer(StubConfig(latency=args.stub_latency, token_delay=args.stub_item_delay)).start()
+        from tests.conftest import fetch_token, make_api_headers
+
+        session = GigaChatSession(pool_maxsize=pool_maxsize)
+        token = fetch_token(session, stub.oauth_url, stub.basic_auth_token)["access_token"]
+        base_url = stub.base_url
+
+    client = EmbeddingsClient(session, base_url, lambda: make_api_headers(token), model=args.model)
+    try:
+        results = run(client, texts, args.batch_sizes, args.concurrency)
+    finally:
+        session.close()
+        if stub is not None:
+            stub.stop()
+
+    print(f"{'batch':>6}{'потоки':>8}{'векторов/с':>12}{'p50, с':>9}{'p95, с':>9}{'ошибки':>8}{'байт/вектор':>13}")
+    for r in results:
+        print(f"{r['batch_size']:>6}{r['concurrency']:>8}{r['vectors_per_sec'] or 0:>12.1f}"
+              f"{r['latency_p50'] or 0:>9.3f}{r['latency_p95'] or 0:>9.3f}{r['errors']:>8}{r['bytes_per_vector']:>13}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
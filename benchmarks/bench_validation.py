@@ -0,0 +1,51 @@
+"""
+Микробенчмарк валидации ответа chat/completions.
+
+Сравнивает jsonschema.validate (как было в тестах) с реестром валидаторов
+tests/validators.py: быстрой проверкой и скомпилированным валидатором.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_validation [количество_итераций]
+"""
+import sys
+import timeit
+
+import jsonschema
+
+from tests import validators
+from tests.schemas import schema_chat_completion
+
+SAMPLE_RESPONSE = {
+    "object": "chat.completion",
+    "created": 1760000000,
+    "model": "GigaChat-2:2.0.28.2",
+    "choices": [
+        {
+            "index": 0,
+            "message": {"role": "assistant", "content": "Все отлично, спасибо! " * 20},
+            "finish_reason": "stop",
+        }
+    ],
+    "usage": {"prompt_tokens": 18, "completion_tokens": 120, "total_tokens": 138},
+}
+
+
+def main(number=2000):
+    compiled = validators.get_validator(schema_chat_completion)
+    cases = {
+        "jsonschema.validate": lambda: jsonschema.validate(instance=SAMPLE_RESPONSE,
+                                                           schema=schema_chat_completion),
+        "compiled validator": lambda: compiled.validate(SAMPLE_RESPONSE),
+        "validators.validate (fast path)": lambda: validators.validate(instance=SAMPLE_RESPONSE,
+                                                                       schema=schema_chat_completion),
+    }
+    baseline = None
+    print(f"{'вариант':<34}{'мкс/вызов':>12}{'ускорение':>12}")
+    for name, func in cases.items():
+        per_call = min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+        baseline = baseline or per_call
+        print(f"{name:<34}{per_call:>12.1f}{baseline / per_call:>11.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,50 @@
+"""
+Сводные результаты прогона в отчете Allure.
+
+Отчеты уровня всей сессии (регрессии производительности и т.п.) не относятся
+ни к одному тесту, поэтому публикуем их отдельным результатом с вложениями
+в разделе "Сводка прогона". Работает только при запуске с --alluredir,
+иначе ничего не делает.
+"""
+import hashlib
+import time
+import uuid
+
+import allure
+from allure_commons import plugin_manager
+from allure_commons.model2 import Attachment, Label, Status, StatusDetails, TestResult
+
+SUMMARY_FEATURE = "Сводка прогона"
+
+
+def report_summary(name, attachments, passed=True, message=None, description=None):
+    """
+    Публикует в Allure отдельный результат с вложениями.
+
+    attachments: список (имя, содержимое, allure.attachment_type)
+    passed: False - результат помечается как упавший (например, сработал gate)
+    """
+    now = int(time.time() * 1000)
+    result = TestResult(
+        name=name,
+        uuid=str(uuid.uuid4()),
+        fullName=f"gigachat.summary.{name}",
+        historyId=hashlib.md5(f"gigachat.summary.{name}".encode()).hexdigest(),
+        status=Status.PASSED if passed else Status.FAILED,
+        statusDetails=StatusDetails(message=message) if message else None,
+        description=description,
+        start=now,
+        stop=now,
+        labels=[Label(name="feature", value=SUMMARY_FEATURE), Label(name="suite", value=SUMMARY_FEATURE)],
+    )
+    for attachment_name, body, attachment_type in attachments:
+        file_name = f"{uuid.uuid4()}-attachment.{attachment_type.extension}"
+        plugin_manager.hook.report_attached_data(body=body, file_name=file_name)
+        result.attachments.append(Attachment(name=attachment_name, source=file_name,
+                                             type=attachment_type.mime_type))
+    plugin_manager.hook.report_result(result=result)
+
+
+TEXT = allure.attachment_type.TEXT
+JSON = allure.attachment_type.JSON
+CSV = allure.attachment_type.CSV
@@ -0,0 +1,129 @@
+"""
+Одновременная отправка независимых запросов к GigaChat API.
+
+Параметризованные кейсы (temperature, model) не зависят друг от друга, но
+pytest выполняет их по очереди, и почти все время уходит на ожидание генерации.
+Здесь запросы всех кейсов группы отправляются одновременно (с ограничением
+параллельности), а каждый кейс затем проверяет свой ответ как обычно -
+с собственными assert и шагами Allure.
+"""
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_CONCURRENCY = 4
+
+
+class ConcurrentGigaChatClient:
+    """
+    Клиент поверх GigaChatSession для одновременной отправки запросов.
+
+    Запросы выполняются в пуле потоков через общую сессию (и ее пул соединений),
+    одновременно выполняется не больше concurrency запросов - по числу потоков пула.
+    """
+
+    def __init__(self, session, concurrency=DEFAULT_CONCURRENCY):
+        self.session = session
+        self.concurrency = concurrency
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="gigachat")
+
+    def run(self, url, requests):
+        """
+        requests: dict ключ -> (payload, headers).
+        Возвращает dict ключ -> Response, либо исключение, если запрос упал.
+        """
+        futures = {key: self._executor.submit(self.session.post, url, json=payload, headers=headers)
+                   for key, (payload, headers) in requests.items()}
+        results = {}
+        for key, future in futures.items():
+            try:
+                results[key] = future.result()
+            except Exception as e:
+                results[key] = e
+        return results
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+class ParallelCases:
+    """
+    Одновременное выполнение запросов параметризованного теста.
+
+    Первый выполняемый кейс группы отправляет запросы сразу для всех кейсов
+    этого теста из scheduled, остальные кейсы забирают уже готовые ответы.
+
+    scheduled: тесты, которые выполнит этот процесс (после отбора -k/-m, шардов
+    и т.п.); пустой список - заранее запросы не отправляются
+    prefetch_limit: функция без аргументов, сколько запросов (вместе с текущим)
+    еще можно отправить, например по остатку бюджета токенов; None - без предела.
+    Заранее отправляются только первые по порядку выполнения кейсы в пределах
+    лимита, остальные отправят свой запрос сами, когда до них дойдет очередь.
+    """
+
+    def __init__(self, client, on_response=None, prefetch_limit=None, scheduled=()):
+        self.client = client
+        self.scheduled = scheduled
+        self.on_response = on_response
+        self.prefetch_limit = prefetch_limit
+        self._results = {}
+
+    @staticmethod
+    def _group(item):
+        return item.parent.nodeid, item.originalname
+
+    def post(self, request, url, build_payload, argname, headers):
+        """
+        Возвращает ответ для текущего кейса.
+
+        build_payload: функция значение параметра -> тело запроса
+        argname: имя параметра, по которому параметризован тест
+        headers: заголовки текущего кейса, X-Request-ID генерируется на каждый запрос
+        """
+        group = self._group(request.node)
+        value = request.node.callspec.params[argname]
+        results = self._results.get(group)
+        if results is None or value not in results:
+            # Кейс перезапускается (ответ уже использован) или заранее отправлять нельзя
+            cases = {value: request.node}
+            limit = None if self.prefetch_limit is None else self.prefetch_limit()
+            if results is None and (limit is None or limit > 1):
+                others = [item for item in self.scheduled if self._group(item) == group
+                          and hasattr(item, "callspec") and item.callspec.params[argname] != value]
+                cases.update({item.callspec.params[argname]: item for item in others[:None if limit is None
+                                                                                    else limit - 1]})
+            batch = {v: (build_payload(v), {**headers, "X-Request-ID": str(uuid.uuid4())}) for v in cases}
+            results = self._results.setdefault(group, {})
+            for v, result in self.client.run(url, batch).items():
+                results[v] = (cases[v], result)
+
+        _, result = results.pop(value)
+        if isinstance(result, BaseException):
+            raise result
+        if self.on_response is not None:
+            self.on_response(result)
+        return result
+
+    def leftovers(self):
+        """
+        Ответы, полученные заранее для кейсов, которые так и не выполнились
+        (например, пропущены после исчерпания бюджета): список (кейс, ответ).
+        """
+        left = [(item, result) for results in self._results.values() for item, result in results.values()
+                if not isinstance(result, BaseException)]
+        self._results.clear()
+        return left
+
+    def post_all(self, url, build_payload, values, headers):
+        """
+        Одновременно отправляет запросы для всех values внутри одного теста
+        (например, один промпт во все модели). Возвращает dict значение -> Response;
+        если запрос упал, исключение пробрасывается.
+        """
+        batch = {v: (build_payload(v), {**headers, "X-Request-ID": str(uuid.uuid4())}) for v in values}
+        results = self.client.run(url, batch)
+        for result in results.values():
+            if isinstance(result, BaseException):
+                raise result
+            if self.on_response is not None:
+                self.on_response(result)
+        return results
@@ -0,0 +1,159 @@
+"""
+Вложения запросов и ответов в отчет Allure.
+
+Тела запросов и ответов каждого теста складываются в кольцевой буфер
+ограниченного размера и пишутся в Allure только при падении теста (или всегда,
+если так задано опцией --gigachat-attach). Большие тела обрезаются, а тела
+больше порога сжимаются gzip - так каталог allure-results не разрастается
+на зеленых прогонах, а у упавших тестов запрос и ответ под рукой.
+
+Учитывается время записи вложений и их объем; размер каталога allure-results
+выводится в конце прогона.
+"""
+import gzip
+import json
+import os
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+import allure
+
+MODES = ("failure", "always", "never")
+DEFAULT_BUFFER_SIZE = 16
+DEFAULT_MAX_KB = 256
+DEFAULT_GZIP_KB = 32
+TRUNCATED_MARKER = b"\n... [truncated, %d bytes total]"
+
+
+def directory_size(path):
+    """
+    Размер файлов каталога в байтах и их число (без подкаталогов).
+    """
+    total = files = 0
+    try:
+        entries = os.scandir(path)
+    except OSError:
+        return 0, 0
+    with entries:
+        for entry in entries:
+            if entry.is_file():
+                total += entry.stat().st_size
+                files += 1
+    return total, files
+
+
+def _as_bytes(body):
+    if body is None:
+        return b""
+    if isinstance(body, str):
+        return body.encode("utf-8")
+    if isinstance(body, (bytes, bytearray)):
+        return bytes(body)
+    # Генераторы и файлы (потоковые тела) не читаем
+    return f"<{type(body).__name__}>".encode()
+
+
+class AttachmentManager:
+    """
+    Буфер вложений текущего теста.
+
+    mode: "failure" - писать только для упавших тестов, "always", "never"
+    buffer_size: сколько последних тел хранится на тест (запрос и ответ - два тела)
+    max_bytes: тела длиннее обрезаются (при добавлении в буфер, чтобы ограничить память)
+    gzip_bytes: тела длиннее сжимаются gzip при записи в Allure
+    """
+
+    def __init__(self, mode="failure", buffer_size=DEFAULT_BUFFER_SIZE, max_bytes=DEFAULT_MAX_KB * 1024,
+                 gzip_bytes=DEFAULT_GZIP_KB * 1024):
+        if mode not in MODES:
+            raise ValueError(f"Неизвестный режим вложений: {mode}")
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.gzip_bytes = gzip_bytes
+        self._buffer = deque(maxlen=buffer_size)
+        self._exchanges = 0
+        self._lock = threading.Lock()
+        self.written = 0
+        self.written_bytes = 0
+        self.dropped = 0
+        self.attach_time = 0.0
+
+    def observe(self, request, response):
+        """
+        Наблюдатель GigaChatSession.add_observer. Запросы из пула потоков
+        (ParallelCases) добавляются, когда тест забирает свой ответ (см. record).
+        """
+        if self.mode == "never" or threading.current_thread() is not threading.main_thread():
+            return
+        self.record(response)
+
+    def record(self, response):
+        """
+        Добавляет тела запроса и ответа в буфер текущего теста.
+        """
+        if self.mode == "never" or getattr(response, "attachments_recorded", False):
+            return
+        response.attachments_recorded = True
+        request = response.request
+        stream = (getattr(response, "timings", None) or {}).get("stream")
+        with self._lock:
+            self._exchanges += 1
+            suffix = f" #{self._exchanges}" if self._exchanges > 1 else ""
+            label = f"{request.method} {urlsplit(request.url).path}"
+            self._add(f"request_body{suffix}", label, _as_bytes(request.body))
+            body = b"<stream>" if stream else response.content
+            self._add(f"response_body{suffix}", f"{label} -> {response.status_code}", body)
+
+    def _add(self, name, label, body):
+        if len(body) > self.max_bytes:
+            body = body[:self.max_bytes] + TRUNCATED_MARKER % len(body)
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+        self._buffer.append((name, label, body))
+
+    def start_test(self):
+        with self._lock:
+            self._buffer.clear()
+            self._exchanges = 0
+
+    def flush(self, failed):
+        """
+        Пишет буфер в Allure, если тест упал или режим always, и очищает буфер.
+        """
+        with self._lock:
+            entries = list(self._buffer)
+            self._buffer.clear()
+        if not entries or self.mode == "never" or (self.mode == "failure" and not failed):
+            return
+        started = time.perf_counter()
+        for name, label, body in entries:
+            self._attach(name, label, body)
+        self.attach_time += time.perf_counter() - started
+
+    def _attach(self, name, label, body):
+        if len(body) > self.gzip_bytes:
+            data = gzip.compress(body, compresslevel=6)
+            allure.attach(data, name=f"{name} [{label}] (gzip)", attachment_type="application/gzip",
+                          extension="json.gz")
+        else:
+            try:
+                data = json.dumps(json.loads(body), ensure_ascii=False, indent=2)
+                attachment_type = allure.attachment_type.JSON
+            except ValueError:
+                data = body.decode("utf-8", errors="replace")
+                attachment_type = allure.attachment_type.TEXT
+            allure.attach(data, name=f"{name} [{label}]", attachment_type=attachment_type)
+            data = data.encode("utf-8")
+        self.written += 1
+        self.written_bytes += len(data)
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "written": self.written,
+            "written_bytes": self.written_bytes,
+            "dropped": self.dropped,
+            "attach_time": round(self.attach_time, 4),
+        }
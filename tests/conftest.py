@@ -1,16 +1,412 @@
+import functools
+import json
 import os
+import re
+import time
 import uuid
 import pytest
-from dotenv import load_dotenv
-import requests
+from urllib.parse import urlsplit
 
-# Загружаем переменные окружения из .env файла
-load_dotenv()
+# Момент загрузки conftest - от него считается время до первого запроса
+STARTED = time.perf_counter()
 
-GIGACHAT_BASIC_AUTH_TOKEN = os.getenv('GIGACHAT_BASIC_AUTH_TOKEN')
-GIGACHAT_API_BASE_URL = os.getenv('GIGACHAT_API_BASE_URL', 'https://gigachat.devices.sberbank.ru/api/v1')
-GIGACHAT_OAUTH_URL = os.getenv('GIGACHAT_OAUTH_URL', 'https://ngw.devices.sberbank.ru:9443/api/v2/oauth')
-GIGACHAT_SSL_CERT = os.getenv('GIGACHAT_SSL_CERT')  # Путь к SSL сертификату (.pem файл)
+# Настройки из окружения и их значения по умолчанию.
+# GIGACHAT_SSL_CERT - путь к SSL сертификату (.pem файл)
+SETTINGS = {
+    'GIGACHAT_BASIC_AUTH_TOKEN': None,
+    'GIGACHAT_API_BASE_URL': 'https://gigachat.devices.sberbank.ru/api/v1',
+    'GIGACHAT_OAUTH_URL': 'https://ngw.devices.sberbank.ru:9443/api/v2/oauth',
+    'GIGACHAT_SSL_CERT': None,
+}
+# Опции, которые можно задать и переменной окружения:
+# опция -> (переменная, преобразование значения, значение по умолчанию).
+# Заполняется в pytest_addoption, значения подставляются в pytest_configure.
+ENV_OPTIONS = {}
+
+
+@functools.lru_cache(maxsize=None)
+def load_env():
+    """
+    Загружает переменные окружения из .env файла (один раз за процесс).
+    .env ищется, как в load_dotenv(): от каталога tests вверх.
+    Без .env файла python-dotenv даже не импортируется.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    while True:
+        path = os.path.join(directory, ".env")
+        if os.path.isfile(path):
+            from dotenv import load_dotenv
+
+            load_dotenv(path)
+            return
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return
+        directory = parent
+
+
+def setting(name, default=None):
+    """
+    Значение настройки из окружения (и .env) или по умолчанию (из SETTINGS).
+    .env читается при первом обращении к настройке, которой нет в окружении.
+    """
+    if name not in os.environ:
+        load_env()
+    return os.getenv(name, SETTINGS.get(name, default))
+
+
+def __getattr__(name):
+    # GIGACHAT_API_BASE_URL и другие настройки доступны как атрибуты модуля
+    # (from tests.conftest import GIGACHAT_API_BASE_URL), но читаются лениво
+    if name in SETTINGS:
+        return setting(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def stub_enabled(config):
+    """
+    Тесты идут против локальной заглушки: --gigachat-stub или GIGACHAT_API_BASE_URL=stub.
+    """
+    return bool(config.getoption("--gigachat-stub")) or setting("GIGACHAT_API_BASE_URL") == "stub"
+
+
+def resolve_env_options(config):
+    """
+    Подставляет в незаданные опции из ENV_OPTIONS значения переменных окружения
+    (или значения по умолчанию), чтобы дальше читать их через config.getoption.
+    """
+    for name, (env, convert, default) in ENV_OPTIONS.items():
+        if config.getoption(name) is not None:
+            continue
+        value = setting(env)
+        if value:
+            value = convert(value) if convert is not None else value
+        else:
+            value = default
+        setattr(config.option, name.lstrip("-").replace("-", "_"), value)
+
+
+def pytest_addoption(parser):
+    # Модули плагинов импортируются здесь, а не при загрузке conftest:
+    # из них нужны только значения по умолчанию для справки по опциям
+    from . import (async_client, attachments, embeddings, loadgen, metrics, perf_baseline, profiling,
+                   replay_cache, similarity, soak, throttle, token_usage)
+
+    group = parser.getgroup("gigachat")
+
+    def env_option(name, env, default=None, **kwargs):
+        # Значение из окружения подставляется в pytest_configure: .env
+        # читается только тогда, а не при разборе командной строки
+        ENV_OPTIONS[name] = (env, kwargs.get("type", bool if kwargs.get("action") == "store_true" else None),
+                             default)
+        group.addoption(name, default=None, **kwargs)
+
+    group.addoption(
+        "--gigachat-concurrency", type=int, default=async_client.DEFAULT_CONCURRENCY,
+        help="Сколько запросов параметризованных кейсов отправлять одновременно "
+             f"(по умолчанию {async_client.DEFAULT_CONCURRENCY}, 1 - последовательно)",
+    )
+    group.addoption(
+        "--gigachat-stub", action="store_true", default=False,
+        help="Запускать тесты против локальной заглушки GigaChat API (tests/stub_server.py) "
+             "вместо настоящего API. То же самое: GIGACHAT_API_BASE_URL=stub",
+    )
+    group.addoption(
+        "--gigachat-ttft-limit", type=float, default=10.0,
+        help="Максимальное время до первого токена в потоковом ответе, сек (по умолчанию 10)",
+    )
+    group.addoption(
+        "--gigachat-chunk-gap-limit", type=float, default=5.0,
+        help="Максимальная пауза между чанками потокового ответа, сек (по умолчанию 5)",
+    )
+    group.addoption(
+        "--gigachat-stream-limit", type=float, default=60.0,
+        help="Максимальная длительность потокового ответа, сек (по умолчанию 60)",
+    )
+    group.addoption(
+        "--gigachat-load-mode", choices=loadgen.MODES, default="closed",
+        help="Режим нагрузки для тестов с меткой load: closed (фиксированное число потоков) "
+             "или open (фиксированная частота запросов)",
+    )
+    group.addoption(
+        "--gigachat-load-rps", type=float, default=1.0,
+        help="Целевая частота запросов в режиме open (по умолчанию 1)",
+    )
+    group.addoption(
+        "--gigachat-load-concurrency", type=int, default=4,
+        help="Число потоков (closed) или предел одновременных запросов (open), по умолчанию 4",
+    )
+    group.addoption(
+        "--gigachat-load-duration", type=float, default=30.0,
+        help="Длительность нагрузки, сек (по умолчанию 30)",
+    )
+    group.addoption(
+        "--gigachat-load-ramp-up", type=float, default=0.0,
+        help="Время разгона нагрузки, сек (по умолчанию 0)",
+    )
+    group.addoption(
+        "--gigachat-load-max-error-rate", type=float, default=0.05,
+        help="Допустимая доля ошибок под нагрузкой (по умолчанию 0.05)",
+    )
+    group.addoption(
+        "--gigachat-load-p99-limit", type=float, default=None,
+        help="Допустимый p99 задержки под нагрузкой, сек (по умолчанию не проверяется)",
+    )
+    group.addoption(
+        "--gigachat-metrics-dir", default=metrics.DEFAULT_DIR,
+        help="Каталог для JSON-lines файлов с метриками запросов, по файлу на прогон "
+             f"(по умолчанию {metrics.DEFAULT_DIR}, пустая строка - не писать)",
+    )
+    env_option(
+        "--gigachat-replay", "GIGACHAT_REPLAY", "off", choices=replay_cache.MODES,
+        help="Режим кэша ответов для тестов с меткой replayable: "
+             "off, record, replay, refresh-stale (по умолчанию off или GIGACHAT_REPLAY)",
+    )
+    group.addoption(
+        "--gigachat-replay-dir", default=replay_cache.DEFAULT_DIR,
+        help=f"Каталог кэша ответов (по умолчанию {replay_cache.DEFAULT_DIR})",
+    )
+    group.addoption(
+        "--gigachat-replay-ttl", type=float, default=replay_cache.DEFAULT_TTL_HOURS,
+        help="Через сколько часов запись считается устаревшей в режиме refresh-stale "
+             f"(по умолчанию {replay_cache.DEFAULT_TTL_HOURS})",
+    )
+    group.addoption(
+        "--gigachat-replay-max-age", type=float, default=replay_cache.DEFAULT_MAX_AGE_DAYS,
+        help=f"Записи старше стольких дней удаляются (по умолчанию {replay_cache.DEFAULT_MAX_AGE_DAYS})",
+    )
+    group.addoption(
+        "--gigachat-replay-max-mb", type=float, default=replay_cache.DEFAULT_MAX_MB,
+        help=f"Максимальный размер кэша ответов в МБ (по умолчанию {replay_cache.DEFAULT_MAX_MB})",
+    )
+    env_option(
+        "--gigachat-throttle", "GIGACHAT_THROTTLE", False, action="store_true",
+        help="Согласовывать запросы всех воркеров через общий файл состояния: окно AIMD, "
+             "пауза по Retry-After, повтор 429 и 5xx (по умолчанию выключено или GIGACHAT_THROTTLE)",
+    )
+    env_option(
+        "--gigachat-throttle-state", "GIGACHAT_THROTTLE_STATE", throttle.DEFAULT_STATE_PATH,
+        help="Файл состояния ограничителя, общий для воркеров "
+             f"(по умолчанию {throttle.DEFAULT_STATE_PATH} или GIGACHAT_THROTTLE_STATE)",
+    )
+    group.addoption(
+        "--gigachat-throttle-concurrency", type=int, default=throttle.DEFAULT_CONCURRENCY,
+        help="Максимум одновременных запросов на все воркеры "
+             f"(по умолчанию {throttle.DEFAULT_CONCURRENCY})",
+    )
+    group.addoption(
+        "--gigachat-throttle-rps", type=float, default=0.0,
+        help="Максимальная частота запросов на все воркеры (по умолчанию 0 - без ограничения)",
+    )
+    group.addoption(
+        "--gigachat-retry-budget", type=float, default=throttle.DEFAULT_RETRY_BUDGET,
+        help="Сколько секунд на запрос можно потратить на повторы после 429 и 5xx "
+             f"(по умолчанию {throttle.DEFAULT_RETRY_BUDGET})",
+    )
+    env_option(
+        "--gigachat-corpus", "GIGACHAT_CORPUS",
+        help="JSON-lines файл регрессионного корпуса запросов для tests/test_corpus.py, "
+             "формат описан в tests/corpus.py (по умолчанию не запускается или GIGACHAT_CORPUS)",
+    )
+    env_option(
+        "--gigachat-shard-index", "GIGACHAT_SHARD_INDEX", 0, type=int,
+        help="Номер шарда этого узла, от 0 (по умолчанию 0 или GIGACHAT_SHARD_INDEX)",
+    )
+    env_option(
+        "--gigachat-shard-count", "GIGACHAT_SHARD_COUNT", 1, type=int,
+        help="Число узлов, между которыми по хэшу делятся тесты и кейсы корпуса "
+             "(по умолчанию 1 или GIGACHAT_SHARD_COUNT)",
+    )
+    group.addoption(
+        "--gigachat-similarity-threshold", type=float, default=similarity.DEFAULT_THRESHOLD,
+        help="Порог сходства ответов разных моделей (MinHash, 0..1), выше которого ответы считаются "
+             f"почти одинаковыми (по умолчанию {similarity.DEFAULT_THRESHOLD})",
+    )
+    env_option(
+        "--gigachat-embeddings-model", "GIGACHAT_EMBEDDINGS_MODEL", embeddings.DEFAULT_MODEL,
+        help="Модель для тестов эмбеддингов "
+             f"(по умолчанию {embeddings.DEFAULT_MODEL} или GIGACHAT_EMBEDDINGS_MODEL)",
+    )
+    env_option(
+        "--gigachat-attach", "GIGACHAT_ATTACH", "failure", choices=attachments.MODES,
+        help="Когда прикреплять тела запросов и ответов к Allure: failure - только у упавших тестов, "
+             "always, never (по умолчанию failure или GIGACHAT_ATTACH)",
+    )
+    group.addoption(
+        "--gigachat-attach-buffer", type=int, default=attachments.DEFAULT_BUFFER_SIZE,
+        help=f"Сколько последних тел хранить на тест (по умолчанию {attachments.DEFAULT_BUFFER_SIZE})",
+    )
+    group.addoption(
+        "--gigachat-attach-max-kb", type=int, default=attachments.DEFAULT_MAX_KB,
+        help=f"Тела больше стольких КБ обрезаются (по умолчанию {attachments.DEFAULT_MAX_KB})",
+    )
+    group.addoption(
+        "--gigachat-attach-gzip-kb", type=int, default=attachments.DEFAULT_GZIP_KB,
+        help=f"Тела больше стольких КБ сжимаются gzip (по умолчанию {attachments.DEFAULT_GZIP_KB})",
+    )
+    group.addoption(
+        "--gigachat-profile", action="store_true", default=False,
+        help="Профилировать тесты по фазам (фикстуры, шаги Allure, HTTP, JSON, схема, вложения) "
+             "и вывести сводную таблицу в конце прогона",
+    )
+    group.addoption(
+        "--gigachat-profile-cprofile", type=int, default=0,
+        help="Сохранить профиль cProfile для стольких самых медленных тестов (по умолчанию 0 - нет)",
+    )
+    group.addoption(
+        "--gigachat-profile-dir", default=profiling.DEFAULT_DIR,
+        help=f"Каталог для phases.json и .prof файлов (по умолчанию {profiling.DEFAULT_DIR})",
+    )
+    group.addoption(
+        "--gigachat-baseline", default=perf_baseline.DEFAULT_PATH,
+        help="Файл базовой линии длительностей тестов для поиска регрессий между сборками "
+             f"(по умолчанию {perf_baseline.DEFAULT_PATH}, пустая строка - не вести)",
+    )
+    group.addoption(
+        "--gigachat-baseline-window", type=int, default=perf_baseline.DEFAULT_WINDOW,
+        help=f"Сколько последних прогонов хранить на тест (по умолчанию {perf_baseline.DEFAULT_WINDOW})",
+    )
+    group.addoption(
+        "--gigachat-baseline-min-samples", type=int, default=perf_baseline.DEFAULT_MIN_SAMPLES,
+        help="Минимум прогонов в базовой линии для сравнения "
+             f"(по умолчанию {perf_baseline.DEFAULT_MIN_SAMPLES})",
+    )
+    group.addoption(
+        "--gigachat-baseline-accept-after", type=int, default=perf_baseline.DEFAULT_ACCEPT_AFTER,
+        help="После стольких регрессий подряд новый уровень принимается за базовую линию "
+             f"(по умолчанию {perf_baseline.DEFAULT_ACCEPT_AFTER})",
+    )
+    group.addoption(
+        "--gigachat-regression-z", type=float, default=perf_baseline.DEFAULT_Z,
+        help=f"Порог z-оценки для регрессии (по умолчанию {perf_baseline.DEFAULT_Z})",
+    )
+    group.addoption(
+        "--gigachat-regression-ratio", type=float, default=perf_baseline.DEFAULT_RATIO,
+        help=f"Минимальный относительный рост для регрессии (по умолчанию {perf_baseline.DEFAULT_RATIO})",
+    )
+    group.addoption(
+        "--gigachat-regression-min-delta", type=float, default=perf_baseline.DEFAULT_MIN_DELTA,
+        help=f"Минимальный абсолютный рост для регрессии, сек (по умолчанию {perf_baseline.DEFAULT_MIN_DELTA})",
+    )
+    group.addoption(
+        "--gigachat-perf-gate", action="store_true", default=False,
+        help="Ронять прогон (код возврата 1), если найдены регрессии производительности",
+    )
+    env_option(
+        "--gigachat-token-budget", "GIGACHAT_TOKEN_BUDGET", type=int,
+        help="Бюджет токенов на прогон, общий для воркеров и шардов: после его исчерпания тесты "
+             "с меткой expensive пропускаются (по умолчанию без ограничения или GIGACHAT_TOKEN_BUDGET)",
+    )
+    env_option(
+        "--gigachat-token-budget-file", "GIGACHAT_TOKEN_BUDGET_FILE", token_usage.DEFAULT_BUDGET_PATH,
+        help="Файл общего расхода токенов прогона; шардам на разных машинах - путь на общем диске "
+             f"(по умолчанию {token_usage.DEFAULT_BUDGET_PATH} или GIGACHAT_TOKEN_BUDGET_FILE, "
+             "пустая строка - бюджет на каждый процесс)",
+    )
+    env_option(
+        "--gigachat-run-id", "GIGACHAT_RUN_ID",
+        help="id прогона для общих файлов состояния (бюджет токенов, ограничитель запросов): состояние другого прогона "
+             "сбрасывается (по умолчанию GIGACHAT_RUN_ID, id прогона xdist или BUILD_TAG Jenkins)",
+    )
+    group.addoption(
+        "--gigachat-usage-file", default=token_usage.DEFAULT_PATH,
+        help="Файл итогов расхода токенов по моделям, тестам и параметрам "
+             f"(по умолчанию {token_usage.DEFAULT_PATH}, пустая строка - не писать)",
+    )
+    env_option(
+        "--gigachat-soak", "GIGACHAT_SOAK", type=soak.parse_duration,
+        help="Soak-режим: повторять тесты с меткой soak заданное время (90s, 30m, 2h, 1h30m) "
+             "и следить за ростом памяти, дескрипторов и соединений (по умолчанию выключен или GIGACHAT_SOAK)",
+    )
+    group.addoption(
+        "--gigachat-soak-interval", type=float, default=soak.DEFAULT_INTERVAL,
+        help=f"Интервал замеров в soak-режиме, сек (по умолчанию {soak.DEFAULT_INTERVAL:g})",
+    )
+    group.addoption(
+        "--gigachat-soak-rss-growth", type=float, default=soak.DEFAULT_RSS_GROWTH,
+        help=f"Допустимый устойчивый рост памяти, МБ в час (по умолчанию {soak.DEFAULT_RSS_GROWTH:g})",
+    )
+    group.addoption(
+        "--gigachat-soak-count-growth", type=float, default=soak.DEFAULT_COUNT_GROWTH,
+        help="Допустимый устойчивый рост дескрипторов, потоков и занятых соединений, "
+             f"штук в час (по умолчанию {soak.DEFAULT_COUNT_GROWTH:g})",
+    )
+    group.addoption(
+        "--gigachat-soak-tracemalloc", type=int, default=soak.DEFAULT_TRACEMALLOC_FRAMES,
+        help="Глубина стека tracemalloc в soak-режиме, 0 - не включать "
+             f"(по умолчанию {soak.DEFAULT_TRACEMALLOC_FRAMES})",
+    )
+    group.addoption(
+        "--gigachat-soak-dir", default=soak.DEFAULT_DIR,
+        help=f"Куда писать временной ряд soak-режима (по умолчанию {soak.DEFAULT_DIR})",
+    )
+    env_option(
+        "--gigachat-no-warmup", "GIGACHAT_NO_WARMUP", False, action="store_true",
+        help="Не готовить токен и соединение в фоне во время сбора тестов "
+             "(по умолчанию прогрев включен, отключается также GIGACHAT_NO_WARMUP)",
+    )
+
+
+def pytest_configure(config):
+    """
+    Подключаем плагины учета токенов, профилирования по фазам и soak-режима
+    (если включены) и базовой линии производительности (если не отключена).
+    """
+    resolve_env_options(config)
+    shard_index, shard_count = config.getoption("--gigachat-shard-index"), config.getoption("--gigachat-shard-count")
+    if shard_count < 1 or not 0 <= shard_index < shard_count:
+        raise pytest.UsageError(
+            f"--gigachat-shard-index должен быть от 0 до {shard_count - 1}, "
+            f"а --gigachat-shard-count не меньше 1: получено {shard_index} и {shard_count}"
+        )
+    if config.getoption("--gigachat-load-mode") == "open" and config.getoption("--gigachat-load-rps") <= 0:
+        raise pytest.UsageError(
+            f"--gigachat-load-rps в режиме open должен быть больше 0: "
+            f"получено {config.getoption('--gigachat-load-rps')}"
+        )
+    if config.getoption("collectonly"):
+        return
+    from . import perf_baseline, profiling, soak, token_usage, warmup
+    from .locking import default_run_id
+
+    config.stash[startup_key] = warmup.StartupClock(STARTED)
+    budget_file = config.getoption("--gigachat-token-budget-file")
+    config.pluginmanager.register(token_usage.TokenUsage(
+        budget=config.getoption("--gigachat-token-budget"),
+        path=config.getoption("--gigachat-usage-file"),
+        shared=token_usage.SharedBudget(
+            budget_file, run_id=config.getoption("--gigachat-run-id") or default_run_id(),
+        ) if budget_file else None,
+    ), TOKEN_USAGE_PLUGIN)
+    if config.getoption("--gigachat-profile") or config.getoption("--gigachat-profile-cprofile"):
+        config.pluginmanager.register(profiling.PhaseProfiler(
+            cprofile_top=config.getoption("--gigachat-profile-cprofile"),
+            directory=config.getoption("--gigachat-profile-dir"),
+        ), PROFILER_PLUGIN)
+    if config.getoption("--gigachat-soak"):
+        config.pluginmanager.register(soak.SoakRunner(
+            config.getoption("--gigachat-soak"),
+            interval=config.getoption("--gigachat-soak-interval"),
+            rss_growth=config.getoption("--gigachat-soak-rss-growth"),
+            count_growth=config.getoption("--gigachat-soak-count-growth"),
+            tracemalloc_frames=config.getoption("--gigachat-soak-tracemalloc"),
+            directory=config.getoption("--gigachat-soak-dir"),
+        ), SOAK_PLUGIN)
+    path = config.getoption("--gigachat-baseline")
+    if not path:
+        return
+    target = "stub" if stub_enabled(config) else urlsplit(setting("GIGACHAT_API_BASE_URL")).netloc
+    plugin = perf_baseline.PerfBaseline(
+        perf_baseline.BaselineStore(path, window=config.getoption("--gigachat-baseline-window"),
+                                    accept_after=config.getoption("--gigachat-baseline-accept-after")),
+        target,
+        gate=config.getoption("--gigachat-perf-gate"),
+        z=config.getoption("--gigachat-regression-z"),
+        ratio=config.getoption("--gigachat-regression-ratio"),
+        min_delta=config.getoption("--gigachat-regression-min-delta"),
+        min_samples=config.getoption("--gigachat-baseline-min-samples"),
+    )
+    config.pluginmanager.register(plugin, PERF_BASELINE_PLUGIN)
 
 
 def get_verify_setting():
@@ -19,22 +415,29 @@ def get_verify_setting():
     Если указан GIGACHAT_SSL_CERT и файл существует - использует его.
     Иначе возвращает False, топ-варик когда лень возиться с сертификатами :)
     """
-    if GIGACHAT_SSL_CERT and os.path.exists(GIGACHAT_SSL_CERT):
-        return GIGACHAT_SSL_CERT
+    ssl_cert = setting('GIGACHAT_SSL_CERT')
+    if ssl_cert and os.path.exists(ssl_cert):
+        return ssl_cert
     return False
 
 
-def get_token():
+def fetch_token(session=None, oauth_url=None, basic_auth_token=None):
     """
-    Получает OAuth токен для доступа к GigaChat API.
-    Возвращает access_token из ответа API.
+    Запрашивает OAuth токен для доступа к GigaChat API.
+    Возвращает ответ API целиком (access_token и expires_at).
+
+    session: GigaChatSession, чтобы переиспользовать открытые соединения.
+    Без нее выполняется одиночный requests.post.
+    oauth_url, basic_auth_token: по умолчанию GIGACHAT_OAUTH_URL и GIGACHAT_BASIC_AUTH_TOKEN
     """
-    
-    if not GIGACHAT_BASIC_AUTH_TOKEN:
+    oauth_url = oauth_url or setting('GIGACHAT_OAUTH_URL')
+    basic_auth_token = basic_auth_token or setting('GIGACHAT_BASIC_AUTH_TOKEN')
+
+    if not basic_auth_token:
         raise ValueError(
             "Необходимо установить GIGACHAT_BASIC_AUTH_TOKEN в .env файле"
         )
-    auth_header = f'Basic {GIGACHAT_BASIC_AUTH_TOKEN}'
+    auth_header = f'Basic {basic_auth_token}'
     
     payload = {
         'scope': 'GIGACHAT_API_PERS'
@@ -47,9 +450,14 @@ def get_token():
         'Authorization': auth_header
     }
 
-    # Используем SSL сертификат если он указан, иначе отключаем проверку
-    verify = get_verify_setting()
-    response = requests.post(GIGACHAT_OAUTH_URL, headers=headers, data=payload, verify=verify, proxies={'http': None, 'https': None})
+    if session is not None:
+        response = session.post(oauth_url, headers=headers, data=payload)
+    else:
+        import requests
+
+        # Используем SSL сертификат если он указан, иначе отключаем проверку
+        verify = get_verify_setting()
+        response = requests.post(oauth_url, headers=headers, data=payload, verify=verify, proxies={'http': None, 'https': None})
     response.raise_for_status()  # Вызовет исключение при ошибке HTTP
     
     response_data = response.json()
@@ -58,30 +466,330 @@ def get_token():
     if not access_token:
         raise ValueError(f"Токен не найден в ответе API: {response_data}")
     
-    return access_token
+    return response_data
+
+
+def get_token(session=None):
+    """
+    Получает OAuth токен для доступа к GigaChat API.
+    Возвращает access_token из ответа API.
+    """
+    return fetch_token(session)['access_token']
+
+
+PERF_BASELINE_PLUGIN = "gigachat-perf-baseline"
+PROFILER_PLUGIN = "gigachat-profiler"
+SOAK_PLUGIN = "gigachat-soak"
+TOKEN_USAGE_PLUGIN = "gigachat-token-usage"
+pool_stats_key = pytest.StashKey[dict]()
+replay_stats_key = pytest.StashKey[dict]()
+throttle_stats_key = pytest.StashKey[dict]()
+attachments_key = pytest.StashKey["attachments.AttachmentManager"]()
+warmup_key = pytest.StashKey["warmup.Warmup"]()
+startup_key = pytest.StashKey["warmup.StartupClock"]()
+scheduled_key = pytest.StashKey[list]()
+# Фикстуры, которым нужен API: только тесты с ними запускают прогрев
+API_FIXTURES = frozenset({"http_session", "token_cache", "access_token", "api_headers",
+                          "api_headers_factory", "embeddings_client", "parallel_cases"})
+
+
+def take_warm(config, name):
+    """
+    Забирает готовый ресурс из фонового прогрева: (True, ресурс),
+    или (False, None), если прогрева не было или шаг не выполнен.
+    """
+    warm = config.stash.get(warmup_key, None)
+    if warm is None:
+        return False, None
+    return warm.take(name)
+
+
+def start_stub(config):
+    """
+    Запускает локальную заглушку, если она включена, иначе возвращает None.
+    """
+    if not stub_enabled(config):
+        return None
+    from .stub_server import StubConfig, StubServer
+
+    # Параметры заглушки (GIGACHAT_STUB_*) тоже могут быть в .env
+    load_env()
+
+    return StubServer(StubConfig.from_env()).start()
+
+
+@pytest.fixture(scope="session")
+def gigachat_stub(request):
+    """
+    Фикстура локальной заглушки GigaChat API.
+    Возвращает None, если тесты идут против настоящего API.
+    """
+    warm, server = take_warm(request.config, "gigachat_stub")
+    if not warm:
+        server = start_stub(request.config)
+    yield server
+    if server is not None:
+        server.stop()
+
+
+def create_http_session(config, verify):
+    """
+    Создает общую HTTP-сессию со всеми слоями (ограничение частоты, кэш ответов)
+    и наблюдателями (метрики, вложения, профилировщик, время старта).
+    """
+    from . import attachments, metrics, replay_cache, throttle
+    from .http_client import DEFAULT_POOL_MAXSIZE, GigaChatSession
+    from .locking import default_run_id
+
+    pool_maxsize = max(DEFAULT_POOL_MAXSIZE, config.getoption("--gigachat-concurrency"),
+                       config.getoption("--gigachat-load-concurrency"))
+    session = GigaChatSession(verify=verify, pool_maxsize=pool_maxsize)
+    throttled = None
+    if config.getoption("--gigachat-throttle"):
+        limiter = throttle.SharedLimiter(
+            config.getoption("--gigachat-throttle-state"),
+            max_concurrency=config.getoption("--gigachat-throttle-concurrency"),
+            rps=config.getoption("--gigachat-throttle-rps"),
+            run_id=config.getoption("--gigachat-run-id") or default_run_id(),
+        )
+        limiter.join()
+        throttled = session.wrap_adapter(lambda inner: throttle.ThrottledAdapter(
+            inner, limiter, retry_budget=config.getoption("--gigachat-retry-budget"),
+        ))
+    replay = None
+    if config.getoption("--gigachat-replay") != "off":
+        store = replay_cache.ReplayStore(
+            config.getoption("--gigachat-replay-dir"),
+            max_bytes=int(config.getoption("--gigachat-replay-max-mb") * 1024 * 1024),
+            max_age=config.getoption("--gigachat-replay-max-age") * 24 * 3600,
+        )
+        replay = session.wrap_adapter(lambda inner: replay_cache.ReplayAdapter(
+            inner, store, config.getoption("--gigachat-replay"),
+            ttl=config.getoption("--gigachat-replay-ttl") * 3600,
+            host=replay_cache.STUB_HOST if stub_enabled(config) else None,
+        ))
+    session.replay = replay
+    session.throttled = throttled
+    session.metrics = metrics.MetricsRecorder(config.getoption("--gigachat-metrics-dir"))
+    session.add_observer(session.metrics.observe)
+    session.attachments = config.stash[attachments_key] = attachments.AttachmentManager(
+        config.getoption("--gigachat-attach"),
+        buffer_size=config.getoption("--gigachat-attach-buffer"),
+        max_bytes=config.getoption("--gigachat-attach-max-kb") * 1024,
+        gzip_bytes=config.getoption("--gigachat-attach-gzip-kb") * 1024,
+    )
+    session.add_observer(session.attachments.observe)
+    profiler = config.pluginmanager.get_plugin(PROFILER_PLUGIN)
+    if profiler is not None:
+        session.add_observer(profiler.observe)
+    baseline = config.pluginmanager.get_plugin(PERF_BASELINE_PLUGIN)
+    if baseline is not None:
+        session.metrics.listeners.append(baseline.observe_record)
+    usage = config.pluginmanager.get_plugin(TOKEN_USAGE_PLUGIN)
+    if usage is not None:
+        session.metrics.listeners.append(usage.observe_record)
+    clock = config.stash.get(startup_key, None)
+    if clock is not None:
+        session.add_observer(clock.observe)
+    soak_runner = config.pluginmanager.get_plugin(SOAK_PLUGIN)
+    if soak_runner is not None:
+        soak_runner.watch_session(session)
+    return session
+
+
+@pytest.fixture(scope="session")
+def http_session(request, verify_ssl):
+    """
+    Фикстура общей HTTP-сессии с пулом соединений.
+    Одно TCP+TLS соединение к хосту переиспользуется всеми тестами.
+    """
+    config = request.config
+    warm, session = take_warm(config, "http_session")
+    if not warm:
+        session = create_http_session(config, verify_ssl)
+    yield session
+    from . import allure_summary
+
+    session.metrics.close()
+    config.stash[pool_stats_key] = session.pool_stats.as_dict()
+    if session.replay is not None:
+        config.stash[replay_stats_key] = session.replay.stats()
+    if session.throttled is not None:
+        stats = config.stash[throttle_stats_key] = session.throttled.stats()
+        allure_summary.report_summary("Ожидание из-за ограничений API", [
+            ("throttle_stats", json.dumps(stats, ensure_ascii=False, indent=2), allure_summary.JSON),
+        ])
+    session.close()
+
+
+@pytest.fixture(autouse=True)
+def http_test_scope(request):
+    """
+    Привязывает общую сессию к текущему тесту: метрики запросов подписываются
+    id теста, кэш ответов включается только для тестов с меткой replayable.
+    """
+    if "http_session" not in request.fixturenames:
+        yield
+        return
+    session = request.getfixturevalue("http_session")
+    replay = session.replay if request.node.get_closest_marker("replayable") else None
+    session.metrics.start_test(request.node)
+    session.attachments.start_test()
+    if replay is not None:
+        replay.enabled = True
+    yield
+    if replay is not None:
+        replay.enabled = False
+    session.metrics.finish_test()
+
+
+@pytest.fixture(scope="session")
+def parallel_cases(request, http_session):
+    """
+    Фикстура для одновременной отправки запросов параметризованных кейсов.
+    """
+    from .async_client import ConcurrentGigaChatClient, ParallelCases
+
+    client = ConcurrentGigaChatClient(http_session, concurrency=request.config.getoption("--gigachat-concurrency"))
+
+    usage = request.config.pluginmanager.get_plugin(TOKEN_USAGE_PLUGIN)
+    profiler = request.config.pluginmanager.get_plugin(PROFILER_PLUGIN)
+
+    def on_response(response):
+        http_session.metrics.publish(response)
+        http_session.attachments.record(response)
+        # Запрос ушел из потока клиента: время запроса - кейса, который забрал ответ
+        if profiler is not None:
+            profiler.claim(response)
+
+    cases = ParallelCases(client, on_response=on_response,
+                          prefetch_limit=None if usage is None else usage.requests_left,
+                          scheduled=request.config.stash.get(scheduled_key, []))
+    yield cases
+    # Токены ответов, полученных заранее для невыполненных кейсов, тоже потрачены
+    for item, response in cases.leftovers():
+        http_session.metrics.publish(response, attach=False, item=item)
+    client.close()
+
+
+def create_token_cache(config, session, stub):
+    """
+    Создает кэш OAuth токена для настоящего API или заглушки stub.
+    """
+    from .token_cache import TokenCache, credentials_key, default_cache_path
+
+    if stub is not None:
+        oauth_url, basic_auth_token = stub.oauth_url, stub.basic_auth_token
+    else:
+        oauth_url, basic_auth_token = setting('GIGACHAT_OAUTH_URL'), setting('GIGACHAT_BASIC_AUTH_TOKEN')
+    return TokenCache(
+        fetch=lambda: fetch_token(session, oauth_url, basic_auth_token),
+        path=default_cache_path(config),
+        key=credentials_key(oauth_url, basic_auth_token),
+    )
+
+
+@pytest.fixture(scope="session")
+def token_cache(request, http_session, gigachat_stub):
+    """
+    Фикстура кэша OAuth токена.
+    Токен хранится на диске и общий для параллельных воркеров и повторных запусков,
+    обновляется в фоне незадолго до expires_at.
+    """
+    warm, cache = take_warm(request.config, "token_cache")
+    if not warm:
+        cache = create_token_cache(request.config, http_session, gigachat_stub)
+    yield cache
+    cache.close()
+
+
+@pytest.fixture(scope="session")
+def corpus_reader(request):
+    """
+    Фикстура чтения кейсов корпуса по смещению строки.
+    """
+    from . import corpus
+
+    reader = corpus.CorpusReader(request.config.getoption("--gigachat-corpus"))
+    yield reader
+    reader.close()
 
 
 @pytest.fixture(scope="session")
-def access_token():
+def access_token(token_cache):
     """
     Фикстура для получения access token.
-    Токен кэшируется на время сессии тестов.
+    Токен берется из кэша на диске, OAuth запрос выполняется только при необходимости.
     """
-    return get_token()
+    return token_cache.get()
 
 
 @pytest.fixture(scope="session")
-def api_base_url():
+def api_base_url(gigachat_stub):
+    """
+    Фикстура для базового URL API GigaChat (или локальной заглушки).
+    """
+    return base_url_for(gigachat_stub)
+
+
+def base_url_for(stub):
     """
-    Фикстура для базового URL API GigaChat.
+    Базовый URL API: заглушки stub или настоящего API.
     """
-    return GIGACHAT_API_BASE_URL
+    if stub is not None:
+        return stub.base_url
+    return setting('GIGACHAT_API_BASE_URL')
+
+
+@pytest.fixture(scope="session")
+def load_settings(request):
+    """
+    Фикстура с параметрами нагрузки для тестов с меткой load.
+    """
+    config = request.config
+    return {
+        "mode": config.getoption("--gigachat-load-mode"),
+        "rps": config.getoption("--gigachat-load-rps"),
+        "concurrency": config.getoption("--gigachat-load-concurrency"),
+        "duration": config.getoption("--gigachat-load-duration"),
+        "ramp_up": config.getoption("--gigachat-load-ramp-up"),
+        "max_error_rate": config.getoption("--gigachat-load-max-error-rate"),
+        "p99_limit": config.getoption("--gigachat-load-p99-limit"),
+        "report_dir": config.getoption("--gigachat-metrics-dir"),
+    }
+
+
+@pytest.fixture(scope="session")
+def api_headers_factory(token_cache):
+    """
+    Фикстура-фабрика заголовков для запросов вне обычного теста (нагрузка, фоновые потоки).
+    Токен берется из кэша при каждом вызове.
+    """
+    return lambda: make_api_headers(token_cache.get())
+
+
+@pytest.fixture(scope="session")
+def embeddings_client(request, http_session, api_base_url, api_headers_factory):
+    """
+    Фикстура клиента /embeddings поверх общей сессии.
+    """
+    from . import embeddings
+
+    return embeddings.EmbeddingsClient(http_session, api_base_url, api_headers_factory,
+                                       model=request.config.getoption("--gigachat-embeddings-model"))
 
 
 @pytest.fixture(scope="function")
-def api_headers(access_token):
+def api_headers(token_cache):
     """
     Фикстура для заголовков запросов к API GigaChat.
+    """
+    return make_api_headers(token_cache.get())
+
+
+def make_api_headers(access_token):
+    """
+    Заголовки запроса к API GigaChat.
 
     X-Request-ID: Обязательный заголовок для каждого запроса
     X-Session-ID: Обязательный заголовок, позволяет сохранять контекст сессии
@@ -96,6 +804,27 @@ def api_headers(access_token):
     }
 
 
+@pytest.fixture(scope="session")
+def stream_limits(request):
+    """
+    Фикстура с допустимыми задержками потокового ответа, секунды.
+    """
+    config = request.config
+    return {
+        "ttft": config.getoption("--gigachat-ttft-limit"),
+        "chunk_gap": config.getoption("--gigachat-chunk-gap-limit"),
+        "duration": config.getoption("--gigachat-stream-limit"),
+    }
+
+
+@pytest.fixture(scope="session")
+def similarity_threshold(request):
+    """
+    Фикстура с порогом сходства ответов для сравнения моделей.
+    """
+    return request.config.getoption("--gigachat-similarity-threshold")
+
+
 @pytest.fixture(scope="session")
 def verify_ssl():
     """
@@ -104,3 +833,222 @@ def verify_ssl():
     """
     return get_verify_setting()
 
+
+def pytest_ignore_collect(collection_path, config):
+    """
+    Тесты корпуса собираются только если указан файл корпуса.
+    """
+    if collection_path.name == "test_corpus.py" and not config.getoption("--gigachat-corpus"):
+        return True
+    return None
+
+
+def pytest_collection_modifyitems(config, items):
+    """
+    Нагрузочные тесты (метка load) выполняются только при явном выборе: pytest -m load.
+    При --gigachat-shard-count > 1 узел оставляет только тесты своего шарда
+    (кейсы корпуса уже отобраны при генерации).
+    """
+    shard_count = config.getoption("--gigachat-shard-count")
+    if shard_count > 1:
+        from . import corpus
+
+        shard_index = config.getoption("--gigachat-shard-index")
+        selected, deselected = [], []
+        for item in items:
+            if "corpus_offset" in item.fixturenames or corpus.shard_of(item.nodeid, shard_count) == shard_index:
+                selected.append(item)
+            else:
+                deselected.append(item)
+        if deselected:
+            config.hook.pytest_deselected(items=deselected)
+            items[:] = selected
+    if load_selected(config.getoption("markexpr")):
+        return
+    skip_load = pytest.mark.skip(reason="Нагрузочный тест, запуск: pytest -m load")
+    for item in items:
+        if item.get_closest_marker("load") is not None:
+            item.add_marker(skip_load)
+
+
+# Метка load в выражении -m целиком (не overload, не load_slow) и, возможно, "not " перед ней
+_LOAD_MARK = re.compile(r"(\bnot\s+)?(?<![\w.-])load(?![\w.-])")
+
+
+def load_selected(markexpr):
+    """
+    Метка load выбрана в -m явно: выражение упоминает load не через "not load"
+    (-m load, -m "load and not slow", но не -m "not load" или -m overload).
+    """
+    return any(match.group(1) is None for match in _LOAD_MARK.finditer(markexpr or ""))
+
+
+def uses_api(item):
+    """
+    Тест обращается к API: использует фикстуры API и не пропускается заранее.
+    """
+    if not API_FIXTURES.intersection(item.fixturenames) or item.get_closest_marker("skip") is not None:
+        return False
+    return item.get_closest_marker("load") is None or load_selected(item.config.getoption("markexpr"))
+
+
+def selection_after_collection(config):
+    """
+    Тесты отбираются только после сбора (-k, -m, --deselect, --lf, шарды).
+    """
+    return bool(config.getoption("keyword") or config.getoption("markexpr") or config.getoption("deselect")
+                or config.getoption("lf", False) or config.getoption("--gigachat-shard-count") > 1)
+
+
+def start_warmup(config):
+    """
+    Запускает фоновый прогрев: заглушка, HTTP-сессия, кэш токена, токен
+    и соединение с API (запрос /models). Фикстуры потом забирают готовое.
+    """
+    if warmup_key in config.stash or config.getoption("collectonly") or config.getoption("--gigachat-no-warmup"):
+        return
+    from . import warmup
+
+    verify = get_verify_setting()
+
+    def warm_connection(results):
+        url = f"{base_url_for(results['gigachat_stub'])}/models"
+        response = results["http_session"].get(url, headers=make_api_headers(results["token"]))
+        response.close()
+        return response.status_code
+
+    config.stash[warmup_key] = warmup.Warmup([
+        ("gigachat_stub", lambda results: start_stub(config)),
+        ("http_session", lambda results: create_http_session(config, verify)),
+        ("token_cache", lambda results: create_token_cache(config, results["http_session"],
+                                                           results["gigachat_stub"])),
+        ("token", lambda results: results["token_cache"].get()),
+        ("connection", warm_connection),
+    ]).start()
+
+
+def pytest_itemcollected(item):
+    """
+    Прогрев начинается с первого собранного теста API, если отбор тестов
+    не зависит от окончания сбора - так он идет параллельно со сбором.
+    """
+    config = item.config
+    if warmup_key not in config.stash and uses_api(item) and not selection_after_collection(config):
+        start_warmup(config)
+
+
+def scheduled_items(config, items):
+    """
+    Тесты, которые точно выполнит этот процесс: окончательный список после всех
+    pytest_collection_modifyitems без заранее пропущенных. Воркер xdist с
+    распределением по одному тесту (load, worksteal) заранее не знает своих
+    тестов - для него список пустой.
+    """
+    if hasattr(config, "workerinput") and getattr(config.option, "dist", "no") not in ("loadscope", "loadfile"):
+        return []
+    return [item for item in items if item.get_closest_marker("skip") is None]
+
+
+def pytest_collection_finish(session):
+    """
+    Запоминает тесты, которые будут выполнены (для ParallelCases).
+    Иначе прогрев начинается после сбора, если среди выбранных тестов есть тесты API.
+    """
+    config = session.config
+    config.stash[scheduled_key] = scheduled_items(config, session.items)
+    clock = config.stash.get(startup_key, None)
+    if clock is not None:
+        clock.mark("collected")
+    if warmup_key not in config.stash and any(uses_api(item) for item in session.items):
+        start_warmup(config)
+
+
+def pytest_runtest_setup(item):
+    clock = item.config.stash.get(startup_key, None)
+    if clock is not None:
+        clock.mark("first_test")
+
+
+def pytest_sessionfinish(session):
+    """
+    Закрываем ресурсы прогрева, которые не понадобились ни одной фикстуре.
+    """
+    warm = session.config.stash.get(warmup_key, None)
+    if warm is None:
+        return
+    for name, resource in reversed(warm.leftovers()):
+        if name == "gigachat_stub" and resource is not None:
+            resource.stop()
+        elif name == "http_session":
+            resource.metrics.close()
+            resource.close()
+        elif name == "token_cache":
+            resource.close()
+
+
+@pytest.hookimpl(wrapper=True)
+def pytest_runtest_makereport(item, call):
+    """
+    Тела запросов и ответов теста пишутся в Allure после фазы call или после
+    упавшей подготовки (токен, фикстуры): только при падении или всегда,
+    в зависимости от --gigachat-attach.
+    """
+    report = yield
+    manager = item.config.stash.get(attachments_key, None)
+    if manager is not None and (report.when == "call" or report.when == "setup" and report.failed):
+        manager.flush(failed=report.failed)
+    return report
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    """
+    Выводим статистику переиспользования соединений за прогон.
+    """
+    stats = config.stash.get(pool_stats_key, None)
+    if not stats:
+        return
+    terminalreporter.write_sep("-", "HTTP connection pool")
+    terminalreporter.write_line(
+        f"requests: {stats['requests']}, new connections: {stats['opened']}, "
+        f"reused: {stats['reused']} ({stats['reuse_ratio']:.0%})"
+    )
+    clock = config.stash.get(startup_key, None)
+    if clock is not None and clock.first_request is not None:
+        marks, first = clock.marks, clock.first_request
+        line = (f"startup: first request {marks['first_request']:.2f}s after start "
+                f"(collected {marks.get('collected', 0):.2f}s, first test {marks['first_test']:.2f}s; "
+                f"ttfb {first['ttfb']:.3f}s, {'new' if first['new_connection'] else 'reused'} connection)")
+        warm = config.stash.get(warmup_key, None)
+        if warm is not None:
+            warm_stats = warm.stats()
+            line += "; warm-up: " + ", ".join(f"{name} {seconds:.2f}s"
+                                              for name, seconds in warm_stats["timings"].items())
+            if warm_stats["error"]:
+                line += f" (failed: {warm_stats['error']})"
+        terminalreporter.write_line(line)
+    replay = config.stash.get(replay_stats_key, None)
+    if replay:
+        terminalreporter.write_line(
+            f"replay ({replay['mode']}): {replay['hits']} from cache, {replay['misses']} sent to API"
+        )
+    manager = config.stash.get(attachments_key, None)
+    if manager is not None:
+        stats = manager.stats()
+        line = (f"attachments ({stats['mode']}): {stats['written']} written, "
+                f"{stats['written_bytes'] / 1024:.1f} KB in {stats['attach_time'] * 1000:.0f} ms")
+        alluredir = getattr(config.option, "allure_report_dir", None)
+        if alluredir:
+            from .attachments import directory_size
+
+            size, files = directory_size(alluredir)
+            line += f"; {alluredir}: {size / 1024 / 1024:.2f} MB in {files} files"
+        terminalreporter.write_line(line)
+    throttled = config.stash.get(throttle_stats_key, None)
+    if throttled:
+        shared = throttled["shared"]
+        terminalreporter.write_line(
+            f"throttle: {throttled['requests']} requests, {throttled['retries']} retries "
+            f"({throttled['throttled']} after 429), waited {throttled['wait']:.1f}s "
+            f"(max {throttled['max_wait']:.1f}s); state file, all workers: {shared['requests']} attempts, "
+            f"{shared['throttled']} throttled, waited {shared['wait']:.1f}s, window {shared['limit']}"
+        )
@@ -0,0 +1,202 @@
+"""
+Регрессионный корпус запросов в формате JSON-lines.
+
+Каждая строка файла - отдельный кейс:
+    {"id": "greeting-1", "prompt": "Привет!", "model": "GigaChat-2",
+     "expect": {"status": 200, "regex": "привет|здравств", "max_completion_tokens": 100}}
+
+Вместо prompt можно указать payload целиком (тело chat/completions).
+Поля expect (все необязательные):
+    status                 код ответа или список кодов (по умолчанию 200)
+    schema                 "chat_completion" (по умолчанию для 200) или "none"
+    regex / not_regex      регулярное выражение для текста ответа (re.search, без учета регистра)
+    finish_reason          ожидаемый finish_reason
+    max_completion_tokens  верхняя граница usage.completion_tokens
+    max_total_tokens       верхняя граница usage.total_tokens
+
+Файл не загружается в память: при сборе тестов читаются только id и смещения
+строк своего шарда, сам кейс читается по смещению в момент выполнения теста.
+Шард кейса выбирается по хэшу id, поэтому разбиение одинаково на всех узлах.
+
+Объединение результатов Allure с нескольких узлов:
+    python -m tests.corpus merge allure-results shard-0/allure-results shard-1/allure-results
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+
+DEFAULT_MODEL = "GigaChat-2"
+
+
+def shard_of(key, shard_count):
+    """
+    Номер шарда для ключа (id кейса или id теста), одинаковый на всех узлах и запусках.
+    """
+    digest = hashlib.sha1(str(key).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % shard_count
+
+
+def _case_id(line, lineno):
+    """
+    id кейса: поле id или номер строки, если id не задан. Некорректная строка
+    тоже становится кейсом (по номеру строки) и падает при выполнении,
+    а не ломает сбор всех тестов.
+    """
+    try:
+        case = json.loads(line)
+    except ValueError:
+        return f"line-{lineno}"
+    if not isinstance(case, dict):
+        return f"line-{lineno}"
+    return str(case.get("id") or f"line-{lineno}")
+
+
+def iter_offsets(path, shard_index=0, shard_count=1):
+    """
+    Генератор (смещение, номер строки, id кейса) для кейсов шарда shard_index.
+    Пустые строки и строки-комментарии (#) пропускаются.
+    """
+    with open(path, "rb") as fh:
+        lineno = 0
+        while True:
+            offset = fh.tell()
+            line = fh.readline()
+            if not line:
+                return
+            lineno += 1
+            stripped = line.strip()
+            if not stripped or stripped.startswith(b"#"):
+                continue
+            case_id = _case_id(stripped, lineno)
+            if shard_count > 1 and shard_of(case_id, shard_count) != shard_index:
+                continue
+            yield offset, lineno, case_id
+
+
+class CorpusReader:
+    """
+    Читает кейсы корпуса по смещению. Файл открывается один раз на сессию.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._fh = None
+        self._lock = threading.Lock()
+
+    def read(self, offset):
+        with self._lock:
+            if self._fh is None:
+                self._fh = open(self.path, "rb")
+            self._fh.seek(offset)
+            line = self._fh.readline()
+        case = json.loads(line)
+        if not isinstance(case, dict):
+            raise ValueError(f"ожидался JSON-объект, получен {type(case).__name__}")
+        return case
+
+    def close(self):
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+
+def build_payload(case):
+    """
+    Тело запроса chat/completions для кейса.
+    """
+    if "payload" in case:
+        return case["payload"]
+    payload = {
+        "model": case.get("model", DEFAULT_MODEL),
+        "messages": case.get("messages") or [{"role": "user", "content": case["prompt"]}],
+    }
+    for field in ("temperature", "max_tokens", "top_p"):
+        if field in case:
+            payload[field] = case[field]
+    return payload
+
+
+def expected_statuses(expect):
+    status = expect.get("status", 200)
+    return list(status) if isinstance(status, (list, tuple)) else [status]
+
+
+def _merge_properties(target, source):
+    """
+    Объединяет environment.properties: одинаковые ключи с разными значениями
+    склеиваются через запятую.
+    """
+    merged = {}
+    for path in (target, source):
+        if not os.path.exists(path):
+            continue
+        with open(path, encoding="utf-8") as fh:
+            for line in fh:
+                key, sep, value = line.rstrip("\n").partition("=")
+                if not sep:
+                    continue
+                values = merged.setdefault(key.strip(), [])
+                for part in value.split(","):
+                    if part.strip() and part.strip() not in values:
+                        values.append(part.strip())
+    with open(target, "w", encoding="utf-8") as fh:
+        for key, values in merged.items():
+            fh.write(f"{key}={','.join(values)}\n")
+
+
+def merge_results(output, sources):
+    """
+    Собирает каталоги allure-results нескольких шардов в один.
+    Имена файлов результатов уникальны (uuid), environment.properties объединяется.
+    Возвращает число скопированных файлов.
+    """
+    os.makedirs(output, exist_ok=True)
+    copied = 0
+    for source in sources:
+        for name in os.listdir(source):
+            src = os.path.join(source, name)
+            dst = os.path.join(output, name)
+            if not os.path.isfile(src) or os.path.abspath(src) == os.path.abspath(dst):
+                continue
+            if name == "environment.properties":
+                _merge_properties(dst, src)
+            elif os.path.exists(dst):
+                # Файлы результатов и вложений названы по uuid и не совпадают;
+                # совпадают только общие файлы (categories.json, executor.json) - берем из первого шарда
+                continue
+            else:
+                shutil.copyfile(src, dst)
+            copied += 1
+    return copied
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Утилиты корпуса запросов GigaChat")
+    sub = parser.add_subparsers(dest="command", required=True)
+    merge = sub.add_parser("merge", help="Объединить allure-results нескольких шардов")
+    merge.add_argument("output")
+    merge.add_argument("sources", nargs="+")
+    count = sub.add_parser("count", help="Число кейсов в каждом шарде")
+    count.add_argument("path")
+    count.add_argument("--shards", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    if args.command == "merge":
+        copied = merge_results(args.output, args.sources)
+        print(f"{copied} файлов из {len(args.sources)} каталогов -> {args.output}")
+    else:
+        sizes = [0] * args.shards
+        for _, _, case_id in iter_offsets(args.path):
+            sizes[shard_of(case_id, args.shards)] += 1
+        for index, size in enumerate(sizes):
+            print(f"shard {index}: {size}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+"""
+Клиент эмбеддингов GigaChat (/embeddings) для тестов и бенчмарка.
+
+Векторы из ответа не превращаются в списки Python float (8 байт на указатель
+плюс 24 байта на объект float на каждую координату): массивы "embedding"
+вырезаются из текста ответа и разбираются сразу в компактный буфер float32 -
+FlatVectors поверх array('f'). Остальной ответ (index, usage) разбирается как
+обычный JSON.
+
+Пакеты отправляются параллельно, но в полете держится ограниченное число
+пакетов, поэтому память не растет с размером входного набора.
+"""
+import json
+import re
+import time
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_MODEL = "Embeddings"
+_EMBEDDING_ARRAY = re.compile(r'"embedding"\s*:\s*\[')
+
+
+class FlatVectors:
+    """
+    Векторы одной размерности в одном буфере array('f') с минимальным
+    интерфейсом массива: len, shape, nbytes, vectors[i].
+    """
+
+    def __init__(self, dim, data=None):
+        self.dim = dim
+        self.data = data if data is not None else array("f")
+
+    def __len__(self):
+        return len(self.data) // self.dim if self.dim else 0
+
+    @property
+    def shape(self):
+        return len(self), self.dim
+
+    @property
+    def nbytes(self):
+        return len(self.data) * self.data.itemsize
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self.data[index * self.dim:(index + 1) * self.dim]
+
+
+def _parse_vector(text):
+    return array("f", map(float, text.split(",")))
+
+
+def decode_embeddings(text):
+    """
+    Разбирает тело ответа /embeddings.
+
+    Возвращает (data, vectors): data - ответ, в котором массивы embedding заменены
+    пустыми списками, vectors - векторы в порядке index (FlatVectors).
+    """
+    parts = []
+    rows = []
+    pos = 0
+    for match in _EMBEDDING_ARRAY.finditer(text):
+        if match.start() < pos:
+            continue
+        start = match.end()
+        end = text.index("]", start)
+        parts.append(text[pos:start])
+        rows.append(_parse_vector(text[start:end]) if text[start:end].strip() else None)
+        pos = end
+    parts.append(text[pos:])
+    data = json.loads("".join(parts))
+
+    dims = {len(row) for row in rows if row is not None}
+    if any(row is None for row in rows) or len(dims) > 1:
+        raise ValueError(f"Векторы разной размерности или пустые: {sorted(dims)}")
+    order = sorted(range(len(rows)), key=lambda i: data["data"][i]["index"])
+    vectors = FlatVectors(dims.pop() if dims else 0)
+    for i in order:
+        vectors.data.extend(rows[i])
+    return data, vectors
+
+
+class EmbeddingsBatch:
+    """
+    Результат одного запроса: статус, векторы, токены и задержка (секунды).
+    """
+
+    def __init__(self, size, status, latency, data=None, vectors=None, error=None):
+        self.size = size
+        self.status = status
+        self.latency = latency
+        self.data = data
+        self.vectors = vectors
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.status == 200 and self.error is None
+
+    @property
+    def prompt_tokens(self):
+        if not self.data:
+            return 0
+        return sum((item.get("usage") or {}).get("prompt_tokens", 0) for item in self.data["data"])
+
+
+class EmbeddingsClient:
+    """
+    Клиент /embeddings поверх общей сессии.
+
+    headers: функция без аргументов, возвращающая заголовки (см. фикстуру api_headers_factory)
+    """
+
+    def __init__(self, session, base_url, headers, model=DEFAULT_MODEL):
+        self.session = session
+        self.url = f"{base_url}/embeddings"
+        self.headers = headers
+        self.model = model
+
+    def post(self, texts):
+        return self.session.post(self.url, json={"model": self.model, "input": list(texts)},
+                                 headers=self.headers())
+
+    def embed(self, texts):
+        """
+        Один запрос на пакет texts. Ответ разбирается в компактные векторы.
+        """
+        started = time.perf_counter()
+        response = self.post(texts)
+        try:
+            if response.status_code != 200:
+                return EmbeddingsBatch(len(texts), response.status_code, time.perf_counter() - started,
+                                       error=response.text[:500])
+            data, vectors = decode_embeddings(response.content.decode("utf-8"))
+        except ValueError as exc:
+            return EmbeddingsBatch(len(texts), response.status_code, time.perf_counter() - started,
+                                   error=str(exc))
+        finally:
+            response.close()
+        return EmbeddingsBatch(len(texts), 200, time.perf_counter() - started, data, vectors)
+
+    def iter_batches(self, texts, batch_size, concurrency=1):
+        """
+        Генератор EmbeddingsBatch по пакетам из batch_size текстов, в исходном порядке.
+        Одновременно выполняется не больше concurrency запросов, ожидающих
+        чтения результатов - не больше 2 * concurrency.
+        """
+        batches = (texts[i:i + batch_size] for i in range(0, len(texts), batch_size))
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="embeddings") as executor:
+            for batch in batches:
+                pending.append(executor.submit(self.embed, batch))
+                if len(pending) >= 2 * concurrency:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+
+def throughput(batches, elapsed):
+    """
+    Сводка по пакетам: векторов в секунду и задержка пакета (секунды).
+    """
+    latencies = sorted(batch.latency for batch in batches)
+    vectors = sum(batch.size for batch in batches if batch.ok)
+
+    def percentile(q):
+        if not latencies:
+            return None
+        return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))], 4)
+
+    return {
+        "batches": len(latencies),
+        "errors": sum(not batch.ok for batch in batches),
+        "vectors": vectors,
+        "elapsed": round(elapsed, 3),
+        "vectors_per_sec": round(vectors / elapsed, 1) if elapsed else None,
+        "latency_mean": round(sum(latencies) / len(latencies), 4) if latencies else None,
+        "latency_p50": percentile(0.5),
+        "latency_p95": percentile(0.95),
+    }
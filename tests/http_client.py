@@ -0,0 +1,259 @@
+"""
+HTTP-клиент для тестов GigaChat API.
+
+Вместо requests.post на каждый вызов используем одну requests.Session на всю
+сессию тестов: TCP+TLS соединение к хосту GigaChat открывается один раз и
+переиспользуется (keep-alive), а verify/прокси настраиваются в одном месте.
+
+Для каждого запроса адаптер замеряет фазы (DNS, TCP connect, TLS, время до
+первого байта, полное время) и сохраняет их в response.timings.
+"""
+import socket
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from urllib3.util.connection import allowed_gai_family
+
+# Количество пулов (хостов) и соединений в пуле на один хост.
+# Хостов у нас два (OAuth и API), параллельных запросов немного.
+DEFAULT_POOL_CONNECTIONS = 4
+DEFAULT_POOL_MAXSIZE = 16
+
+# TCP keep-alive, чтобы простаивающие соединения не рвались между тестами
+KEEPALIVE_SOCKET_OPTIONS = HTTPConnection.default_socket_options + [
+    (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+]
+
+
+class PoolStats:
+    """
+    Счетчики соединений пула: сколько открыто новых и сколько переиспользовано.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.reused = 0
+
+    def record(self, reused):
+        with self._lock:
+            if reused:
+                self.reused += 1
+            else:
+                self.opened += 1
+
+    @property
+    def requests(self):
+        return self.opened + self.reused
+
+    @property
+    def reuse_ratio(self):
+        return self.reused / self.requests if self.requests else 0.0
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "opened": self.opened,
+            "reused": self.reused,
+            "reuse_ratio": round(self.reuse_ratio, 3),
+        }
+
+
+# Замеры установки соединения для запроса, который выполняется в текущем потоке
+_connection_timings = threading.local()
+
+
+class _TimedConnectionMixin:
+    """
+    Соединение urllib3, которое замеряет DNS, TCP connect и TLS handshake.
+    """
+
+    def _new_conn(self):
+        timings = getattr(_connection_timings, "value", None)
+        if timings is None:
+            return super()._new_conn()
+
+        host = self._dns_host
+        start = time.perf_counter()
+        try:
+            addresses = list(dict.fromkeys(
+                info[4][0] for info in socket.getaddrinfo(host.strip("[]"), self.port, allowed_gai_family(),
+                                                          socket.SOCK_STREAM)
+            ))
+        except OSError:
+            # Ошибку разрешения имени покажет сам urllib3
+            addresses = [host]
+        resolved = time.perf_counter()
+        timings["dns"] = resolved - start
+        if not addresses:
+            # Как urllib3.util.connection.create_connection: urllib3 обернет в ошибку соединения
+            raise socket.error("getaddrinfo returned no addresses")
+        # Подключаемся к уже найденным адресам по очереди, как
+        # urllib3.util.connection.create_connection: недоступный адрес (например,
+        # IPv6 без маршрута) не мешает подключиться к следующему.
+        # SNI и проверка сертификата используют self.host, он не меняется.
+        try:
+            for index, address in enumerate(addresses):
+                self._dns_host = address
+                try:
+                    sock = super()._new_conn()
+                    break
+                except (ConnectTimeoutError, NewConnectionError):
+                    if index == len(addresses) - 1:
+                        raise
+        finally:
+            self._dns_host = host
+        timings["connect"] = time.perf_counter() - resolved
+        return sock
+
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        timings = getattr(_connection_timings, "value", None)
+        if timings is not None and isinstance(self, HTTPSConnection):
+            timings["tls"] = max(0.0, time.perf_counter() - start
+                                 - timings.get("dns", 0.0) - timings.get("connect", 0.0))
+
+
+class TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _StatsPoolMixin:
+    """
+    Пул urllib3, который перед каждым запросом отмечает, было ли соединение
+    уже открыто (переиспользование) или его придется устанавливать заново.
+    """
+
+    stats = None
+
+    def _validate_conn(self, conn):
+        self.stats.record(reused=getattr(conn, "sock", None) is not None)
+        super()._validate_conn(conn)
+
+
+class PooledAdapter(HTTPAdapter):
+    """
+    HTTPAdapter с настроенным пулом соединений, TCP keep-alive и статистикой
+    переиспользования соединений.
+
+    observers: функции observer(request, response), вызываются после каждого ответа
+    """
+
+    def __init__(self, pool_connections=DEFAULT_POOL_CONNECTIONS,
+                 pool_maxsize=DEFAULT_POOL_MAXSIZE, **kwargs):
+        self.stats = PoolStats()
+        self.observers = []
+        super().__init__(pool_connections=pool_connections, pool_maxsize=pool_maxsize, **kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        pool_kwargs.setdefault("socket_options", KEEPALIVE_SOCKET_OPTIONS)
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": type("StatsHTTPConnectionPool", (_StatsPoolMixin, HTTPConnectionPool),
+                         {"stats": self.stats, "ConnectionCls": TimedHTTPConnection}),
+            "https": type("StatsHTTPSConnectionPool", (_StatsPoolMixin, HTTPSConnectionPool),
+                          {"stats": self.stats, "ConnectionCls": TimedHTTPSConnection}),
+        }
+
+    def send(self, request, stream=False, **kwargs):
+        """
+        Выполняет запрос и сохраняет замеры в response.timings (секунды):
+        dns, connect, tls - только для нового соединения, ttfb - до получения
+        заголовков ответа, total - до конца тела (None для stream=True).
+        """
+        timings = {}
+        _connection_timings.value = timings
+        start = time.perf_counter()
+        try:
+            response = super().send(request, stream=stream, **kwargs)
+            timings["ttfb"] = time.perf_counter() - start
+            if not stream:
+                response.content
+                timings["total"] = time.perf_counter() - start
+            else:
+                timings["total"] = None
+        finally:
+            _connection_timings.value = None
+        timings["new_connection"] = "connect" in timings
+        for phase in ("dns", "connect", "tls"):
+            timings.setdefault(phase, 0.0)
+        timings["stream"] = stream
+        response.timings = timings
+        for observer in self.observers:
+            observer(request, response)
+        return response
+
+    def __setstate__(self, state):
+        self.stats = PoolStats()
+        self.observers = []
+        super().__setstate__(state)
+
+
+class GigaChatSession(requests.Session):
+    """
+    Сессия requests для GigaChat API с пулом соединений и общими настройками.
+
+    verify: путь к сертификату или False (см. conftest.get_verify_setting)
+    """
+
+    def __init__(self, verify=False, pool_connections=DEFAULT_POOL_CONNECTIONS,
+                 pool_maxsize=DEFAULT_POOL_MAXSIZE):
+        super().__init__()
+        self.verify = verify
+        # Не берем прокси и CA-бандлы из окружения,
+        # раньше это делалось через proxies={'http': None, 'https': None} в каждом запросе
+        self.trust_env = False
+        self.headers["Connection"] = "keep-alive"
+
+        self.adapter = PooledAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.mount("https://", self.adapter)
+        self.mount("http://", self.adapter)
+
+    @property
+    def pool_stats(self):
+        return self.adapter.stats
+
+    def pool_sizes(self):
+        """
+        Текущее состояние пулов: число пулов (хостов), открытых соединений,
+        ожидающих в пулах, и соединений, взятых из пулов и не возвращенных
+        (например, непрочитанные потоковые ответы).
+        """
+        manager = self.adapter.poolmanager
+        pools = [manager.pools[key] for key in manager.pools.keys()]
+        idle = in_use = 0
+        for pool in pools:
+            if pool.pool is None:
+                continue
+            with pool.pool.mutex:
+                queued = list(pool.pool.queue)
+            idle += sum(1 for conn in queued if conn is not None and getattr(conn, "sock", None) is not None)
+            in_use += max(0, pool.pool.maxsize - len(queued))
+        return {"pools": len(pools), "idle": idle, "in_use": in_use}
+
+    def add_observer(self, observer):
+        """
+        observer(request, response) вызывается после каждого ответа из сети
+        (ответы из кэша replay сюда не попадают).
+        """
+        self.adapter.observers.append(observer)
+
+    def wrap_adapter(self, factory):
+        """
+        Оборачивает текущий адаптер: factory(inner) -> новый адаптер.
+        Так поверх пула подключаются кэш ответов и другие слои.
+        """
+        wrapped = factory(self.get_adapter("https://"))
+        self.mount("https://", wrapped)
+        self.mount("http://", wrapped)
+        return wrapped
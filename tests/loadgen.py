@@ -0,0 +1,375 @@
+"""
+Генератор нагрузки на chat/completions.
+
+Сценарии нагрузки - тела запросов из tests/test_gigachat_api.py, поэтому
+нагрузочный прогон использует те же запросы, что и функциональные тесты.
+
+Режимы:
+    closed  concurrency потоков отправляют запросы друг за другом (замкнутый цикл)
+    open    запросы отправляются с заданной частотой rps независимо от ответов
+            (пуассоновский поток), одновременно выполняется не больше concurrency.
+            Задержка считается от запланированного момента отправки, поэтому
+            ожидание свободного места тоже попадает в перцентили. Запросы, место
+            для которых не освободилось до конца duration, не отправляются.
+
+Запуск из командной строки:
+    python -m tests.loadgen --mode open --rps 5 --duration 60 --ramp-up 10
+    python -m tests.loadgen --mode closed --concurrency 8 --duration 30 --stub
+
+Запуск через pytest (тесты с меткой load):
+    pytest -m load --gigachat-load-mode=open --gigachat-load-rps=2 --gigachat-load-duration=30
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+MODES = ("open", "closed")
+
+
+class Scenario:
+    """
+    Один вид запроса в смеси нагрузки. weight - относительная частота.
+    """
+
+    def __init__(self, name, payload, weight=1.0):
+        self.name = name
+        self.payload = payload
+        self.weight = weight
+
+
+def default_scenarios():
+    """
+    Смесь нагрузки из тел запросов функциональных тестов (только успешные сценарии).
+    """
+    from . import test_gigachat_api as api
+
+    scenarios = [
+        Scenario("basic", api.BASIC_PAYLOAD),
+        Scenario("system_message", api.SYSTEM_MESSAGE_PAYLOAD),
+        Scenario("multiple_messages", api.MULTIPLE_MESSAGES_PAYLOAD),
+        Scenario("max_tokens", api.MAX_TOKENS_PAYLOAD),
+        Scenario("response_structure", api.RESPONSE_STRUCTURE_PAYLOAD),
+        Scenario("multilingual", api.MULTILINGUAL_PAYLOAD),
+    ]
+    scenarios += [Scenario(f"temperature={t}", api.temperature_payload(t)) for t in api.TEMPERATURES]
+    scenarios += [Scenario(f"model={m}", api.model_payload(m)) for m in api.MODELS]
+    return scenarios
+
+
+def filter_scenarios(scenarios, prefixes):
+    if not prefixes:
+        return scenarios
+    selected = [s for s in scenarios if s.name.startswith(tuple(prefixes))]
+    if not selected:
+        raise ValueError(f"Нет сценариев, начинающихся с {prefixes}")
+    return selected
+
+
+class LatencyHistogram:
+    """
+    Гистограмма задержек с логарифмическими корзинами: точность около 2%
+    в диапазоне от 1 мс до десятков минут при постоянном объеме памяти.
+    """
+
+    MIN_VALUE = 0.001
+    FACTOR = 1.02
+
+    def __init__(self):
+        self.counts = Counter()
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def _bucket(self, value):
+        if value <= self.MIN_VALUE:
+            return 0
+        return int(math.log(value / self.MIN_VALUE) / math.log(self.FACTOR)) + 1
+
+    def _upper(self, bucket):
+        return self.MIN_VALUE * self.FACTOR ** bucket
+
+    def add(self, value):
+        self.counts[self._bucket(value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def percentile(self, p):
+        if not self.count:
+            return None
+        target = max(1, math.ceil(p / 100 * self.count))
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= target:
+                return min(self._upper(bucket), self.max)
+        return self.max
+
+    def rows(self, bins=10):
+        """
+        Строки для текстовой гистограммы: (от, до, количество), bins интервалов
+        в логарифмической шкале между min и max.
+        """
+        if not self.count:
+            return []
+        low, high = max(self.min, self.MIN_VALUE), max(self.max, self.MIN_VALUE * 1.01)
+        step = (math.log(high) - math.log(low)) / bins or 1.0
+        edges = [math.exp(math.log(low) + step * i) for i in range(bins + 1)]
+        counts = [0] * bins
+        for bucket, n in self.counts.items():
+            value = min(self._upper(bucket), self.max)
+            index = min(bins - 1, max(0, int((math.log(max(value, low)) - math.log(low)) / step)))
+            counts[index] += n
+        return [(edges[i], edges[i + 1], counts[i]) for i in range(bins)]
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+        }
+
+
+class LoadResult:
+    """
+    Итоги нагрузочного прогона: задержки, коды ответа, ошибки, пропускная способность.
+    """
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.latency = LatencyHistogram()
+        self.statuses = Counter()
+        self.errors = Counter()
+        self.by_scenario = Counter()
+        self.started = None
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def record(self, scenario, latency, status=None, error=None):
+        with self._lock:
+            self.latency.add(latency)
+            self.by_scenario[scenario] += 1
+            if error is not None:
+                self.errors[error] += 1
+            else:
+                self.statuses[status] += 1
+
+    @property
+    def completed(self):
+        return self.latency.count
+
+    @property
+    def failed(self):
+        return sum(self.errors.values()) + sum(n for s, n in self.statuses.items() if not 200 <= s < 300)
+
+    @property
+    def error_rate(self):
+        return self.failed / self.completed if self.completed else 0.0
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def throughput(self):
+        return self.completed / self.elapsed if self.started and self.elapsed > 0 else 0.0
+
+    def as_dict(self):
+        return {
+            "settings": self.settings,
+            "completed": self.completed,
+            "elapsed": round(self.elapsed, 3),
+            "throughput_rps": round(self.throughput, 3),
+            "error_rate": round(self.error_rate, 4),
+            "latency": self.latency.as_dict(),
+            "statuses": {str(k): v for k, v in sorted(self.statuses.items())},
+            "errors": dict(self.errors),
+            "scenarios": dict(self.by_scenario),
+        }
+
+    def report(self):
+        s = self.settings
+        lat = self.latency.as_dict()
+        lines = [
+            f"Нагрузка: mode={s['mode']}, rps={s['rps']}, concurrency={s['concurrency']}, "
+            f"duration={s['duration']} с, ramp-up={s['ramp_up']} с, сценариев: {s['scenarios']}",
+            f"Завершено запросов: {self.completed} за {self.elapsed:.1f} с, "
+            f"пропускная способность {self.throughput:.2f} req/s",
+        ]
+        if self.completed:
+            lines.append(
+                f"Задержка, с: p50={lat['p50']:.3f} p90={lat['p90']:.3f} p99={lat['p99']:.3f} "
+                f"min={lat['min']:.3f} max={lat['max']:.3f} mean={lat['mean']:.3f}"
+            )
+        lines.append("Коды ответа: " + (", ".join(f"{k}: {v}" for k, v in sorted(self.statuses.items())) or "-"))
+        if self.errors:
+            lines.append("Ошибки соединения: " + ", ".join(f"{k}: {v}" for k, v in self.errors.items()))
+        lines.append(f"Доля ошибок: {self.error_rate:.1%}")
+        rows = self.latency.rows()
+        if rows:
+            lines.append("Гистограмма задержек, с:")
+            peak = max(n for _, _, n in rows) or 1
+            for low, high, n in rows:
+                lines.append(f"  {low:8.3f} - {high:8.3f} | {'#' * round(40 * n / peak):<40} {n}")
+        return "\n".join(lines)
+
+
+class LoadGenerator:
+    """
+    Генератор нагрузки поверх requests.Session (обычно GigaChatSession).
+
+    headers: функция без аргументов, возвращающая заголовки запроса
+    (вызывается на каждый запрос, чтобы подхватывать обновленный токен)
+    on_response: вызывается с каждым полученным ответом из потока нагрузки
+    (например, чтобы учесть метрики и расход токенов)
+    """
+
+    def __init__(self, session, url, headers, scenarios=None, mode="closed", concurrency=4, rps=1.0,
+                 duration=30.0, ramp_up=0.0, seed=None, timeout=120.0, on_response=None):
+        if mode not in MODES:
+            raise ValueError(f"Неизвестный режим нагрузки: {mode}")
+        if mode == "open" and rps <= 0:
+            raise ValueError(f"Частота запросов в режиме open должна быть больше 0: {rps}")
+        self.session = session
+        self.url = url
+        self.headers = headers
+        self.scenarios = scenarios or default_scenarios()
+        self.mode = mode
+        self.concurrency = concurrency
+        self.rps = rps
+        self.duration = duration
+        self.ramp_up = min(ramp_up, duration)
+        self.timeout = timeout
+        self.on_response = on_response
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._weights = [s.weight for s in self.scenarios]
+        self.result = LoadResult({
+            "mode": mode, "rps": rps, "concurrency": concurrency, "duration": duration,
+            "ramp_up": self.ramp_up, "scenarios": len(self.scenarios),
+        })
+
+    def _pick(self):
+        with self._rng_lock:
+            return self._rng.choices(self.scenarios, self._weights)[0]
+
+    def _send(self, scenario, scheduled):
+        import requests
+
+        headers = {**self.headers(), "X-Request-ID": str(uuid.uuid4())}
+        status = error = None
+        try:
+            response = self.session.post(self.url, json=scenario.payload, headers=headers, timeout=self.timeout)
+            status = response.status_code
+        except requests.RequestException as e:
+            error = type(e).__name__
+        self.result.record(scenario.name, time.perf_counter() - scheduled, status, error)
+        if error is None and self.on_response is not None:
+            self.on_response(response)
+
+    def _rate(self, elapsed):
+        if self.ramp_up and elapsed < self.ramp_up:
+            return max(self.rps * elapsed / self.ramp_up, self.rps / 20)
+        return self.rps
+
+    def _closed_worker(self, index, start, end):
+        # Потоки включаются равномерно в течение ramp-up
+        time.sleep(max(0.0, start + self.ramp_up * index / self.concurrency - time.perf_counter()))
+        while time.perf_counter() < end:
+            self._send(self._pick(), time.perf_counter())
+
+    def _open_loop(self, start, end):
+        # Не больше concurrency запросов в работе: без предела очередь пула растет,
+        # пока API тормозит, и разбирается уже после конца duration
+        slots = threading.BoundedSemaphore(self.concurrency)
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="load") as executor:
+            next_at = start
+            while next_at < end:
+                time.sleep(max(0.0, next_at - time.perf_counter()))
+                if not slots.acquire(timeout=max(0.0, end - time.perf_counter())):
+                    break
+                future = executor.submit(self._send, self._pick(), next_at)
+                future.add_done_callback(lambda _: slots.release())
+                with self._rng_lock:
+                    next_at += self._rng.expovariate(self._rate(next_at - start))
+
+    def run(self):
+        start = self.result.started = time.perf_counter()
+        end = start + self.duration
+        if self.mode == "closed":
+            workers = [threading.Thread(target=self._closed_worker, args=(i, start, end), daemon=True)
+                       for i in range(self.concurrency)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        else:
+            self._open_loop(start, end)
+        self.result.finished = time.perf_counter()
+        return self.result
+
+
+def main():
+    from .conftest import (GIGACHAT_API_BASE_URL, GIGACHAT_BASIC_AUTH_TOKEN, GIGACHAT_OAUTH_URL, fetch_token,
+                           get_verify_setting, make_api_headers)
+    from .http_client import DEFAULT_POOL_MAXSIZE, GigaChatSession
+    from .stub_server import StubConfig, StubServer
+    from .token_cache import TokenCache, credentials_key, default_cache_path
+
+    parser = argparse.ArgumentParser(description="Нагрузка на GigaChat chat/completions")
+    parser.add_argument("--mode", choices=MODES, default="closed")
+    parser.add_argument("--rps", type=float, default=1.0, help="Целевая частота запросов (режим open)")
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="Число потоков (closed) или предел одновременных запросов (open)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Длительность, сек")
+    parser.add_argument("--ramp-up", type=float, default=0.0, help="Время разгона, сек")
+    parser.add_argument("--scenario", action="append", default=[],
+                        help="Оставить только сценарии с этим префиксом (можно несколько раз)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--stub", action="store_true", help="Нагружать локальную заглушку API")
+    parser.add_argument("--json", dest="json_path", help="Сохранить итоги в JSON файл")
+    args = parser.parse_args()
+    if args.mode == "open" and args.rps <= 0:
+        parser.error(f"--rps в режиме open должен быть больше 0: {args.rps}")
+
+    base_url, oauth_url, basic_auth_token = GIGACHAT_API_BASE_URL, GIGACHAT_OAUTH_URL, GIGACHAT_BASIC_AUTH_TOKEN
+    stub = None
+    if args.stub or base_url == "stub":
+        stub = StubServer(StubConfig.from_env()).start()
+        base_url, oauth_url, basic_auth_token = stub.base_url, stub.oauth_url, stub.basic_auth_token
+
+    session = GigaChatSession(verify=get_verify_setting(), pool_maxsize=max(args.concurrency, DEFAULT_POOL_MAXSIZE))
+    tokens = TokenCache(fetch=lambda: fetch_token(session, oauth_url, basic_auth_token),
+                        path=default_cache_path(), key=credentials_key(oauth_url, basic_auth_token))
+    generator = LoadGenerator(
+        session, f"{base_url}/chat/completions", lambda: make_api_headers(tokens.get()),
+        scenarios=filter_scenarios(default_scenarios(), args.scenario), mode=args.mode,
+        concurrency=args.concurrency, rps=args.rps, duration=args.duration, ramp_up=args.ramp_up, seed=args.seed,
+    )
+    try:
+        result = generator.run()
+    finally:
+        tokens.close()
+        session.close()
+        if stub is not None:
+            stub.stop()
+    print(result.report())
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as fh:
+            json.dump(result.as_dict(), fh, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
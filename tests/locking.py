@@ -0,0 +1,116 @@
+"""
+Межпроцессная блокировка через файл.
+
+Нужна, чтобы параллельные воркеры pytest (xdist, несколько агентов Jenkins на
+одной машине) согласованно работали с общими файлами состояния.
+Общее состояние относится к одному прогону (join_run): оставшееся от прошлого
+прогона состояние сбрасывается.
+"""
+import os
+import socket
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+@contextmanager
+def file_lock(path):
+    """
+    Эксклюзивная блокировка файла path на время блока with.
+    Файл создается при необходимости, его содержимое не меняется.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "a+b") as fh:
+        if fcntl is not None:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+        else:
+            fh.seek(0)
+            msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+            else:
+                fh.seek(0)
+                msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def write_atomic(path, data, mode=0o600):
+    """
+    Записывает bytes в файл атомарно (через временный файл и os.replace),
+    чтобы читатели без блокировки никогда не увидели недописанный файл.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+    with os.fdopen(fd, "wb") as fh:
+        fh.write(data)
+    os.replace(tmp_path, path)
+
+
+# Откуда берется id прогона, если он не задан явно: id прогона xdist, BUILD_TAG Jenkins
+RUN_ID_VARIABLES = ("PYTEST_XDIST_TESTRUNUID", "BUILD_TAG")
+# Участник прогона, записанный раньше, считается брошенным (процесс на другой машине убит и т.п.)
+STALE_PARTICIPANT = 24 * 3600.0
+
+
+def default_run_id():
+    """
+    id прогона, общий для воркеров и шардов одной сборки, или None.
+    """
+    for name in RUN_ID_VARIABLES:
+        if os.getenv(name):
+            return os.getenv(name)
+    return None
+
+
+def participant():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _alive(name, joined, now):
+    host, _, pid = name.rpartition(":")
+    if now - joined > STALE_PARTICIPANT:
+        return False
+    # Процессы других машин не проверить, они уходят из прогона сами
+    if host != socket.gethostname() or os.name != "posix":
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, ValueError):
+        return True
+    return True
+
+
+def join_run(state, run_id, fresh):
+    """
+    Регистрирует текущий процесс в общем состоянии state (dict из файла).
+    Состояние другого прогона (другой run_id, а без run_id - ни одного живого
+    участника) заменяется на fresh(). Возвращает True, если состояние сброшено.
+    """
+    now = time.time()
+    members = {name: joined for name, joined in state.get("participants", {}).items()
+               if _alive(name, joined, now)}
+    reset = state.get("run") != run_id or (run_id is None and not members)
+    if reset:
+        state.clear()
+        state.update(fresh())
+        members = {}
+    members[participant()] = now
+    state["run"] = run_id
+    state["participants"] = members
+    return reset
+
+
+def leave_run(state):
+    """
+    Убирает текущий процесс из участников прогона.
+    """
+    state.get("participants", {}).pop(participant(), None)
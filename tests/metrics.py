@@ -0,0 +1,159 @@
+"""
+Метрики запросов к chat/completions.
+
+Для каждого запроса фиксируем DNS/connect/TLS, время до первого байта, полное
+время, размер ответа и скорость генерации (usage.completion_tokens в секунду).
+Метрики прикрепляются к текущему шагу Allure и пишутся в JSON-lines файл
+прогона, чтобы строить графики задержек по model и temperature между сборками.
+Запись маленькая, поэтому прикрепляется всегда; правила --gigachat-attach
+относятся только к телам запросов и ответов (см. attachments.py).
+"""
+import json
+import os
+import threading
+import time
+
+import allure
+
+DEFAULT_DIR = "gigachat-metrics"
+
+
+def _round(value):
+    return round(value, 4) if isinstance(value, float) else value
+
+
+def parse_payload(body):
+    try:
+        payload = json.loads(body)
+    except (TypeError, ValueError):
+        return {}
+    return payload if isinstance(payload, dict) else {}
+
+
+def build_record(request, response, timings=None, usage=None):
+    """
+    Собирает запись метрик по запросу и ответу. timings по умолчанию берутся
+    из response.timings (см. PooledAdapter.send), usage - из тела ответа.
+    Для потоковых ответов timings и usage передает streaming-клиент.
+    """
+    timings = timings or getattr(response, "timings", None) or {}
+    payload = parse_payload(request.body)
+    if usage is None and not timings.get("stream"):
+        try:
+            usage = response.json()["usage"]
+        except (ValueError, KeyError, TypeError):
+            pass
+    usage = usage if isinstance(usage, dict) else {}
+    completion_tokens = usage.get("completion_tokens")
+    total = timings.get("total")
+    record = {
+        "ts": time.time(),
+        "url": request.url,
+        "model": payload.get("model"),
+        "temperature": payload.get("temperature"),
+        "max_tokens": payload.get("max_tokens"),
+        "stream": bool(payload.get("stream")),
+        "status": response.status_code,
+        "new_connection": timings.get("new_connection"),
+        "dns": timings.get("dns"),
+        "connect": timings.get("connect"),
+        "tls": timings.get("tls"),
+        "ttfb": timings.get("ttfb"),
+        "total": total,
+        "ttft": timings.get("ttft"),
+        "max_gap": timings.get("max_gap"),
+        "chunks": timings.get("chunks"),
+        "response_bytes": len(response.content) if not timings.get("stream") else timings.get("response_bytes"),
+        "prompt_tokens": usage.get("prompt_tokens"),
+        "completion_tokens": completion_tokens,
+        "total_tokens": usage.get("total_tokens"),
+        "tokens_per_sec": completion_tokens / total if completion_tokens and total else None,
+    }
+    return {k: _round(v) for k, v in record.items()}
+
+
+class MetricsRecorder:
+    """
+    Записывает метрики запросов в JSON-lines файл и прикрепляет их к Allure.
+
+    Наблюдатель observe подключается к GigaChatSession.add_observer. Запросы из
+    основного потока публикуются сразу (мы находимся внутри allure.step теста).
+    Запросы из пула потоков (ParallelCases) публикуются, когда тест забирает
+    свой ответ - чтобы метрики попали в шаг и тест, к которым относятся.
+    Генератор нагрузки публикует ответы сам из своих потоков, без вложений Allure.
+    Опубликованные записи передаются в listeners (базовая линия, учет токенов)
+    по одной, под блокировкой.
+    """
+
+    def __init__(self, directory=DEFAULT_DIR, run_id=None):
+        self.run_id = run_id or time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+        self.path = os.path.join(directory, f"run-{self.run_id}.jsonl") if directory else None
+        self.build = os.getenv("BUILD_NUMBER")
+        self.test = None
+        self.params = {}
+        self.listeners = []
+        self._fh = None
+        self._lock = threading.Lock()
+        self._listeners_lock = threading.Lock()
+
+    def start_test(self, item):
+        self.test, self.params = self._labels(item)
+
+    @staticmethod
+    def _labels(item):
+        callspec = getattr(item, "callspec", None)
+        return item.nodeid, dict(callspec.params) if callspec else {}
+
+    def finish_test(self):
+        self.test = None
+        self.params = {}
+
+    def observe(self, request, response):
+        if not request.url.rstrip("/").endswith("/chat/completions"):
+            return
+        if response.timings.get("stream"):
+            # Потоковые ответы публикует streaming-клиент после чтения потока
+            return
+        response.metrics = build_record(request, response)
+        if threading.current_thread() is threading.main_thread():
+            self.publish(response)
+
+    def publish(self, response, record=None, attach=True, item=None):
+        """
+        Пишет метрики ответа в файл и прикрепляет к текущему шагу Allure
+        (attach=False - только файл и listeners). item - тест, к которому
+        относится ответ, если это не текущий тест. Повторный вызов для того же
+        ответа ничего не делает.
+        """
+        record = record or getattr(response, "metrics", None)
+        if record is None or getattr(response, "metrics_published", False):
+            return
+        response.metrics_published = True
+        test, params = self._labels(item) if item is not None else (self.test, self.params)
+        record = {"run_id": self.run_id, "build": self.build, "test": test,
+                  "params": {k: str(v) for k, v in params.items()}, **record}
+        self._write(record)
+        with self._listeners_lock:
+            for listener in self.listeners:
+                listener(record)
+        if not attach:
+            return
+        allure.attach(json.dumps(record, ensure_ascii=False, indent=2), name="timings",
+                      attachment_type=allure.attachment_type.JSON)
+
+    def _write(self, record):
+        if self.path is None:
+            return
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._fh is None:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self._fh = open(self.path, "a", encoding="utf-8")
+            self._fh.write(line)
+            self._fh.flush()
+
+    def close(self):
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
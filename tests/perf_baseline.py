@@ -0,0 +1,244 @@
+"""
+Базовая линия производительности и проверка регрессий между сборками.
+
+После каждого прогона для каждого прошедшего теста сохраняются две величины:
+duration - длительность фазы call (наша обвязка + сеть) и latency - суммарное
+время HTTP-запросов к chat/completions из метрик (см. metrics.MetricsRecorder).
+Ключ - id теста, в котором уже есть значения параметризации (temperature, model).
+Базовая линия хранит последние window значений по каждому ключу, отдельно для
+каждого стенда (настоящий API или заглушка).
+
+Текущее значение считается регрессией, если оно статистически значимо выше
+базовой линии (z-оценка относительно среднего и стандартного отклонения окна)
+и при этом больше и в относительном, и в абсолютном выражении - чтобы не
+срабатывать на шум быстрых тестов. Регрессии в базовую линию не добавляются,
+а откладываются: после accept_after регрессий подряд новый уровень считается
+нормой и заменяет окно (задержка API сдвинулась намеренно и надолго).
+
+Для кейсов, запросы которых ParallelCases отправляет одной группой, duration
+не ведется: время всей группы достается кейсу, который выполнился первым, а
+это зависит от -k. Для них сравнивается только latency собственного запроса.
+"""
+import json
+import math
+import os
+import time
+from collections import defaultdict
+
+import pytest
+
+from . import allure_summary
+from .locking import file_lock, write_atomic
+
+DEFAULT_PATH = os.path.join("gigachat-metrics", "baseline.json")
+DEFAULT_WINDOW = 20
+DEFAULT_MIN_SAMPLES = 5
+DEFAULT_Z = 3.0
+DEFAULT_RATIO = 0.2
+DEFAULT_MIN_DELTA = 0.05
+DEFAULT_ACCEPT_AFTER = 3
+# Нижняя граница стандартного отклонения (доля от среднего): у стабильных
+# тестов разброс окна почти нулевой, и любое отклонение давало бы огромный z
+MIN_STD_FRACTION = 0.05
+METRICS = ("duration", "latency")
+# Фикстура группового выполнения параметризованных кейсов (см. async_client.ParallelCases)
+GROUPED_FIXTURE = "parallel_cases"
+
+
+def mean_std(values):
+    mean = sum(values) / len(values)
+    if len(values) < 2:
+        return mean, 0.0
+    variance = sum((v - mean) ** 2 for v in values) / (len(values) - 1)
+    return mean, math.sqrt(variance)
+
+
+def compare(current, samples, z=DEFAULT_Z, ratio=DEFAULT_RATIO, min_delta=DEFAULT_MIN_DELTA,
+            min_samples=DEFAULT_MIN_SAMPLES):
+    """
+    Сравнивает текущее значение с окном базовой линии.
+    Возвращает словарь со статистикой и verdict: "regression", "ok" или "no-baseline".
+    """
+    if len(samples) < min_samples:
+        return {"verdict": "no-baseline", "current": current, "samples": len(samples)}
+    mean, std = mean_std(samples)
+    std = max(std, mean * MIN_STD_FRACTION, 1e-6)
+    score = (current - mean) / std
+    delta = current - mean
+    change = delta / mean if mean else math.inf
+    regression = score > z and change > ratio and delta > min_delta
+    return {
+        "verdict": "regression" if regression else "ok",
+        "current": round(current, 4),
+        "mean": round(mean, 4),
+        "std": round(std, 4),
+        "z": round(score, 2),
+        "change": round(change, 4),
+        "samples": len(samples),
+    }
+
+
+class BaselineStore:
+    """
+    JSON-файл базовой линии: {target: {id теста: {"params": ..., metric: [значения],
+    "pending": {metric: [регрессии подряд]}}}}.
+    Чтение и обновление идут под файловой блокировкой, поэтому несколько воркеров
+    или агентов с общим каталогом не теряют значения друг друга.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, window=DEFAULT_WINDOW, accept_after=DEFAULT_ACCEPT_AFTER):
+        self.path = path
+        self.window = window
+        self.accept_after = accept_after
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def update(self, target, samples):
+        """
+        Добавляет значения прогона. samples: {id теста: {"params": ..., metric: значение,
+        "regressed": [метрики-регрессии]}}. Регрессия откладывается в pending; после
+        accept_after регрессий подряд отложенные значения заменяют окно.
+        Возвращает [(id теста, метрика)], для которых принят новый уровень.
+        """
+        accepted = []
+        with file_lock(f"{self.path}.lock"):
+            data = self.load()
+            tests = data.setdefault(target, {})
+            for key, sample in samples.items():
+                entry = tests.setdefault(key, {})
+                entry["params"] = sample["params"]
+                pending = entry.setdefault("pending", {})
+                for metric in METRICS:
+                    if sample.get(metric) is None:
+                        continue
+                    value = round(sample[metric], 4)
+                    if metric not in sample.get("regressed", ()):
+                        pending.pop(metric, None)
+                        values = entry.setdefault(metric, [])
+                        values.append(value)
+                        del values[:-self.window]
+                        continue
+                    shifted = pending.setdefault(metric, [])
+                    shifted.append(value)
+                    if len(shifted) >= self.accept_after:
+                        entry[metric] = shifted[-self.window:]
+                        del pending[metric]
+                        accepted.append((key, metric))
+                if not pending:
+                    del entry["pending"]
+                entry["updated"] = time.time()
+            write_atomic(self.path, json.dumps(data, ensure_ascii=False, indent=1).encode("utf-8"), mode=0o644)
+        return accepted
+
+
+class PerfBaseline:
+    """
+    pytest-плагин: собирает значения прогона, сравнивает с базовой линией,
+    выводит отчет в терминал и в Allure, при включенном gate роняет сборку.
+    """
+
+    def __init__(self, store, target, gate=False, z=DEFAULT_Z, ratio=DEFAULT_RATIO,
+                 min_delta=DEFAULT_MIN_DELTA, min_samples=DEFAULT_MIN_SAMPLES):
+        self.store = store
+        self.target = target
+        self.gate = gate
+        self.thresholds = {"z": z, "ratio": ratio, "min_delta": min_delta, "min_samples": min_samples}
+        self.params = {}
+        self.grouped = set()
+        self.durations = {}
+        self.latencies = defaultdict(float)
+        self.results = []
+        self.accepted = []
+
+    @property
+    def regressions(self):
+        return [r for r in self.results if r["verdict"] == "regression"]
+
+    def observe_record(self, record):
+        """
+        Наблюдатель MetricsRecorder: суммирует время запросов текущего теста.
+        """
+        if record.get("test") and record.get("total") is not None and record.get("status") == 200:
+            self.latencies[record["test"]] += record["total"]
+
+    def pytest_collection_finish(self, session):
+        for item in session.items:
+            callspec = getattr(item, "callspec", None)
+            self.params[item.nodeid] = {k: str(v) for k, v in callspec.params.items()} if callspec else {}
+            if callspec and GROUPED_FIXTURE in item.fixturenames:
+                self.grouped.add(item.nodeid)
+
+    def pytest_runtest_logreport(self, report):
+        if report.when == "call" and report.passed:
+            self.durations[report.nodeid] = report.duration
+
+    def pytest_sessionfinish(self, session):
+        baseline = self.store.load().get(self.target, {})
+        samples = {}
+        for key, duration in self.durations.items():
+            current = {"duration": None if key in self.grouped else duration, "latency": self.latencies.get(key)}
+            entry = baseline.get(key, {})
+            regressed = []
+            for metric in METRICS:
+                if current[metric] is None:
+                    continue
+                result = compare(current[metric], entry.get(metric, []), **self.thresholds)
+                self.results.append({"test": key, "params": self.params.get(key, {}), "metric": metric, **result})
+                if result["verdict"] == "regression":
+                    regressed.append(metric)
+            samples[key] = {"params": self.params.get(key, {}), "regressed": regressed, **current}
+        if samples:
+            self.accepted = self.store.update(self.target, samples)
+        if self.results:
+            self._attach()
+        if self.gate and self.regressions and session.exitstatus == 0:
+            session.exitstatus = pytest.ExitCode.TESTS_FAILED
+
+    def report(self):
+        """
+        Текстовый отчет: регрессии и тесты, для которых еще нет базовой линии.
+        """
+        compared = [r for r in self.results if r["verdict"] != "no-baseline"]
+        lines = [
+            f"baseline: {self.store.path} [{self.target}], "
+            f"compared: {len(compared)}, regressions: {len(self.regressions)}, "
+            f"no baseline yet: {len(self.results) - len(compared)}",
+        ]
+        for r in self.regressions:
+            lines.append(
+                f"REGRESSION {r['metric']:<8} {r['test']}: {r['current']:.3f}s vs {r['mean']:.3f}s "
+                f"(+{r['change']:.0%}, z={r['z']}, n={r['samples']})"
+            )
+        for test, metric in self.accepted:
+            lines.append(f"new level accepted after {self.store.accept_after} regressions in a row: "
+                         f"{metric} {test}")
+        return "\n".join(lines)
+
+    def _attach(self):
+        passed = not self.regressions
+        allure_summary.report_summary(
+            "Регрессии производительности",
+            [
+                ("perf_report", self.report(), allure_summary.TEXT),
+                ("perf_comparison", json.dumps(self.results, ensure_ascii=False, indent=2), allure_summary.JSON),
+            ],
+            passed=passed,
+            message=None if passed else f"Регрессий производительности: {len(self.regressions)}",
+            description=f"Сравнение с базовой линией {self.store.path}, пороги: {self.thresholds}",
+        )
+
+    def pytest_terminal_summary(self, terminalreporter):
+        if not self.results:
+            return
+        terminalreporter.write_sep("-", "performance baseline")
+        for line in self.report().splitlines():
+            terminalreporter.write_line(line, red=line.startswith("REGRESSION"))
+        if self.gate and self.regressions:
+            terminalreporter.write_line("perf gate: регрессии производительности, прогон помечен как упавший",
+                                        red=True)
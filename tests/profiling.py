@@ -0,0 +1,318 @@
+"""
+Профилирование тестов по фазам (--gigachat-profile).
+
+Для каждого теста считается, сколько времени ушло на:
+    setup / call / teardown   фазы pytest целиком
+    fixture:<имя>             создание фикстуры (например, получение токена)
+    http                      запросы к API (по response.timings из PooledAdapter)
+    json                      Response.json() ответов API
+    schema                    validators.validate
+    allure.attach             запись вложений Allure
+    other                     остаток фазы call (логика теста, assert и т.п.)
+Шаги allure.step учитываются отдельно (они включают в себя остальные фазы).
+
+Для N самых медленных тестов можно сохранить профиль cProfile
+(--gigachat-profile-cprofile N): профилируется каждый тест, хранятся только N
+самых медленных профилей. В конце прогона выводится сводная таблица.
+
+Замеры относятся к тесту, только если сделаны в потоке, который выполняет
+тест: запросы фоновых потоков (нагрузка, прогрев) в фазы не попадают, а
+время запросов, отправленных заранее для ParallelCases, учитывает кейс,
+который забрал ответ (claim).
+"""
+import heapq
+import io
+import itertools
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import allure_commons
+import pytest
+
+from . import allure_summary
+
+DEFAULT_DIR = os.path.join("gigachat-metrics", "profile")
+# Фазы внутри call, из которых складывается время теста (без пересечений)
+CALL_PHASES = ("http", "json", "schema", "allure.attach")
+
+_active = None
+
+
+@contextmanager
+def phase(name):
+    """
+    Засекает время блока как фазу name текущего теста. Без --gigachat-profile ничего не делает.
+    """
+    profiler = _active
+    if profiler is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profiler.add(name, time.perf_counter() - started)
+
+
+class _AttachStart:
+    """Первая реализация хуков вложений Allure: засекает начало записи."""
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+
+    @allure_commons.hookimpl(tryfirst=True)
+    def attach_data(self, body, name, attachment_type, extension):
+        self.profiler._attach_started.value = time.perf_counter()
+
+    @allure_commons.hookimpl(tryfirst=True)
+    def attach_file(self, source, name, attachment_type, extension):
+        self.profiler._attach_started.value = time.perf_counter()
+
+
+class _AttachStop:
+    """Последняя реализация хуков вложений Allure: считает время записи."""
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+
+    def _stop(self):
+        started = getattr(self.profiler._attach_started, "value", None)
+        if started is not None:
+            self.profiler.add("allure.attach", time.perf_counter() - started)
+            self.profiler._attach_started.value = None
+
+    @allure_commons.hookimpl(trylast=True)
+    def attach_data(self, body, name, attachment_type, extension):
+        self._stop()
+
+    @allure_commons.hookimpl(trylast=True)
+    def attach_file(self, source, name, attachment_type, extension):
+        self._stop()
+
+
+class _StepTimer:
+    """Засекает длительность шагов allure.step."""
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+        self._started = {}
+
+    @allure_commons.hookimpl
+    def start_step(self, uuid, title, params):
+        self._started[uuid] = (title, time.perf_counter())
+
+    @allure_commons.hookimpl
+    def stop_step(self, uuid, exc_type, exc_val, exc_tb):
+        title, started = self._started.pop(uuid, (None, None))
+        if title is not None:
+            self.profiler.add_step(title, time.perf_counter() - started)
+
+
+class PhaseProfiler:
+    """
+    pytest-плагин профилирования по фазам.
+
+    cprofile_top: сколько профилей cProfile самых медленных тестов сохранить (0 - не профилировать)
+    directory: куда писать phases.json и .prof файлы (пустая строка - не писать)
+    """
+
+    def __init__(self, cprofile_top=0, directory=DEFAULT_DIR):
+        self.cprofile_top = cprofile_top
+        self.directory = directory
+        self.tests = {}
+        self.steps = defaultdict(lambda: [0.0, 0])
+        self.current = None
+        self._profiles = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._attach_started = threading.local()
+        self._allure_plugins = [_AttachStart(self), _AttachStop(self), _StepTimer(self)]
+        self._thread = None
+
+    # Сбор замеров
+
+    def add(self, name, seconds):
+        if threading.current_thread() is not self._thread:
+            return
+        with self._lock:
+            if self.current is not None:
+                phases = self.tests[self.current]["phases"]
+                phases[name] = phases.get(name, 0.0) + seconds
+
+    def add_step(self, title, seconds):
+        with self._lock:
+            entry = self.steps[title]
+            entry[0] += seconds
+            entry[1] += 1
+
+    def observe(self, request, response):
+        """
+        Наблюдатель GigaChatSession.add_observer: время запроса к API
+        и время Response.json() этого ответа.
+        """
+        original = response.json
+
+        def timed_json(**kwargs):
+            with phase("json"):
+                return original(**kwargs)
+
+        # Только у этого ответа, а не у requests.Response всего процесса
+        response.json = timed_json
+        self.claim(response)
+
+    def claim(self, response):
+        """
+        Учитывает время запроса в тесте, который использует ответ.
+        Для потоковых ответов - до заголовков (чтение потока попадает в other).
+        """
+        timings = response.timings
+        self.add("http", timings["total"] if timings["total"] is not None else timings["ttfb"])
+
+    # Подключение к pytest и Allure
+
+    def pytest_configure(self, config):
+        global _active
+        _active = self
+        for plugin in self._allure_plugins:
+            allure_commons.plugin_manager.register(plugin)
+
+    def pytest_unconfigure(self, config):
+        global _active
+        _active = None
+        for plugin in self._allure_plugins:
+            allure_commons.plugin_manager.unregister(plugin)
+
+    @pytest.hookimpl(wrapper=True)
+    def pytest_runtest_protocol(self, item, nextitem):
+        self.tests[item.nodeid] = {"phases": {}}
+        self.current = item.nodeid
+        self._thread = threading.current_thread()
+        try:
+            return (yield)
+        finally:
+            self.current = None
+
+    @pytest.hookimpl(wrapper=True)
+    def pytest_fixture_setup(self, fixturedef, request):
+        started = time.perf_counter()
+        try:
+            return (yield)
+        finally:
+            self.add(f"fixture:{fixturedef.argname}", time.perf_counter() - started)
+
+    @pytest.hookimpl(wrapper=True)
+    def pytest_runtest_call(self, item):
+        if not self.cprofile_top:
+            return (yield)
+        import cProfile
+
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+        profile.enable()
+        try:
+            return (yield)
+        finally:
+            profile.disable()
+            self._keep_profile(time.perf_counter() - started, item.nodeid, profile)
+
+    def _keep_profile(self, duration, nodeid, profile):
+        entry = (duration, next(self._counter), nodeid, profile)
+        if len(self._profiles) < self.cprofile_top:
+            heapq.heappush(self._profiles, entry)
+        else:
+            heapq.heappushpop(self._profiles, entry)
+
+    def pytest_runtest_logreport(self, report):
+        test = self.tests.get(report.nodeid)
+        if test is not None:
+            test[report.when] = report.duration
+
+    # Отчет
+
+    def summary(self):
+        """
+        Суммы по фазам за прогон: {фаза: (секунды, число тестов)}.
+        other - время call за вычетом http, json, schema и allure.attach.
+        """
+        totals = defaultdict(lambda: [0.0, 0])
+        for test in self.tests.values():
+            phases = dict(test["phases"])
+            for when in ("setup", "call", "teardown"):
+                if when in test:
+                    phases[when] = test[when]
+            if "call" in test:
+                phases["other"] = max(0.0, test["call"] - sum(phases.get(p, 0.0) for p in CALL_PHASES))
+            for name, seconds in phases.items():
+                totals[name][0] += seconds
+                totals[name][1] += 1
+        return totals
+
+    def report(self, fixtures=8, steps=8, slowest=5):
+        totals = self.summary()
+        suite = sum(totals[w][0] for w in ("setup", "call", "teardown") if w in totals) or 1.0
+        lines = [f"{'phase':<56} {'total, s':>9} {'share':>6} {'tests':>6}"]
+
+        def row(name, seconds, count):
+            lines.append(f"{name[:56]:<56} {seconds:>9.3f} {seconds / suite:>6.1%} {count:>6}")
+
+        for name in ("setup", "call", "teardown", *CALL_PHASES, "other"):
+            if name in totals:
+                row(name, *totals[name])
+        top_fixtures = sorted(((k, v) for k, v in totals.items() if k.startswith("fixture:")),
+                              key=lambda kv: -kv[1][0])[:fixtures]
+        for name, (seconds, count) in top_fixtures:
+            row(name, seconds, count)
+        for title, (seconds, count) in sorted(self.steps.items(), key=lambda kv: -kv[1][0])[:steps]:
+            row(f"step: {title}", seconds, count)
+
+        by_duration = sorted(self.tests.items(), key=lambda kv: -sum(kv[1].get(w, 0.0)
+                                                                     for w in ("setup", "call", "teardown")))
+        lines.append("slowest tests:")
+        for nodeid, test in by_duration[:slowest]:
+            total = sum(test.get(w, 0.0) for w in ("setup", "call", "teardown"))
+            top = sorted(test["phases"].items(), key=lambda kv: -kv[1])[:3]
+            detail = ", ".join(f"{name} {seconds:.3f}" for name, seconds in top)
+            lines.append(f"  {total:.3f}s {nodeid} ({detail})")
+        return "\n".join(lines)
+
+    def _profile_texts(self):
+        import pstats
+
+        texts = []
+        for duration, _, nodeid, profile in sorted(self._profiles, reverse=True):
+            stream = io.StringIO()
+            pstats.Stats(profile, stream=stream).sort_stats("cumulative").print_stats(25)
+            texts.append((duration, nodeid, profile, stream.getvalue()))
+        return texts
+
+    def pytest_sessionfinish(self, session):
+        if not self.tests:
+            return
+        profiles = self._profile_texts()
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            data = {"summary": {k: {"seconds": round(v[0], 4), "tests": v[1]} for k, v in self.summary().items()},
+                    "steps": {k: {"seconds": round(v[0], 4), "count": v[1]} for k, v in self.steps.items()},
+                    "tests": self.tests}
+            with open(os.path.join(self.directory, "phases.json"), "w", encoding="utf-8") as fh:
+                json.dump(data, fh, ensure_ascii=False, indent=1)
+            for index, (_, nodeid, profile, _) in enumerate(profiles, 1):
+                profile.dump_stats(os.path.join(self.directory, f"slowest-{index}.prof"))
+        attachments = [("phases", self.report(), allure_summary.TEXT)]
+        attachments += [(f"cProfile {duration:.2f}s {nodeid}", text, allure_summary.TEXT)
+                        for duration, nodeid, _, text in profiles]
+        allure_summary.report_summary("Профиль фаз тестов", attachments)
+
+    def pytest_terminal_summary(self, terminalreporter):
+        if not self.tests:
+            return
+        terminalreporter.write_sep("-", "phase profile")
+        for line in self.report().splitlines():
+            terminalreporter.write_line(line)
+        if self._profiles and self.directory:
+            terminalreporter.write_line(f"cProfile of {len(self._profiles)} slowest tests: "
+                                        f"{self.directory}/slowest-*.prof")
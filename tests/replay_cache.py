@@ -0,0 +1,209 @@
+"""
+Запись и воспроизведение ответов chat/completions.
+
+Тестам, которые проверяют только структуру ответа, не обязательно каждый раз
+ждать генерацию и тратить токены. Ответ сохраняется на диск по хэшу
+нормализованного запроса (model, messages, temperature, max_tokens) и
+при следующих запусках отдается из кэша.
+
+Режимы (--gigachat-replay):
+    off            кэш не используется (по умолчанию)
+    record         всегда ходим в API и перезаписываем кэш
+    replay         отдаем ответ из кэша, при промахе идем в API и записываем ответ
+    refresh-stale  как replay, но записи старше --gigachat-replay-ttl перезапрашиваются
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+from .locking import write_atomic
+
+MODES = ("off", "record", "replay", "refresh-stale")
+DEFAULT_DIR = ".gigachat-replay"
+DEFAULT_TTL_HOURS = 24
+DEFAULT_MAX_AGE_DAYS = 7
+DEFAULT_MAX_MB = 50
+
+# Поля запроса, от которых зависит ответ
+KEY_FIELDS = ("model", "messages", "temperature", "max_tokens")
+# Заголовки ответа, которые не имеет смысла хранить
+SKIP_HEADERS = {"date", "set-cookie", "connection", "keep-alive", "transfer-encoding"}
+# Адрес заглушки в ключе кэша: порт у нее каждый раз новый
+STUB_HOST = "stub"
+
+
+# Ответы, которые не кэшируем: сбои и ошибки авторизации (например, 401 с
+# истекшим токеном) зависят не от запроса, а от состояния API или токена
+UNCACHEABLE_STATUSES = {401, 403, 407, 408, 429}
+
+
+def cacheable(status):
+    """
+    Кэшируются успешные ответы и детерминированные ошибки запроса (400, 404,
+    422 и т.п.): тесты с меткой replayable проверяют и их.
+    """
+    return status < 500 and status not in UNCACHEABLE_STATUSES
+
+
+def request_key(url, body, host=None):
+    """
+    Ключ кэша для запроса: sha256 от нормализованного тела и адреса.
+    host заменяет адрес сервера (host:port) в ключе.
+    Возвращает None, если запрос не подходит для кэширования.
+    """
+    try:
+        payload = json.loads(body)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(payload, dict) or payload.get("stream"):
+        return None
+    parts = urlsplit(url)
+    normalized = {"url": f"{parts.scheme}://{host or parts.netloc}{parts.path}"}
+    normalized.update({field: payload.get(field) for field in KEY_FIELDS})
+    normalized["messages"] = [
+        {"role": m.get("role"), "content": m.get("content")} for m in normalized["messages"] or []
+    ]
+    data = json.dumps(normalized, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+class ReplayStore:
+    """
+    Хранилище ответов: по одному gzip-файлу на запрос.
+    Записи старше max_age удаляются, при превышении max_bytes удаляются
+    давно не использованные.
+    """
+
+    def __init__(self, directory=DEFAULT_DIR, max_bytes=DEFAULT_MAX_MB * 1024 * 1024,
+                 max_age=DEFAULT_MAX_AGE_DAYS * 24 * 3600):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json.gz")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as fh:
+                entry = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry["recorded_at"] > self.max_age:
+            return None
+        # mtime - время последнего использования, по нему вытесняем лишнее
+        os.utime(path)
+        return entry
+
+    def put(self, key, entry):
+        data = gzip.compress(json.dumps(entry, separators=(",", ":")).encode(), compresslevel=6)
+        write_atomic(self._path(key), data, mode=0o644)
+        self.evict()
+
+    def evict(self):
+        now = time.time()
+        files = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json.gz"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if now - stat.st_mtime > self.max_age:
+                os.remove(path)
+            else:
+                files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+
+def serialize_response(response):
+    return {
+        "recorded_at": time.time(),
+        "status": response.status_code,
+        "reason": response.reason,
+        "headers": {k: v for k, v in response.headers.items() if k.lower() not in SKIP_HEADERS},
+        # surrogateescape + ensure_ascii позволяют хранить и не-UTF-8 тело без потерь
+        "body": response.content.decode("utf-8", errors="surrogateescape"),
+    }
+
+
+def build_response(entry, request):
+    from requests import Response
+    from requests.structures import CaseInsensitiveDict
+
+    response = Response()
+    response.status_code = entry["status"]
+    response.reason = entry["reason"]
+    response.headers = CaseInsensitiveDict(entry["headers"])
+    response._content = entry["body"].encode("utf-8", errors="surrogateescape")
+    response.encoding = None
+    response.url = request.url
+    response.request = request
+    response.elapsed = timedelta(0)
+    response.from_replay = True
+    return response
+
+
+class ReplayAdapter:
+    """
+    Адаптер requests (send и close, как у requests.adapters.BaseAdapter) поверх
+    основного (inner): отдает ответы из ReplayStore и записывает туда новые.
+
+    enabled переключается на каждый тест: кэш применяется только к тестам
+    с меткой replayable. host заменяет адрес сервера в ключе кэша (для заглушки
+    на случайном порту - STUB_HOST).
+    """
+
+    def __init__(self, inner, store, mode="replay", ttl=DEFAULT_TTL_HOURS * 3600, host=None):
+        if mode not in MODES:
+            raise ValueError(f"Неизвестный режим replay: {mode}")
+        self.inner = inner
+        self.store = store
+        self.mode = mode
+        self.ttl = ttl
+        self.host = host
+        self.enabled = False
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        key = None
+        if self.enabled and self.mode != "off" and request.method == "POST" and not kwargs.get("stream"):
+            key = request_key(request.url, request.body, self.host)
+        if key is None:
+            return self.inner.send(request, **kwargs)
+
+        if self.mode != "record":
+            entry = self.store.get(key)
+            if entry is not None and (self.mode == "replay" or time.time() - entry["recorded_at"] <= self.ttl):
+                with self._lock:
+                    self.hits += 1
+                return build_response(entry, request)
+
+        with self._lock:
+            self.misses += 1
+        response = self.inner.send(request, **kwargs)
+        if cacheable(response.status_code):
+            self.store.put(key, serialize_response(response))
+        return response
+
+    def close(self):
+        self.inner.close()
+
+    def stats(self):
+        return {"mode": self.mode, "hits": self.hits, "misses": self.misses}
@@ -38,3 +38,35 @@ schema_chat_completion = {
     },
     "required": ["object", "created", "model", "choices", "usage"]
 }
+
+schema_embeddings = {
+    "type": "object",
+    "properties": {
+        "object": {"type": "string"},
+        "model": {"type": "string"},
+        "data": {
+            "type": "array",
+            "minItems": 1,
+            "items": {
+                "type": "object",
+                "properties": {
+                    "object": {"type": "string"},
+                    "index": {"type": "integer"},
+                    "embedding": {
+                        "type": "array",
+                        "items": {"type": "number"}
+                    },
+                    "usage": {
+                        "type": "object",
+                        "properties": {
+                            "prompt_tokens": {"type": "integer"}
+                        },
+                        "required": ["prompt_tokens"]
+                    }
+                },
+                "required": ["object", "index", "embedding"]
+            }
+        }
+    },
+    "required": ["object", "model", "data"]
+}
@@ -0,0 +1,124 @@
+"""
+Поиск почти одинаковых ответов: шинглы, MinHash и LSH.
+
+Ответы сравниваются не точным совпадением строк, а по сходству Жаккара
+множеств шинглов (последовательностей из k слов). MinHash-сигнатура
+фиксированной длины оценивает это сходство за O(длина сигнатуры) на пару,
+а LSH (разбиение сигнатуры на полосы) отбирает только пары-кандидаты,
+поэтому сравнение десятков моделей и промптов не требует перебора всех пар
+и сканирования строк.
+"""
+import re
+import struct
+import zlib
+from collections import defaultdict
+from hashlib import blake2b
+from itertools import combinations
+
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_NUM_PERM = 128
+DEFAULT_SHINGLE_SIZE = 3
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def shingles(text, k=DEFAULT_SHINGLE_SIZE):
+    """
+    Множество хэшей k-словных шинглов текста (регистр и пунктуация не учитываются).
+    Текст короче k слов дает один шингл из всех слов.
+    """
+    words = _WORD.findall(text.lower())
+    if len(words) < k:
+        return {zlib.crc32(" ".join(words).encode("utf-8"))} if words else set()
+    return {zlib.crc32(" ".join(words[i:i + k]).encode("utf-8")) for i in range(len(words) - k + 1)}
+
+
+def _permutations(num_perm, seed=1):
+    """
+    Коэффициенты (a, b) универсальных хэш-функций (a*x + b) mod p, детерминированно от seed.
+    """
+    params = []
+    for i in range(num_perm):
+        digest = blake2b(f"{seed}:{i}".encode(), digest_size=16).digest()
+        a, b = struct.unpack("<QQ", digest)
+        params.append((a % (_PRIME - 1) + 1, b % _PRIME))
+    return params
+
+
+class MinHasher:
+    """
+    Строит MinHash-сигнатуры и оценивает по ним сходство Жаккара.
+    """
+
+    def __init__(self, num_perm=DEFAULT_NUM_PERM, shingle_size=DEFAULT_SHINGLE_SIZE, seed=1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self._params = _permutations(num_perm, seed)
+
+    def signature(self, text):
+        features = shingles(text, self.shingle_size)
+        if not features:
+            return (_MAX_HASH,) * self.num_perm
+        return tuple(
+            min(((a * x + b) % _PRIME) & _MAX_HASH for x in features)
+            for a, b in self._params
+        )
+
+    @staticmethod
+    def similarity(sig_a, sig_b):
+        """
+        Оценка сходства Жаккара: доля совпавших позиций сигнатур.
+        """
+        return sum(x == y for x, y in zip(sig_a, sig_b)) / len(sig_a)
+
+
+def choose_bands(num_perm, threshold):
+    """
+    Разбиение сигнатуры на bands полос по rows строк, при котором порог
+    срабатывания LSH (1/bands)^(1/rows) ближе всего к threshold снизу -
+    чтобы кандидаты около порога не терялись. Для очень низких порогов -
+    самое мягкое разбиение (полоса на каждую позицию).
+    """
+    best = (num_perm, 1)
+    best_distance = None
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        lsh_threshold = (1 / bands) ** (1 / rows)
+        if lsh_threshold > threshold:
+            continue
+        distance = threshold - lsh_threshold
+        if best_distance is None or distance < best_distance:
+            best, best_distance = (bands, rows), distance
+    return best
+
+
+def near_duplicates(texts, threshold=DEFAULT_THRESHOLD, hasher=None):
+    """
+    Пары почти одинаковых текстов.
+
+    texts: dict ключ -> текст
+    Возвращает (pairs, signatures): pairs - список (ключ1, ключ2, сходство)
+    с оценкой сходства не ниже threshold, по убыванию сходства.
+    """
+    hasher = hasher or MinHasher()
+    signatures = {key: hasher.signature(text) for key, text in texts.items()}
+    bands, rows = choose_bands(hasher.num_perm, threshold)
+    buckets = defaultdict(list)
+    for key, signature in signatures.items():
+        for band in range(bands):
+            buckets[(band, signature[band * rows:(band + 1) * rows])].append(key)
+
+    candidates = set()
+    for keys in buckets.values():
+        if len(keys) > 1:
+            candidates.update(combinations(sorted(keys, key=str), 2))
+    pairs = []
+    for a, b in candidates:
+        score = hasher.similarity(signatures[a], signatures[b])
+        if score >= threshold:
+            pairs.append((a, b, score))
+    pairs.sort(key=lambda pair: -pair[2])
+    return pairs, signatures
@@ -0,0 +1,422 @@
+"""
+Soak-режим (--gigachat-soak): долгий повтор тестов и поиск утечек.
+
+Тесты с меткой soak (часть TestGigaChatCompletions) повторяются по кругу
+заданное время, остальные тесты в этом режиме не выбираются. Между тестами,
+не чаще чем раз в interval секунд, снимаются замеры процесса:
+    rss_mb            резидентная память процесса за вычетом памяти обвязки
+                      (harness_mb) и служебной памяти tracemalloc
+    traced_mb         память, выделенная Python (tracemalloc), без обвязки
+    harness_mb        память, выделенная в pytest, pluggy, allure-pytest и самом
+                      soak-режиме: она растет с числом выполненных тестов (отчеты
+                      для сводки терминала, финализаторы сессионных фикстур,
+                      временной ряд), но это не утечка
+    fds               открытые файловые дескрипторы (в том числе сокеты)
+    threads           живые потоки
+    pool_idle         открытые соединения, ожидающие в пулах HTTP-сессии
+    pool_in_use       соединения, взятые из пулов и не возвращенные
+Для tracemalloc дополнительно сохраняются места, где память выросла сильнее
+всего относительно замера после прогрева.
+
+Состояние pytest и allure-pytest не трогается: память обвязки отделяется
+по файлам стека аллокации (см. HARNESS_MODULES и memory_kind). Стек нужен глубже
+одного кадра: отчеты pytest создаются в сгенерированном коде и стандартной
+библиотеке, вызванных из _pytest.
+
+Рост считается устойчивым, если медианы нескольких последовательных окон
+замеров не убывают, наклон линейной регрессии выше допустимого роста в час,
+а последнее окно выше первого хотя бы на минимальную величину (см. GROWTH_METRICS).
+Первые WARMUP_FRACTION замеров (импорты, кэши, пул соединений) не учитываются.
+Устойчивый рост любой метрики помечает прогон как упавший. Если память обвязки
+отделена (tracemalloc включен), утечку памяти определяет traced_mb, а rss_mb
+только показывается: объекты обвязки дробят кучу, и RSS растет быстрее harness_mb.
+"""
+import csv
+import fnmatch
+import functools
+import gc
+import io
+import json
+import os
+import re
+import statistics
+import sys
+import sysconfig
+import threading
+import time
+import tracemalloc
+
+import _pytest
+import allure_commons
+import allure_pytest
+import pluggy
+import pytest
+
+from . import allure_summary
+
+DEFAULT_DIR = os.path.join("gigachat-metrics", "soak")
+DEFAULT_INTERVAL = 30.0
+DEFAULT_RSS_GROWTH = 20.0
+DEFAULT_COUNT_GROWTH = 5.0
+DEFAULT_TRACEMALLOC_FRAMES = 6
+WARMUP_FRACTION = 0.2
+WINDOWS = 4
+TOP_ALLOCATORS = 10
+COLUMNS = ("elapsed", "iteration", "tests", "rss_mb", "rss_raw_mb", "traced_mb", "harness_mb", "fds",
+           "threads", "pool_idle", "pool_in_use")
+# Метрика -> (предел роста в час: "memory" - МБ, "count" - штуки; минимальный рост за прогон)
+# rss_mb проверяется, только если tracemalloc выключен (см. docstring модуля)
+GROWTH_METRICS = {
+    "rss_mb": ("memory", 4.0),
+    "traced_mb": ("memory", 2.0),
+    "fds": ("count", 3),
+    "threads": ("count", 3),
+    "pool_in_use": ("count", 2),
+}
+_MB = 1024 * 1024
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)([hms]?)")
+_DURATION_UNITS = {"h": 3600, "m": 60, "s": 1, "": 1}
+# Аллокации самого tracemalloc и импорта модулей - не утечки
+_IGNORED_FILES = (tracemalloc.__file__, "<frozen importlib._bootstrap>",
+                  "<frozen importlib._bootstrap_external>", "<unknown>")
+# Обвязка: pytest хранит отчеты всех тестов до конца прогона, soak.py - замеры
+HARNESS_MODULES = (_pytest, pluggy, allure_commons, allure_pytest)
+_HARNESS_FILES = tuple(os.path.join(os.path.dirname(module.__file__), "*") for module in HARNESS_MODULES) + (__file__,)
+# Стандартная библиотека и сгенерированный код (dataclasses, attrs) выделяют память
+# по просьбе вызывающего, поэтому аллокация относится к ближайшему кадру вне них
+_STDLIB_DIR = sysconfig.get_paths()["stdlib"]
+_SITE_DIRS = tuple({sysconfig.get_paths()["purelib"], sysconfig.get_paths()["platlib"]})
+
+
+def parse_duration(value):
+    """
+    Длительность '90', '90s', '30m', '2h', '1h30m' в секундах.
+    """
+    text = value.strip().lower()
+    parts = _DURATION.findall(text)
+    if not parts or "".join(number + unit for number, unit in parts) != text:
+        raise ValueError(f"Неверная длительность: {value!r}")
+    return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+
+
+def rss_bytes():
+    """
+    Текущий RSS процесса (Linux), иначе пиковый RSS из getrusage, либо None.
+    """
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # На macOS ru_maxrss в байтах, на остальных системах в КБ
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def open_fds():
+    """
+    Число открытых файловых дескрипторов процесса или None, если его не узнать.
+    """
+    for path in ("/proc/self/fd", "/dev/fd"):
+        try:
+            return len(os.listdir(path))
+        except OSError:
+            continue
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def _file_kind(filename):
+    if any(fnmatch.fnmatch(filename, pattern) for pattern in _HARNESS_FILES):
+        return "harness"
+    if filename.startswith("<") or (filename.startswith(_STDLIB_DIR) and not filename.startswith(_SITE_DIRS)):
+        return None
+    return "traced"
+
+
+def memory_kind(traceback):
+    """
+    Чья память выделена по стеку traceback (как в tracemalloc, старый вызов первым):
+    "ignored" (tracemalloc, импорт модулей), "harness" (ближайший кадр вне
+    стандартной библиотеки - обвязка) или "traced". Классифицируется статистика
+    по стекам, а не каждый блок: Snapshot.filter_traces на больших снимках
+    занимает секунды.
+    """
+    if any(fnmatch.fnmatch(traceback[-1].filename, pattern) for pattern in _IGNORED_FILES):
+        return "ignored"
+    for frame in reversed(traceback):
+        kind = _file_kind(frame.filename)
+        if kind is not None:
+            return kind
+    return "traced"
+
+
+@functools.lru_cache(maxsize=None)
+def _malloc_trim():
+    try:
+        import ctypes
+
+        return ctypes.CDLL("libc.so.6").malloc_trim
+    except (OSError, AttributeError, ImportError):
+        return None
+
+
+def _trim_heap():
+    """
+    Возвращает системе освобожденную память кучи (glibc malloc_trim), чтобы RSS
+    не рос от фрагментации после снимков tracemalloc и других временных объектов.
+    """
+    trim = _malloc_trim()
+    if trim is not None:
+        trim(0)
+
+
+def sustained_growth(samples, key, rate_limit, min_growth, windows=WINDOWS, warmup=WARMUP_FRACTION):
+    """
+    Проверяет устойчивый рост метрики key по замерам.
+    Возвращает словарь со статистикой и verdict: "growth", "ok" или "not-enough-samples".
+    """
+    points = [(sample["elapsed"], sample[key]) for sample in samples if sample.get(key) is not None]
+    points = points[int(len(points) * warmup):]
+    if len(points) < 2 * windows:
+        return {"verdict": "not-enough-samples", "samples": len(points)}
+    size = len(points) / windows
+    medians = [statistics.median(value for _, value in points[round(i * size):round((i + 1) * size)])
+               for i in range(windows)]
+    mean_x = statistics.fmean(x for x, _ in points)
+    mean_y = statistics.fmean(y for _, y in points)
+    spread = sum((x - mean_x) ** 2 for x, _ in points)
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in points) / spread * 3600 if spread else 0.0
+    growth = medians[-1] - medians[0]
+    sustained = (all(b >= a for a, b in zip(medians, medians[1:]))
+                 and slope > rate_limit and growth >= min_growth)
+    return {
+        "verdict": "growth" if sustained else "ok",
+        "slope_per_hour": round(slope, 3),
+        "growth": round(growth, 3),
+        "limit_per_hour": rate_limit,
+        "medians": [round(m, 3) for m in medians],
+        "samples": len(points),
+    }
+
+
+class SoakRunner:
+    """
+    pytest-плагин soak-режима.
+
+    duration: сколько секунд повторять тесты (последний круг доигрывается целиком)
+    interval: как часто снимать замеры, секунды
+    rss_growth: допустимый рост rss_mb и traced_mb, МБ в час
+    count_growth: допустимый рост fds, threads и pool_in_use, штук в час
+    tracemalloc_frames: глубина стека tracemalloc (0 - не включать)
+    directory: куда писать timeseries.csv и soak.json (пустая строка - не писать)
+    """
+
+    def __init__(self, duration, interval=DEFAULT_INTERVAL, rss_growth=DEFAULT_RSS_GROWTH,
+                 count_growth=DEFAULT_COUNT_GROWTH, tracemalloc_frames=DEFAULT_TRACEMALLOC_FRAMES,
+                 directory=DEFAULT_DIR):
+        self.duration = duration
+        self.interval = interval
+        self.limits = {"memory": rss_growth, "count": count_growth}
+        self.tracemalloc_frames = tracemalloc_frames
+        self.directory = directory
+        self.http_session = None
+        self.samples = []
+        self.allocators = []
+        self.results = {}
+        self.iteration = 0
+        self.tests = 0
+        self._started = None
+        self._last_sample = None
+        self._own_tracing = False
+        self._baseline_snapshot = None
+
+    def watch_session(self, session):
+        """
+        Подключает HTTP-сессию, размеры пулов которой нужно замерять.
+        """
+        self.http_session = session
+
+    def pytest_collection_modifyitems(self, config, items):
+        selected = [item for item in items if item.get_closest_marker("soak") is not None]
+        deselected = [item for item in items if item.get_closest_marker("soak") is None]
+        if deselected:
+            config.hook.pytest_deselected(items=deselected)
+            items[:] = selected
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_runtestloop(self, session):
+        """
+        Повторяет выбранные тесты по кругу до истечения duration.
+        Как и в стандартном цикле pytest, уважает -x/--maxfail и прерывание.
+        """
+        if session.testsfailed and not session.config.option.continue_on_collection_errors:
+            raise session.Interrupted(f"{session.testsfailed} errors during collection")
+        if session.config.option.collectonly or not session.items:
+            return None
+        items = session.items
+        if self.tracemalloc_frames and not tracemalloc.is_tracing():
+            tracemalloc.start(self.tracemalloc_frames)
+            self._own_tracing = True
+        self._started = time.monotonic()
+        deadline = self._started + self.duration
+        while True:
+            self.iteration += 1
+            for index, item in enumerate(items):
+                # Следующий тест всегда есть: фикстуры сессии живут весь прогон
+                nextitem = items[(index + 1) % len(items)]
+                item.config.hook.pytest_runtest_protocol(item=item, nextitem=nextitem)
+                self.tests += 1
+                if session.shouldfail:
+                    raise session.Failed(session.shouldfail)
+                if session.shouldstop:
+                    raise session.Interrupted(session.shouldstop)
+                if self._last_sample is None or time.monotonic() - self._last_sample >= self.interval:
+                    self.sample()
+            if time.monotonic() >= deadline:
+                break
+        self.sample()
+        return True
+
+    def sample(self):
+        """
+        Снимает один замер процесса и добавляет его во временной ряд.
+        """
+        gc.collect()
+        _trim_heap()
+        now = time.monotonic()
+        self._last_sample = now
+        elapsed = now - self._started
+        rss = rss_bytes()
+        pools = self.http_session.pool_sizes() if self.http_session is not None else {}
+        sample = {
+            "elapsed": round(elapsed, 1),
+            "iteration": self.iteration,
+            "tests": self.tests,
+            "rss_mb": round(rss / _MB, 2) if rss is not None else None,
+            "rss_raw_mb": round(rss / _MB, 2) if rss is not None else None,
+            "traced_mb": None,
+            "harness_mb": None,
+            "fds": open_fds(),
+            "threads": threading.active_count(),
+            "pool_idle": pools.get("idle"),
+            "pool_in_use": pools.get("in_use"),
+        }
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            sizes = {"ignored": 0, "harness": 0, "traced": 0}
+            traced = {}
+            for stat in snapshot.statistics("traceback"):
+                kind = memory_kind(stat.traceback)
+                sizes[kind] += stat.size
+                if kind == "traced":
+                    frame = stat.traceback[-1]
+                    where = (frame.filename, frame.lineno)
+                    size, count = traced.get(where, (0, 0))
+                    traced[where] = (size + stat.size, count + stat.count)
+            sample["traced_mb"] = round(sizes["traced"] / _MB, 2)
+            sample["harness_mb"] = round(sizes["harness"] / _MB, 2)
+            if rss is not None:
+                own = sizes["harness"] + tracemalloc.get_tracemalloc_memory()
+                sample["rss_mb"] = round((rss - own) / _MB, 2)
+            if self._baseline_snapshot is None:
+                # Точка отсчета для топа аллокаций - первый замер после прогрева
+                if elapsed >= self.duration * WARMUP_FRACTION:
+                    self._baseline_snapshot = traced
+            else:
+                self.allocators = self._top_allocators(traced)
+                sample["top"] = [f"{a['where']} {a['size_diff_kb']:+.1f} KB" for a in self.allocators[:3]]
+        self.samples.append(sample)
+        return sample
+
+    def _top_allocators(self, traced):
+        """
+        Строки кода (без обвязки), память которых выросла сильнее всего с прогрева.
+        """
+        baseline = self._baseline_snapshot
+        diffs = []
+        for where in traced.keys() | baseline.keys():
+            size, count = traced.get(where, (0, 0))
+            old_size, old_count = baseline.get(where, (0, 0))
+            diffs.append((size - old_size, count - old_count, size, where))
+        diffs.sort(key=lambda diff: abs(diff[0]), reverse=True)
+        return [{
+            "where": f"{filename}:{lineno}",
+            "size_kb": round(size / 1024, 1),
+            "size_diff_kb": round(size_diff / 1024, 1),
+            "count_diff": count_diff,
+        } for size_diff, count_diff, size, (filename, lineno) in diffs[:TOP_ALLOCATORS]]
+
+    def evaluate(self):
+        self.results = {
+            key: sustained_growth(self.samples, key, self.limits[kind], min_growth)
+            for key, (kind, min_growth) in GROWTH_METRICS.items()
+        }
+        harness_measured = any(sample["harness_mb"] is not None for sample in self.samples)
+        if harness_measured and self.results["rss_mb"]["verdict"] != "not-enough-samples":
+            self.results["rss_mb"]["verdict"] = "info"
+        return [key for key, result in self.results.items() if result["verdict"] == "growth"]
+
+    def timeseries_csv(self):
+        stream = io.StringIO()
+        writer = csv.DictWriter(stream, fieldnames=COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(self.samples)
+        return stream.getvalue()
+
+    def report(self):
+        elapsed = self.samples[-1]["elapsed"] if self.samples else 0
+        lines = [f"soak: {self.iteration} rounds, {self.tests} tests in {elapsed:.0f}s, {len(self.samples)} samples"]
+        for key, result in self.results.items():
+            if result["verdict"] == "not-enough-samples":
+                detail = f"not enough samples ({result['samples']})" if result["samples"] else "not measured"
+                lines.append(f"  {key}: {detail}")
+                continue
+            status = {"growth": "LEAK", "info": "info"}.get(result["verdict"], "ok")
+            lines.append(f"  {key}: {status}, {result['growth']:+g} over run, "
+                         f"{result['slope_per_hour']:+g}/h (limit {result['limit_per_hour']:g}/h)")
+        if self.allocators:
+            lines.append("tracemalloc growth since warm-up:")
+            for allocator in self.allocators:
+                lines.append(f"  {allocator['size_diff_kb']:+10.1f} KB {allocator['count_diff']:+7d} "
+                             f"{allocator['where']}")
+        return "\n".join(lines)
+
+    def pytest_sessionfinish(self, session):
+        if self._own_tracing:
+            # Последний замер уже снят в цикле; дальше tracemalloc только замедляет завершение
+            tracemalloc.stop()
+        if not self.samples:
+            return
+        leaks = self.evaluate()
+        data = {"duration": self.duration, "interval": self.interval, "results": self.results,
+                "allocators": self.allocators, "samples": self.samples}
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, "timeseries.csv"), "w", encoding="utf-8", newline="") as fh:
+                fh.write(self.timeseries_csv())
+            with open(os.path.join(self.directory, "soak.json"), "w", encoding="utf-8") as fh:
+                json.dump(data, fh, ensure_ascii=False, indent=1)
+        allure_summary.report_summary(
+            "Soak: ресурсы процесса",
+            [("timeseries", self.timeseries_csv(), allure_summary.CSV),
+             ("report", self.report(), allure_summary.TEXT),
+             ("soak", json.dumps(data, ensure_ascii=False, indent=1), allure_summary.JSON)],
+            passed=not leaks,
+            message=f"Устойчивый рост: {', '.join(leaks)}" if leaks else None,
+        )
+        if leaks and session.exitstatus == 0:
+            session.exitstatus = pytest.ExitCode.TESTS_FAILED
+
+    def pytest_terminal_summary(self, terminalreporter):
+        if not self.samples:
+            return
+        terminalreporter.write_sep("-", "soak")
+        for line in self.report().splitlines():
+            terminalreporter.write_line(line, red="LEAK" in line)
+        if self.directory:
+            terminalreporter.write_line(f"time series: {self.directory}/timeseries.csv")
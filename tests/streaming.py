@@ -0,0 +1,181 @@
+"""
+Потоковые ответы chat/completions (stream: true).
+
+SSE-события разбираются по мере поступления, без буферизации всего тела.
+Из чанков собирается итоговый ответ в формате обычного chat/completions,
+чтобы его можно было проверить по schema_chat_completion, а по времени
+прихода чанков считаются время до первого токена (TTFT), паузы между чанками
+и общая длительность потока.
+"""
+import json
+import time
+
+from .metrics import build_record
+
+CHUNK_SIZE = 1024
+DONE = "[DONE]"
+
+
+def _iter_raw(response):
+    """
+    Байты ответа по мере поступления. Для chunked-ответов urllib3 отдает
+    каждый HTTP-чанк сразу, для остальных читаем то, что уже пришло (read1).
+    """
+    raw = response.raw
+    if getattr(raw, "chunked", False) or not hasattr(raw, "read1"):
+        yield from response.iter_content(chunk_size=None)
+        return
+    while True:
+        data = raw.read1(CHUNK_SIZE)
+        if not data:
+            # Тело дочитано - возвращаем соединение в пул до response.close()
+            raw.release_conn()
+            return
+        yield data
+
+
+def iter_sse_data(response):
+    """
+    Генератор значений полей data: SSE-потока (по одному на событие).
+    После data: [DONE] события больше не отдаются, но поток дочитывается до
+    конца: брошенный посередине генератор urllib3 закрывает соединение,
+    и оно не возвращается в пул.
+    """
+    buffer = b""
+    data_lines = []
+    done = False
+    for block in _iter_raw(response):
+        if done:
+            continue
+        buffer += block
+        while True:
+            line, sep, rest = buffer.partition(b"\n")
+            if not sep:
+                break
+            buffer = rest
+            line = line.rstrip(b"\r")
+            if not line:
+                if data_lines:
+                    data = "\n".join(data_lines)
+                    data_lines = []
+                    if data == DONE:
+                        done = True
+                        break
+                    yield data
+            elif line.startswith(b"data:"):
+                data_lines.append(line[5:].lstrip().decode("utf-8"))
+    if not done and data_lines and "\n".join(data_lines) != DONE:
+        yield "\n".join(data_lines)
+
+
+class StreamResult:
+    """
+    Результат потокового запроса: чанки, замеры времени и собранный ответ.
+
+    ttft: секунды от отправки запроса до первого непустого фрагмента текста
+    gaps: паузы между соседними чанками, секунды
+    duration: секунды от отправки запроса до конца потока
+    """
+
+    def __init__(self, response, started):
+        self.response = response
+        self.started = started
+        self.status_code = response.status_code
+        self.chunks = 0
+        self.response_bytes = 0
+        self.ttft = None
+        self.gaps = []
+        self.duration = None
+        self._last_chunk_at = None
+        self._meta = {}
+        self._choices = {}
+        self._usage = None
+
+    @property
+    def max_gap(self):
+        return max(self.gaps, default=0.0)
+
+    def add_chunk(self, data, received_at):
+        self.chunks += 1
+        self.response_bytes += len(data)
+        if self._last_chunk_at is not None:
+            self.gaps.append(received_at - self._last_chunk_at)
+        self._last_chunk_at = received_at
+
+        chunk = json.loads(data)
+        for field in ("created", "model"):
+            if field in chunk:
+                self._meta.setdefault(field, chunk[field])
+        if chunk.get("usage"):
+            self._usage = chunk["usage"]
+        for choice in chunk.get("choices", []):
+            state = self._choices.setdefault(choice.get("index", 0), {"role": None, "content": [],
+                                                                      "finish_reason": None})
+            delta = choice.get("delta") or {}
+            if delta.get("role"):
+                state["role"] = delta["role"]
+            if delta.get("content"):
+                state["content"].append(delta["content"])
+                if self.ttft is None:
+                    self.ttft = received_at - self.started
+            if choice.get("finish_reason"):
+                state["finish_reason"] = choice["finish_reason"]
+
+    @property
+    def completion(self):
+        """
+        Ответ, собранный из чанков, в формате обычного (не потокового) chat/completions.
+        """
+        completion = {
+            "object": "chat.completion",
+            **self._meta,
+            "choices": [
+                {
+                    "index": index,
+                    "message": {"role": state["role"], "content": "".join(state["content"])},
+                    "finish_reason": state["finish_reason"],
+                }
+                for index, state in sorted(self._choices.items())
+            ],
+        }
+        if self._usage is not None:
+            completion["usage"] = self._usage
+        return completion
+
+    def as_dict(self):
+        return {
+            "status": self.status_code,
+            "chunks": self.chunks,
+            "ttft": self.ttft,
+            "max_gap": self.max_gap,
+            "duration": self.duration,
+        }
+
+
+def stream_chat_completion(session, url, payload, headers):
+    """
+    Отправляет потоковый запрос и читает SSE-поток до конца.
+    Метрики (ttft, паузы, длительность) публикуются через session.metrics, если он есть.
+    """
+    started = time.perf_counter()
+    response = session.post(url, json={**payload, "stream": True},
+                            headers={**headers, "Accept": "text/event-stream"}, stream=True)
+    result = StreamResult(response, started)
+    try:
+        if response.status_code == 200:
+            for data in iter_sse_data(response):
+                result.add_chunk(data, time.perf_counter())
+        else:
+            response.content
+    finally:
+        response.close()
+    result.duration = time.perf_counter() - started
+
+    recorder = getattr(session, "metrics", None)
+    timings = getattr(response, "timings", None)
+    if recorder is not None and timings is not None:
+        timings = {**timings, "total": result.duration, "ttft": result.ttft, "max_gap": result.max_gap,
+                   "chunks": result.chunks, "response_bytes": result.response_bytes}
+        record = build_record(response.request, response, timings, usage=result.completion.get("usage"))
+        recorder.publish(response, record)
+    return result
@@ -0,0 +1,430 @@
+"""
+Локальная заглушка GigaChat API (/oauth, /chat/completions и /embeddings).
+
+Позволяет запускать тесты и бенчмарки обвязки без доступа к настоящему API:
+ответы соответствуют схемам из tests/schemas.py, а задержки и ошибки
+настраиваются, поэтому результаты повторяемы.
+
+Включение в pytest:
+    pytest --gigachat-stub
+    GIGACHAT_API_BASE_URL=stub pytest
+
+Отдельный процесс (например, для бенчмарков):
+    python -m tests.stub_server --port 8080 --latency "lognormal:0.3,0.4"
+
+Настройки (переменные окружения или аргументы командной строки):
+    GIGACHAT_STUB_LATENCY      распределение задержки ответа, см. parse_latency
+    GIGACHAT_STUB_TOKEN_DELAY  задержка генерации на один токен ответа, секунды
+    GIGACHAT_STUB_429_RATE     доля ответов 429 Too Many Requests (0..1)
+    GIGACHAT_STUB_5XX_RATE     доля ответов 500/502/503 (0..1)
+    GIGACHAT_STUB_SEED         seed генератора случайных чисел
+
+Случайные задержки и ошибки берутся из генератора, который создается на
+каждый запрос от seed, тела запроса и номера такого же запроса. Поэтому
+одновременные запросы не влияют друг на друга, а повторный прогон получает
+те же задержки и ошибки.
+
+Ошибки валидации повторяют настоящий API: пустое сообщение - 400 (тест
+test_chat_completions_empty_message, который ждет 422, помечен xfail),
+temperature выше 2 - 500 (на настоящем API такие запросы падают с 500).
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MODELS = ("GigaChat-2", "GigaChat-2-Pro", "GigaChat-2-Max")
+# Модели эмбеддингов и размерность их векторов
+EMBEDDING_MODELS = {"Embeddings": 1024, "EmbeddingsGigaR": 2560}
+STUB_BASIC_AUTH_TOKEN = "c3R1YjpzdHVi"  # base64("stub:stub")
+TOKEN_TTL = 30 * 60
+DEFAULT_COMPLETION_TOKENS = 40
+# Запросы с temperature выше этого заглушка отклоняет с 500, как настоящий API
+MAX_STABLE_TEMPERATURE = 2.0
+
+RU_WORDS = (
+    "сегодня", "погода", "модель", "ответ", "хорошо", "спасибо", "вопрос", "думаю", "можно",
+    "интересно", "пример", "программирование", "данные", "кратко", "подробно", "день",
+)
+EN_WORDS = (
+    "today", "weather", "model", "answer", "fine", "thanks", "question", "think", "maybe",
+    "interesting", "example", "programming", "data", "short", "detail", "day",
+)
+
+
+class Latency:
+    """
+    Распределение задержки, значения в секундах.
+
+    fixed:0.2            всегда 0.2
+    uniform:0.1,0.5      равномерно от 0.1 до 0.5
+    normal:0.3,0.05      нормальное (отрицательные значения обрезаются до 0)
+    lognormal:0.3,0.4    логнормальное с медианой 0.3 и sigma 0.4
+    exp:0.3              экспоненциальное со средним 0.3
+    """
+
+    def __init__(self, kind="fixed", params=(0.0,)):
+        self.kind = kind
+        self.params = tuple(params)
+
+    @classmethod
+    def parse(cls, spec):
+        kind, _, args = spec.partition(":")
+        params = tuple(float(v) for v in args.split(",") if v) if args else (0.0,)
+        if kind not in ("fixed", "uniform", "normal", "lognormal", "exp"):
+            raise ValueError(f"Неизвестное распределение задержки: {spec}")
+        return cls(kind, params)
+
+    def sample(self, rng):
+        p = self.params
+        if self.kind == "uniform":
+            return rng.uniform(p[0], p[1])
+        if self.kind == "normal":
+            return max(0.0, rng.gauss(p[0], p[1]))
+        if self.kind == "lognormal":
+            return rng.lognormvariate(0, p[1]) * p[0]
+        if self.kind == "exp":
+            return rng.expovariate(1 / p[0]) if p[0] > 0 else 0.0
+        return p[0]
+
+
+def parse_latency(spec):
+    """
+    Разбирает настройку задержки: распределение по умолчанию и для отдельных моделей.
+    Пример: "lognormal:0.3,0.4;GigaChat-2-Max=lognormal:1.0,0.4"
+    """
+    default, by_model = Latency(), {}
+    for part in filter(None, (p.strip() for p in (spec or "").split(";"))):
+        model, sep, dist = part.rpartition("=")
+        if sep:
+            by_model[model] = Latency.parse(dist)
+        else:
+            default = Latency.parse(dist)
+    return default, by_model
+
+
+class StubConfig:
+    """
+    Поведение заглушки: задержки, скорость генерации и доля ошибок.
+    """
+
+    def __init__(self, latency="fixed:0", token_delay=0.0, rate_429=0.0, rate_5xx=0.0, seed=0):
+        self.latency, self.latency_by_model = parse_latency(latency)
+        self.token_delay = token_delay
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.seed = seed
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            latency=os.getenv("GIGACHAT_STUB_LATENCY", "fixed:0"),
+            token_delay=float(os.getenv("GIGACHAT_STUB_TOKEN_DELAY", "0")),
+            rate_429=float(os.getenv("GIGACHAT_STUB_429_RATE", "0")),
+            rate_5xx=float(os.getenv("GIGACHAT_STUB_5XX_RATE", "0")),
+            seed=int(os.getenv("GIGACHAT_STUB_SEED", "0")),
+        )
+
+    def latency_for(self, model):
+        return self.latency_by_model.get(model, self.latency)
+
+
+def count_tokens(text):
+    # Грубая оценка: один токен на слово, этого достаточно для заглушки
+    return max(1, len(text.split()))
+
+
+def generate_embedding(text, model, seed):
+    """
+    Детерминированный единичный вектор для текста: одинаковый текст - одинаковый вектор.
+    """
+    rng = random.Random(hashlib.sha256(f"{model}:{seed}:{text}".encode()).digest())
+    vector = [rng.uniform(-1.0, 1.0) for _ in range(EMBEDDING_MODELS[model])]
+    norm = sum(v * v for v in vector) ** 0.5 or 1.0
+    return [round(v / norm, 6) for v in vector]
+
+
+def generate_content(payload, seed):
+    """
+    Детерминированный текст ответа: зависит от модели, сообщений, temperature и seed,
+    поэтому разные модели отвечают по-разному, а повторный запрос - одинаково.
+    """
+    messages = payload.get("messages") or []
+    prompt = " ".join(str(m.get("content", "")) for m in messages)
+    key = json.dumps([payload.get("model"), prompt, payload.get("temperature"), seed], ensure_ascii=False)
+    rng = random.Random(hashlib.sha256(key.encode()).digest())
+    words = EN_WORDS if "english" in prompt.lower() else RU_WORDS
+    max_tokens = payload.get("max_tokens")
+    n_tokens = DEFAULT_COMPLETION_TOKENS + rng.randint(-10, 10)
+    finish_reason = "stop"
+    if max_tokens and n_tokens >= max_tokens:
+        n_tokens, finish_reason = max_tokens, "length"
+    tokens = [rng.choice(words) for _ in range(n_tokens)]
+    tokens[0] = tokens[0].capitalize()
+    return tokens, finish_reason
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "GigaChatStub/1.0"
+    # Заголовки и тело уходят отдельными write, без TCP_NODELAY ответ задерживается на delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def stub(self):
+        return self.server.stub
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send_json(self, status, data, headers=None):
+        body = json.dumps(data, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, message, headers=None):
+        self._send_json(status, {"status": status, "message": message}, headers)
+
+    def _authorized(self):
+        # Принимаем любой токен заглушки: он мог быть выдан ее прошлым запуском
+        # и сохранен в кэше токена на диске
+        return self.headers.get("Authorization", "").startswith("Bearer stub-")
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            if not self._authorized():
+                return self._send_error(401, "Unauthorized")
+            return self._send_json(200, {
+                "object": "list",
+                "data": [{"id": m, "object": "model", "owned_by": "stub"} for m in (*MODELS, *EMBEDDING_MODELS)],
+            })
+        self._send_error(404, "Not found")
+
+    def do_POST(self):
+        body = self._read_body()
+        path = self.path.rstrip("/")
+        self.rng = self.stub.request_rng(path, body)
+        if path.endswith("/oauth"):
+            return self._oauth()
+        if not self._authorized():
+            return self._send_error(401, "Unauthorized")
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            return self._send_error(400, "Invalid JSON")
+        if path.endswith("/chat/completions"):
+            return self._chat_completions(payload)
+        if path.endswith("/embeddings"):
+            return self._embeddings(payload)
+        self._send_error(404, "Not found")
+
+    def _oauth(self):
+        if not self.headers.get("Authorization", "").startswith("Basic "):
+            return self._send_error(401, "Unauthorized")
+        token = f"stub-{uuid.uuid4()}"
+        self._send_json(200, {"access_token": token, "expires_at": int((time.time() + TOKEN_TTL) * 1000)})
+
+    def _inject_error(self):
+        """Случайная ошибка 429/5xx согласно настройкам. Возвращает True, если ответ уже отправлен."""
+        roll = self.rng.random()
+        if roll < self.stub.config.rate_429:
+            self._send_error(429, "Too Many Requests", {"Retry-After": "1"})
+            return True
+        if roll < self.stub.config.rate_429 + self.stub.config.rate_5xx:
+            status = self.rng.choice((500, 502, 503))
+            self._send_error(status, "Internal Server Error")
+            return True
+        return False
+
+    def _chat_completions(self, payload):
+        model = payload.get("model")
+        messages = payload.get("messages")
+        if not model:
+            return self._send_error(400, "Model is required")
+        if model not in MODELS:
+            return self._send_error(404, f"No such model: {model}")
+        if not messages or not all(str(m.get("content", "")).strip() for m in messages):
+            return self._send_error(400, "Message content must not be empty")
+
+        time.sleep(self.stub.sample_latency(model, self.rng))
+        if (payload.get("temperature") or 0) > MAX_STABLE_TEMPERATURE:
+            return self._send_error(500, "Internal Server Error")
+        if self._inject_error():
+            return
+
+        tokens, finish_reason = generate_content(payload, self.stub.config.seed)
+        prompt_tokens = sum(count_tokens(str(m.get("content", ""))) for m in messages)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(tokens),
+            "total_tokens": prompt_tokens + len(tokens),
+        }
+        if payload.get("stream"):
+            return self._stream(model, tokens, finish_reason, usage)
+
+        time.sleep(self.stub.config.token_delay * len(tokens))
+        self._send_json(200, {
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": " ".join(tokens)},
+                "finish_reason": finish_reason,
+            }],
+            "usage": usage,
+        })
+
+    def _embeddings(self, payload):
+        model = payload.get("model")
+        texts = payload.get("input")
+        if isinstance(texts, str):
+            texts = [texts]
+        if not model:
+            return self._send_error(400, "Model is required")
+        if model not in EMBEDDING_MODELS:
+            return self._send_error(404, f"No such model: {model}")
+        if not texts or not all(isinstance(t, str) and t.strip() for t in texts):
+            return self._send_error(422, "Input must be a non-empty list of non-empty strings")
+
+        time.sleep(self.stub.sample_latency(model, self.rng))
+        if self._inject_error():
+            return
+        time.sleep(self.stub.config.token_delay * len(texts))
+        self._send_json(200, {
+            "object": "list",
+            "model": model,
+            "data": [
+                {"object": "embedding", "index": i, "embedding": generate_embedding(text, model, self.stub.config.seed),
+                 "usage": {"prompt_tokens": count_tokens(text)}}
+                for i, text in enumerate(texts)
+            ],
+        })
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _stream(self, model, tokens, finish_reason, usage):
+        """
+        Ответ в формате SSE (stream: true): по одному событию на токен,
+        последнее событие с finish_reason и usage, затем data: [DONE].
+        """
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        created = int(time.time())
+        for i, token in enumerate(tokens):
+            time.sleep(self.stub.config.token_delay)
+            delta = {"content": token if i == 0 else f" {token}"}
+            if i == 0:
+                delta["role"] = "assistant"
+            chunk = {"object": "chat.completion", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": delta}]}
+            if i == len(tokens) - 1:
+                chunk["choices"][0]["finish_reason"] = finish_reason
+                chunk["usage"] = usage
+            self._write_chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode())
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+
+class StubServer:
+    """
+    Заглушка GigaChat API в фоновом потоке текущего процесса.
+    """
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        self.config = config or StubConfig()
+        self._requests = {}
+        self._requests_lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), StubHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.stub = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def base_url(self):
+        return f"{self.url}/api/v1"
+
+    @property
+    def oauth_url(self):
+        return f"{self.url}/api/v2/oauth"
+
+    basic_auth_token = STUB_BASIC_AUTH_TOKEN
+
+    def request_rng(self, path, body):
+        """
+        Генератор случайных чисел для одного запроса: зависит от seed, адреса,
+        тела и номера такого же запроса (повторы получают новые значения).
+        """
+        key = hashlib.sha256(f"{self.config.seed}:{path}:".encode() + body).hexdigest()
+        with self._requests_lock:
+            number = self._requests.get(key, 0)
+            self._requests[key] = number + 1
+        return random.Random(f"{key}:{number}")
+
+    def sample_latency(self, model, rng):
+        return self.config.latency_for(model).sample(rng)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="gigachat-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        try:
+            self._httpd.serve_forever()
+        finally:
+            self._httpd.server_close()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+def main():
+    env = StubConfig.from_env()
+    parser = argparse.ArgumentParser(description="Заглушка GigaChat API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", default=os.getenv("GIGACHAT_STUB_LATENCY", "fixed:0"))
+    parser.add_argument("--token-delay", type=float, default=env.token_delay)
+    parser.add_argument("--rate-429", type=float, default=env.rate_429)
+    parser.add_argument("--rate-5xx", type=float, default=env.rate_5xx)
+    parser.add_argument("--seed", type=int, default=env.seed)
+    args = parser.parse_args()
+
+    config = StubConfig(args.latency, args.token_delay, args.rate_429, args.rate_5xx, args.seed)
+    server = StubServer(config, host=args.host, port=args.port)
+    print(f"GIGACHAT_API_BASE_URL={server.base_url}")
+    print(f"GIGACHAT_OAUTH_URL={server.oauth_url}")
+    print(f"GIGACHAT_BASIC_AUTH_TOKEN={server.basic_auth_token}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+from types import SimpleNamespace
+
+from .async_client import ParallelCases
+
+
+class _Client:
+    """Клиент без сети: отвечает значением параметра и запоминает группы запросов."""
+
+    def __init__(self):
+        self.batches = []
+
+    def run(self, url, requests):
+        self.batches.append(sorted(requests))
+        return {key: f"response-{key}" for key in requests}
+
+
+def _items(values):
+    parent = SimpleNamespace(nodeid="tests/test_gigachat_api.py::TestGigaChatCompletions")
+    return [SimpleNamespace(parent=parent, originalname="test_temperature",
+                            callspec=SimpleNamespace(params={"temperature": value})) for value in values]
+
+
+def _post(cases, item):
+    return cases.post(SimpleNamespace(node=item), "http://stub/chat/completions",
+                      lambda value: {"temperature": value}, "temperature", {})
+
+
+def test_prefetch_stays_within_limit():
+    items = _items([0.1, 0.5, 1.0, 1.5])
+    client = _Client()
+    cases = ParallelCases(client, prefetch_limit=lambda: 2, scheduled=items)
+
+    assert [_post(cases, item) for item in items] == [f"response-{v}" for v in (0.1, 0.5, 1.0, 1.5)]
+    assert client.batches == [[0.1, 0.5], [1.0], [1.5]]
+
+
+def test_no_prefetch_when_budget_is_exhausted():
+    items = _items([0.1, 0.5])
+    client = _Client()
+    cases = ParallelCases(client, prefetch_limit=lambda: 0, scheduled=items)
+
+    _post(cases, items[0])
+    assert client.batches == [[0.1]]
+    assert cases.leftovers() == []
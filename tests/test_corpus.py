@@ -0,0 +1,84 @@
+import re
+
+import allure
+import pytest
+
+from . import corpus
+from .schemas import schema_chat_completion
+from .validators import validate
+
+
+def pytest_generate_tests(metafunc):
+    """
+    Кейсы корпуса (--gigachat-corpus): по тесту на строку файла своего шарда.
+    Параметр теста - смещение строки, сам кейс читается при выполнении.
+    """
+    if "corpus_offset" not in metafunc.fixturenames:
+        return
+    config = metafunc.config
+    offsets, ids = [], []
+    for offset, _, case_id in corpus.iter_offsets(
+            config.getoption("--gigachat-corpus"),
+            config.getoption("--gigachat-shard-index"),
+            config.getoption("--gigachat-shard-count")):
+        offsets.append(offset)
+        ids.append(case_id)
+    metafunc.parametrize("corpus_offset", offsets, ids=ids)
+
+
+@pytest.mark.corpus
+@pytest.mark.expensive
+@pytest.mark.gigachat
+@allure.feature("GigaChat API")
+@allure.story("Корпус запросов")
+class TestGigaChatCorpus:
+    """Регрессионный прогон корпуса запросов из JSON-lines файла"""
+
+    @allure.description("""Тест: кейс регрессионного корпуса (--gigachat-corpus).
+        Ожидания (код ответа, схема, лимиты токенов, регулярные выражения) заданы в строке корпуса,
+        формат описан в tests/corpus.py.
+        """)
+    @allure.severity(allure.severity_level.NORMAL)
+    def test_corpus_case(self, corpus_reader, corpus_offset, api_base_url, api_headers, http_session):
+
+        try:
+            case = corpus_reader.read(corpus_offset)
+        except ValueError as exc:
+            pytest.fail(f"Некорректная строка корпуса: {exc}")
+        expect = case.get("expect", {})
+        payload = corpus.build_payload(case)
+        allure.dynamic.title(f"Корпус: {case.get('id', corpus_offset)}")
+        allure.dynamic.parameter("model", payload.get("model"))
+
+        with allure.step("Отправляем запрос кейса"):
+            response = http_session.post(f"{api_base_url}/chat/completions", json=payload, headers=api_headers)
+
+        with allure.step("Проверяем код ответа"):
+            assert response.status_code in corpus.expected_statuses(expect), (
+                f"Код ответа {response.status_code}, ожидался {expect.get('status', 200)}: {response.text[:500]}"
+            )
+        if response.status_code != 200:
+            return
+
+        data = response.json()
+        if expect.get("schema", "chat_completion") != "none":
+            with allure.step("Проверяем ответ по JSON схеме"):
+                validate(instance=data, schema=schema_chat_completion)
+
+        content = data["choices"][0]["message"]["content"]
+        usage = data.get("usage", {})
+        with allure.step("Проверяем ожидания кейса"):
+            if "regex" in expect:
+                assert re.search(expect["regex"], content, re.IGNORECASE), (
+                    f"Ответ не соответствует {expect['regex']!r}: {content[:500]}"
+                )
+            if "not_regex" in expect:
+                assert not re.search(expect["not_regex"], content, re.IGNORECASE), (
+                    f"Ответ соответствует запрещенному {expect['not_regex']!r}: {content[:500]}"
+                )
+            if "finish_reason" in expect:
+                assert data["choices"][0]["finish_reason"] == expect["finish_reason"]
+            if "max_completion_tokens" in expect:
+                assert usage["completion_tokens"] <= expect["max_completion_tokens"]
+            if "max_total_tokens" in expect:
+                assert usage["total_tokens"] <= expect["max_total_tokens"]
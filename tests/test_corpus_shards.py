@@ -0,0 +1,43 @@
+import json
+
+from . import corpus
+
+
+def _write_corpus(tmp_path, lines):
+    path = tmp_path / "corpus.jsonl"
+    path.write_bytes("\n".join(lines).encode("utf-8") + b"\n")
+    return str(path)
+
+
+def test_shard_of_is_stable_and_in_range():
+    assert corpus.shard_of("case-1", 4) == corpus.shard_of("case-1", 4)
+    assert {corpus.shard_of(f"case-{i}", 4) for i in range(200)} == {0, 1, 2, 3}
+    assert corpus.shard_of("case-1", 1) == 0
+
+
+def test_iter_offsets_skips_blank_and_comment_lines(tmp_path):
+    path = _write_corpus(tmp_path, [
+        '{"id": "greeting", "prompt": "Привет"}',
+        "",
+        "# комментарий",
+        '{"prompt": "Без id"}',
+        "не JSON",
+    ])
+    cases = list(corpus.iter_offsets(path))
+
+    assert [(lineno, case_id) for _, lineno, case_id in cases] == [(1, "greeting"), (4, "line-4"), (5, "line-5")]
+    reader = corpus.CorpusReader(path)
+    try:
+        assert reader.read(cases[1][0]) == {"prompt": "Без id"}
+    finally:
+        reader.close()
+
+
+def test_iter_offsets_shards_partition_corpus(tmp_path):
+    path = _write_corpus(tmp_path, [json.dumps({"id": f"case-{i}", "prompt": str(i)}) for i in range(50)])
+    everything = {case_id for _, _, case_id in corpus.iter_offsets(path)}
+    shards = [{case_id for _, _, case_id in corpus.iter_offsets(path, index, 3)} for index in range(3)]
+
+    assert set().union(*shards) == everything
+    assert sum(len(shard) for shard in shards) == len(everything)
+    assert all(corpus.shard_of(case_id, 3) == index for index, shard in enumerate(shards) for case_id in shard)
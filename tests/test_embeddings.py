@@ -0,0 +1,32 @@
+import json
+
+import pytest
+
+from .embeddings import decode_embeddings
+
+
+def _body(vectors, order=None):
+    order = order or range(len(vectors))
+    return json.dumps({
+        "object": "list",
+        "model": "Embeddings",
+        "data": [{"object": "embedding", "index": i, "embedding": vectors[i], "usage": {"prompt_tokens": 3}}
+                 for i in order],
+    })
+
+
+def test_decode_matches_json_parse():
+    vectors = [[0.25, -1.5, 3.0], [1e-3, 2.5e-7, -0.125]]
+    data, decoded = decode_embeddings(_body(vectors, order=[1, 0]))
+
+    assert decoded.shape == (2, 3)
+    assert decoded.nbytes == 2 * 3 * 4
+    for i, vector in enumerate(vectors):
+        assert list(decoded[i]) == pytest.approx(vector, rel=1e-6)
+    assert [item["embedding"] for item in data["data"]] == [[], []]
+    assert [item["usage"]["prompt_tokens"] for item in data["data"]] == [3, 3]
+
+
+def test_decode_rejects_mixed_dimensions():
+    with pytest.raises(ValueError):
+        decode_embeddings(_body([[1.0, 2.0], [1.0]]))
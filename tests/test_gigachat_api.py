@@ -1,12 +1,163 @@
-import json
-
 import re
+from itertools import combinations
+
 import allure
 import pytest
-import requests
-from jsonschema import validate
 
 from .schemas import schema_chat_completion
+from .similarity import MinHasher, near_duplicates
+from .streaming import stream_chat_completion
+from .validators import validate
+
+MODELS = ["GigaChat-2", "GigaChat-2-Pro", "GigaChat-2-Max"]
+TEMPERATURES = [0.00005, 0.0001, 0.1, 0.5, 0.9, 1.0, 1.5, 2.0]
+
+# Тела запросов тестов. Используются также генератором нагрузки (tests/loadgen.py)
+BASIC_PAYLOAD = {
+    "model": "GigaChat-2",
+    "messages": [
+        {
+            "role": "user",
+            "content": "Привет! Как дела?"
+        }
+    ],
+    "temperature": 0.7
+}
+
+SYSTEM_MESSAGE_PAYLOAD = {
+    "model": "GigaChat-2",
+    "messages": [
+        {
+            "role": "system",
+            "content": "Ты полезный ассистент, который отвечает кратко и по делу."
+        },
+        {
+            "role": "user",
+            "content": "Что такое GigaChat?"
+        }
+    ]
+}
+
+MULTIPLE_MESSAGES_PAYLOAD = {
+    "model": "GigaChat-2",
+    "messages": [
+        {
+            "role": "user",
+            "content": "Привет, меня зовут Миша"
+        },
+        {
+            "role": "assistant",
+            "content": "Привет, Иван! Как дела?"
+        },
+        {
+            "role": "user",
+            "content": "Отлично, спасибо!"
+        }
+    ]
+}
+
+MAX_TOKENS_PAYLOAD = {
+    "model": "GigaChat-2",
+    "messages": [
+        {
+            "role": "user",
+            "content": "Расскажи подробно о программировании"
+        }
+    ],
+    "max_tokens": 50
+}
+
+EMPTY_MESSAGE_PAYLOAD = {
+    "model": "GigaChat-2",
+    "messages": [
+        {
+            "role": "user",
+            "content": ""
+        }
+    ]
+}
+
+INVALID_MODEL_PAYLOAD = {
+    "model": "InvalidModel",
+    "messages": [
+        {
+            "role": "user",
+            "content": "Тест"
+        }
+    ]
+}
+
+UNDEFINED_MODEL_PAYLOAD = {
+    "model": "",
+    "messages": [
+        {
+            "role": "user",
+            "content": "Тест"
+        }
+    ]
+}
+
+RESPONSE_STRUCTURE_PAYLOAD = {
+    "model": "GigaChat-2",
+    "messages": [
+        {
+            "role": "user",
+            "content": "Ответь одним словом: да или нет?"
+        }
+    ]
+}
+
+MULTILINGUAL_PAYLOAD = {
+    "model": "GigaChat-2",
+    "messages": [
+        {
+            "role": "user",
+            "content": "Please respond to me in English: Good day to you. How are you?"
+        }
+    ]
+}
+
+
+def temperature_payload(temperature):
+    """Тело запроса для test_chat_completions_temperature"""
+    return {
+        "model": "GigaChat-2",
+        "messages": [
+            {
+                "role": "user",
+                "content": "Расскажи коротко о погоде в Москве сегодня"
+            }
+        ],
+        "temperature": temperature
+    }
+
+
+def model_payload(model):
+    """Тело запроса для test_chat_completions_different_models"""
+    return {
+        "model": model,
+        "messages": [
+            {
+                "role": "user",
+                "content": """
+                    Давай пофантазируем! Как думаешь, что говорит о человеке то, с каким персонажем из 
+                    Baldur's Gate 3 он решил устроить романтическую линию?"""
+            }
+        ]
+    }
+
+
+def stream_payload(model):
+    """Тело запроса для test_chat_completions_stream"""
+    return {
+        "model": model,
+        "messages": [
+            {
+                "role": "user",
+                "content": "Расскажи в трех предложениях, как устроен потоковый вывод ответа"
+            }
+        ]
+    }
 
 
 @pytest.mark.gigachat
@@ -15,42 +166,17 @@ from .schemas import schema_chat_completion
 class TestGigaChatCompletions:
     """Тестовый набор для метода chat/completions GigaChat API"""
 
-    response_dict = dict()
-
-    def fill_response_dict(self, response, model):
-        """
-        Заполняем словарь ответами для разных моделей
-        """
-        self.response_dict[model] = response["choices"][0]["message"]["content"]
-        if len(self.response_dict) == 3:
-            return (True, self.response_dict)
-        return (False, None)
-
+    @pytest.mark.soak
     @allure.title("Базовый ответ на простое пользовательское сообщение")
     @allure.description("""Базовый тест: отправка простого сообщения и проверка успешного ответа""")
     @allure.severity(allure.severity_level.CRITICAL)
-    def test_chat_completions_basic(self, api_base_url, api_headers, verify_ssl):
+    def test_chat_completions_basic(self, api_base_url, api_headers, http_session):
         url = f"{api_base_url}/chat/completions"
-        payload = {
-            "model": "GigaChat-2",
-            "messages": [
-                {
-                    "role": "user",
-                    "content": "Привет! Как дела?"
-                }
-            ],
-            "temperature": 0.7
-        }
+        payload = BASIC_PAYLOAD
 
         with allure.step("Отправляем запрос к GigaChat API"):
-            response = requests.post(url, json=payload, headers=api_headers, verify=verify_ssl, proxies={'http': None, 'https': None})
-            # Прикрепляем запрос/ответ к отчету
-            allure.attach(json.dumps(payload, ensure_ascii=False, indent=2),
-                          name="request_body",
-                          attachment_type=allure.attachment_type.JSON)
-            allure.attach(response.text,
-                          name="response_body",
-                          attachment_type=allure.attachment_type.JSON)
+            # Запрос/ответ прикрепляются к отчету при падении (см. --gigachat-attach)
+            response = http_session.post(url, json=payload, headers=api_headers)
 
         with allure.step("Проверяем HTTP статус и структуру ответа"):
             assert response.status_code == 200, (
@@ -62,28 +188,17 @@ class TestGigaChatCompletions:
         with allure.step("Проверяем, что ответ содержит текст"):
             assert len(data["choices"][0]["message"]["content"]) > 0, "Ответ должен содержать текст"
 
+    @pytest.mark.soak
     @allure.title("Ответ с учетом системного промпта")
     @allure.description("""Тест: отправка сообщения с системным промптом""")
     @allure.severity(allure.severity_level.NORMAL)
-    def test_chat_completions_with_system_message(self, api_base_url, api_headers, verify_ssl):
+    def test_chat_completions_with_system_message(self, api_base_url, api_headers, http_session):
 
         url = f"{api_base_url}/chat/completions"
-        payload = {
-            "model": "GigaChat-2",
-            "messages": [
-                {
-                    "role": "system",
-                    "content": "Ты полезный ассистент, который отвечает кратко и по делу."
-                },
-                {
-                    "role": "user",
-                    "content": "Что такое GigaChat?"
-                }
-            ]
-        }
+        payload = SYSTEM_MESSAGE_PAYLOAD
 
         with allure.step("Отправляем запрос с системным промптом"):
-            response = requests.post(url, json=payload, headers=api_headers, verify=verify_ssl, proxies={'http': None, 'https': None})
+            response = http_session.post(url, json=payload, headers=api_headers)
 
         with allure.step("Проверяем статус и роль ответа"):
             assert response.status_code == 200
@@ -94,29 +209,13 @@ class TestGigaChatCompletions:
     @allure.title("Диалог из нескольких сообщений в рамках одной сессии")
     @allure.description("""Тест: диалог с несколькими сообщениями""")
     @allure.severity(allure.severity_level.NORMAL)
-    def test_chat_completions_multiple_messages(self, api_base_url, api_headers, verify_ssl):
+    def test_chat_completions_multiple_messages(self, api_base_url, api_headers, http_session):
 
         url = f"{api_base_url}/chat/completions"
-        payload = {
-            "model": "GigaChat-2",
-            "messages": [
-                {
-                    "role": "user",
-                    "content": "Привет, меня зовут Миша"
-                },
-                {
-                    "role": "assistant",
-                    "content": "Привет, Иван! Как дела?"
-                },
-                {
-                    "role": "user",
-                    "content": "Отлично, спасибо!"
-                }
-            ]
-        }
+        payload = MULTIPLE_MESSAGES_PAYLOAD
 
         with allure.step("Отправляем запрос с несколькими сообщениями"):
-            response = requests.post(url, json=payload, headers=api_headers, verify=verify_ssl, proxies={'http': None, 'https': None})
+            response = http_session.post(url, json=payload, headers=api_headers)
 
         with allure.step("Проверяем, что токены были использованы"):
             assert response.status_code == 200
@@ -124,6 +223,8 @@ class TestGigaChatCompletions:
             validate(instance=data, schema=schema_chat_completion)
             assert data["usage"]["total_tokens"] > 0
 
+    @pytest.mark.soak
+    @pytest.mark.expensive
     @allure.title("Разные значения temperature")
     @allure.severity(allure.severity_level.MINOR)
     @allure.description("""Тест: проверка работы с разными значениями temperature.
@@ -133,49 +234,32 @@ class TestGigaChatCompletions:
         
         Наблюдения: чем выше температура, тем дольше модель думает над ответом
         """)
-    @pytest.mark.parametrize("temperature", [0.00005, 0.0001, 0.1, 0.5, 0.9, 1.0, 1.5, 2.0,
-                                             pytest.param(2.4, marks=pytest.mark.xfail(reason='Иногда возникает ошибка 500'))])
-    def test_chat_completions_temperature(self, api_base_url, api_headers, temperature, verify_ssl):
+    @pytest.mark.parametrize("temperature", TEMPERATURES + [
+        pytest.param(2.4, marks=pytest.mark.xfail(reason='Иногда возникает ошибка 500'))])
+    def test_chat_completions_temperature(self, request, api_base_url, api_headers, temperature, parallel_cases):
 
         url = f"{api_base_url}/chat/completions"
-        payload = {
-            "model": "GigaChat-2",
-            "messages": [
-                {
-                    "role": "user",
-                    "content": "Расскажи коротко о погоде в Москве сегодня"
-                }
-            ],
-            "temperature": temperature
-        }
 
         with allure.step(f"Отправляем запрос с temperature={temperature}"):
-            response = requests.post(url, json=payload, headers=api_headers, verify=verify_ssl, proxies={'http': None, 'https': None})
+            # Запросы всех значений temperature уходят одновременно, здесь берем ответ своего кейса
+            response = parallel_cases.post(request, url, temperature_payload, "temperature", api_headers)
 
         with allure.step("Проверяем успешность ответа и структуру"):
             assert response.status_code == 200
             data = response.json()
             validate(instance=data, schema=schema_chat_completion)
 
+    @pytest.mark.soak
     @allure.title("Ограничение максимального количества токенов в ответе")
     @allure.description("""Тест: проверка ограничения максимального количества токенов в ответе""")
     @allure.severity(allure.severity_level.CRITICAL)
-    def test_chat_completions_max_tokens(self, api_base_url, api_headers, verify_ssl):
+    def test_chat_completions_max_tokens(self, api_base_url, api_headers, http_session):
 
         url = f"{api_base_url}/chat/completions"
-        payload = {
-            "model": "GigaChat-2",
-            "messages": [
-                {
-                    "role": "user",
-                    "content": "Расскажи подробно о программировании"
-                }
-            ],
-            "max_tokens": 50
-        }
+        payload = MAX_TOKENS_PAYLOAD
 
         with allure.step("Отправляем запрос с ограничением max_tokens=50"):
-            response = requests.post(url, json=payload, headers=api_headers, verify=verify_ssl, proxies={'http': None, 'https': None})
+            response = http_session.post(url, json=payload, headers=api_headers)
 
         with allure.step("Проверяем, что лимит токенов не превышен"):
             assert response.status_code == 200
@@ -190,90 +274,59 @@ class TestGigaChatCompletions:
         """)
     @allure.severity(allure.severity_level.NORMAL)
     @pytest.mark.xfail
-    def test_chat_completions_empty_message(self, api_base_url, api_headers, verify_ssl):
+    def test_chat_completions_empty_message(self, api_base_url, api_headers, http_session):
 
         url = f"{api_base_url}/chat/completions"
-        payload = {
-            "model": "GigaChat-2",
-            "messages": [
-                {
-                    "role": "user",
-                    "content": ""
-                }
-            ]
-        }
+        payload = EMPTY_MESSAGE_PAYLOAD
 
         with allure.step("Отправляем запрос с пустым сообщением"):
-            response = requests.post(url, json=payload, headers=api_headers, verify=verify_ssl, proxies={'http': None, 'https': None})
+            response = http_session.post(url, json=payload, headers=api_headers)
 
         with allure.step("Проверяем, что API возвращает ожидаемую ошибку"):
             assert response.status_code in [422]
 
+    @pytest.mark.replayable
     @allure.title("Обработка невалидной модели")
     @allure.description("""Тест: проверка обработки невалидной модели""")
     @allure.severity(allure.severity_level.NORMAL)
-    def test_chat_completions_invalid_model(self, api_base_url, api_headers, verify_ssl):
+    def test_chat_completions_invalid_model(self, api_base_url, api_headers, http_session):
 
         url = f"{api_base_url}/chat/completions"
-        payload = {
-            "model": "InvalidModel",
-            "messages": [
-                {
-                    "role": "user",
-                    "content": "Тест"
-                }
-            ]
-        }
+        payload = INVALID_MODEL_PAYLOAD
 
         with allure.step("Отправляем запрос с невалидной моделью"):
-            response = requests.post(url, json=payload, headers=api_headers, verify=verify_ssl, proxies={'http': None, 'https': None})
+            response = http_session.post(url, json=payload, headers=api_headers)
 
         with allure.step("Проверяем, что возвращается один из ожидаемых кодов ошибки"):
             assert response.status_code in [400, 404, 422]
 
+    @pytest.mark.replayable
     @allure.title("Обработка отсутствующей модели")
     @allure.description("""Тест: проверка обработки отсутствующей модели""")
     @allure.severity(allure.severity_level.NORMAL)
-    def test_chat_completions_undefined_model(self, api_base_url, api_headers, verify_ssl):
+    def test_chat_completions_undefined_model(self, api_base_url, api_headers, http_session):
 
         url = f"{api_base_url}/chat/completions"
-        payload = {
-            "model": "",
-            "messages": [
-                {
-                    "role": "user",
-                    "content": "Тест"
-                }
-            ]
-        }
+        payload = UNDEFINED_MODEL_PAYLOAD
 
         with allure.step("Отправляем запрос с отсутствующей моделью"):
-            response = requests.post(url, json=payload, headers=api_headers, verify=verify_ssl, proxies={'http': None, 'https': None})
+            response = http_session.post(url, json=payload, headers=api_headers)
 
         with allure.step("Проверяем, что возвращается один из ожидаемых кодов ошибки"):
             assert response.status_code in [400, 404, 422]
 
+    @pytest.mark.expensive
     @allure.title("Проверка различных моделей")
     @allure.description("""Тест: параметризованная проверка различных моделей""")
     @allure.severity(allure.severity_level.CRITICAL)
-    @pytest.mark.parametrize("model", ["GigaChat-2", "GigaChat-2-Pro", "GigaChat-2-Max"])
-    def test_chat_completions_different_models(self, api_base_url, api_headers, model, verify_ssl):
+    @pytest.mark.parametrize("model", MODELS)
+    def test_chat_completions_different_models(self, request, api_base_url, api_headers, model, parallel_cases):
 
         url = f"{api_base_url}/chat/completions"
-        payload = {
-            "model": model,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": """
-                    Давай пофантазируем! Как думаешь, что говорит о человеке то, с каким персонажем из 
-                    Baldur's Gate 3 он решил устроить романтическую линию?"""
-                }
-            ]
-        }
 
         with allure.step("Отправляем запрос для проверки различных моделей"):
-            response = requests.post(url, json=payload, headers=api_headers, verify=verify_ssl, proxies={'http': None, 'https': None})
+            # Запросы ко всем моделям уходят одновременно, здесь берем ответ своего кейса
+            response = parallel_cases.post(request, url, model_payload, "model", api_headers)
 
         with allure.step("Проверяем статус и структуру ответа"):
             assert response.status_code == 200, (
@@ -281,37 +334,91 @@ class TestGigaChatCompletions:
             )
             data = response.json()
             validate(instance=data, schema=schema_chat_completion)
-        
-        with allure.step("Проверяем, что ответ уникален для данной модели"):
-            content = data["choices"][0]["message"]["content"]
-            self.fill_response_dict(data, model)
-        
-            if self.response_dict:
-                previous_contents = [v for k, v in self.response_dict.items() if k != model]
-                assert content not in previous_contents, (
-                    f"Ответ для модели {model} совпадает с предыдущими ответами. "
-                    f"Текущий ответ: '{content[:100]}...'"  # Урежем чтобы не захламлять отчет
+        # Уникальность ответов моделей проверяет test_chat_completions_models_comparison
+
+    @pytest.mark.expensive
+    @allure.title("Сравнение ответов разных моделей на один промпт")
+    @allure.description("""Тест: один и тот же промпт одновременно отправляется во все модели матрицы.
+        Ответы не должны быть почти одинаковыми: сходство по MinHash (шинглы из 3 слов) для любой
+        пары моделей должно быть ниже порога --gigachat-similarity-threshold.
+        Результат не зависит от порядка выполнения тестов.
+        """)
+    @allure.severity(allure.severity_level.NORMAL)
+    def test_chat_completions_models_comparison(self, api_base_url, api_headers, parallel_cases,
+                                                similarity_threshold):
+
+        url = f"{api_base_url}/chat/completions"
+
+        with allure.step(f"Отправляем промпт одновременно в модели: {', '.join(MODELS)}"):
+            responses = parallel_cases.post_all(url, model_payload, MODELS, api_headers)
+            for model, response in responses.items():
+                assert response.status_code == 200, (
+                    f"Модель {model}: ожидался статус 200, получен {response.status_code}."
                 )
+            contents = {model: response.json()["choices"][0]["message"]["content"]
+                        for model, response in responses.items()}
+
+        with allure.step(f"Сравниваем ответы моделей (порог сходства {similarity_threshold})"):
+            pairs, signatures = near_duplicates(contents, threshold=similarity_threshold)
+            report = [f"{a} ~ {b}: {score:.2f}" for a, b, score in pairs] or ["почти одинаковых ответов нет"]
+            if len(signatures) <= 20:
+                for a, b in combinations(signatures, 2):
+                    report.append(f"{a} / {b}: {MinHasher.similarity(signatures[a], signatures[b]):.2f}")
+            allure.attach("\n".join(report), name="similarity", attachment_type=allure.attachment_type.TEXT)
+            assert not pairs, (
+                "Почти одинаковые ответы моделей: "
+                + ", ".join(f"{a} и {b} ({score:.2f})" for a, b, score in pairs)
+            )
+
 
+    @pytest.mark.soak
+    @pytest.mark.expensive
+    @allure.title("Потоковый ответ (stream: true)")
+    @allure.description("""Тест: потоковая генерация для каждой модели.
+        Ответ собирается из SSE-чанков и проверяется по той же схеме, что и обычный.
+        Проверяем время до первого токена (TTFT), паузы между чанками и общую длительность потока.
+        Лимиты задаются опциями --gigachat-ttft-limit, --gigachat-chunk-gap-limit, --gigachat-stream-limit.
+        """)
+    @allure.severity(allure.severity_level.CRITICAL)
+    @pytest.mark.parametrize("model", MODELS)
+    def test_chat_completions_stream(self, api_base_url, api_headers, model, http_session, stream_limits):
+
+        url = f"{api_base_url}/chat/completions"
+        payload = stream_payload(model)
+
+        with allure.step("Отправляем потоковый запрос и читаем чанки"):
+            result = stream_chat_completion(http_session, url, payload, api_headers)
+
+        with allure.step("Проверяем статус и структуру собранного ответа"):
+            assert result.status_code == 200, f"Ожидался статус 200, получен {result.status_code}"
+            assert result.chunks > 0, "Поток не содержит ни одного чанка"
+            validate(instance=result.completion, schema=schema_chat_completion)
+            assert len(result.completion["choices"][0]["message"]["content"]) > 0, "Ответ должен содержать текст"
 
+        with allure.step("Проверяем время до первого токена, паузы между чанками и длительность"):
+            assert result.ttft is not None, "В потоке не было ни одного фрагмента текста"
+            assert result.ttft <= stream_limits["ttft"], (
+                f"TTFT {result.ttft:.2f} с больше допустимых {stream_limits['ttft']} с"
+            )
+            assert result.max_gap <= stream_limits["chunk_gap"], (
+                f"Пауза между чанками {result.max_gap:.2f} с больше допустимых {stream_limits['chunk_gap']} с"
+            )
+            assert result.duration <= stream_limits["duration"], (
+                f"Поток длился {result.duration:.2f} с, допустимо {stream_limits['duration']} с"
+            )
+
+    @pytest.mark.soak
+    @pytest.mark.replayable
     @allure.title("Детальная проверка структуры и usage")
     @allure.description("""Тест: детальная проверка структуры ответа""")
     @allure.severity(allure.severity_level.CRITICAL)
-    def test_chat_completions_response_structure(self, api_base_url, api_headers, verify_ssl):
+    def test_chat_completions_response_structure(self, api_base_url, api_headers, http_session):
 
         url = f"{api_base_url}/chat/completions"
-        payload = {
-            "model": "GigaChat-2",
-            "messages": [
-                {
-                    "role": "user",
-                    "content": "Ответь одним словом: да или нет?"
-                }
-            ]
-        }
+        payload = RESPONSE_STRUCTURE_PAYLOAD
 
         with allure.step("Отправляем запрос для детальной проверки структуры"):
-            response = requests.post(url, json=payload, headers=api_headers, verify=verify_ssl, proxies={'http': None, 'https': None})
+            response = http_session.post(url, json=payload, headers=api_headers)
 
         with allure.step("Проверяем статус и структуру ответа"):
             assert response.status_code == 200
@@ -325,21 +432,13 @@ class TestGigaChatCompletions:
     @allure.title("Проверка поддержки мультиязычности")
     @allure.description("""Тест: проверяем, проддерживает ли модель мультиязычность""")
     @allure.severity(allure.severity_level.CRITICAL)
-    def test_chat_completions_multilingual_support(self, api_base_url, api_headers, verify_ssl):
+    def test_chat_completions_multilingual_support(self, api_base_url, api_headers, http_session):
 
         url = f"{api_base_url}/chat/completions"
-        payload = {
-            "model": "GigaChat-2",
-            "messages": [
-                {
-                    "role": "user",
-                    "content": "Please respond to me in English: Good day to you. How are you?"
-                }
-            ]
-        }
+        payload = MULTILINGUAL_PAYLOAD
 
         with allure.step("Отправляем запрос с мультиязычным сообщением"):
-            response = requests.post(url, json=payload, headers=api_headers, verify=verify_ssl, proxies={'http': None, 'https': None})
+            response = http_session.post(url, json=payload, headers=api_headers)
 
         with allure.step("Проверяем, что ответ содержит текст на английском языке"):
             assert response.status_code == 200
@@ -0,0 +1,99 @@
+import json
+import time
+
+import allure
+import pytest
+
+from .embeddings import decode_embeddings, throughput
+from .schemas import schema_embeddings
+from .validators import validate
+
+BATCH_SIZES = [1, 16, 64]
+
+# Тексты для пакетов: разные, чтобы векторы не совпадали
+TEXTS = [f"Документ номер {i}: короткий текст для индексации и поиска похожих документов" for i in range(256)]
+
+
+@pytest.mark.gigachat
+@allure.feature("GigaChat API")
+@allure.story("embeddings")
+class TestGigaChatEmbeddings:
+    """Тестовый набор для метода embeddings GigaChat API"""
+
+    @allure.title("Эмбеддинг одного текста")
+    @allure.description("""Базовый тест: запрос эмбеддинга одного текста и проверка структуры ответа по JSON схеме""")
+    @allure.severity(allure.severity_level.CRITICAL)
+    def test_embeddings_basic(self, embeddings_client):
+
+        with allure.step("Отправляем запрос к embeddings"):
+            response = embeddings_client.post(["Привет! Как дела?"])
+
+        with allure.step("Проверяем HTTP статус и структуру ответа"):
+            assert response.status_code == 200, (
+                f"Ожидался статус 200, получен {response.status_code}. Ответ: {response.text}"
+            )
+            # По схеме проверяются метаданные, векторы вырезаны в компактный буфер
+            data, vectors = decode_embeddings(response.text)
+            validate(instance=data, schema=schema_embeddings)
+            assert len(data["data"]) == 1
+            assert vectors.shape[0] == 1 and vectors.shape[1] > 0
+
+    @allure.title("Пакет текстов: число векторов, порядок и компактный разбор")
+    @allure.description("""Тест: пакет из batch_size текстов. Проверяем по схеме метаданные ответа (векторы
+        разбираются сразу в float32-буфер, без списков Python float), что векторов столько же, сколько текстов,
+        индексы идут по порядку и все векторы одной размерности.
+        """)
+    @allure.severity(allure.severity_level.NORMAL)
+    @pytest.mark.parametrize("batch_size", BATCH_SIZES)
+    def test_embeddings_batch(self, embeddings_client, batch_size):
+
+        texts = TEXTS[:batch_size]
+
+        with allure.step(f"Отправляем пакет из {batch_size} текстов"):
+            response = embeddings_client.post(texts)
+            assert response.status_code == 200, (
+                f"Ожидался статус 200, получен {response.status_code}. Ответ: {response.text[:500]}"
+            )
+
+        with allure.step("Разбираем векторы и проверяем метаданные ответа по JSON схеме"):
+            data, vectors = decode_embeddings(response.text)
+            validate(instance=data, schema=schema_embeddings)
+
+        with allure.step("Проверяем число векторов, порядок и размерность"):
+            assert sorted(item["index"] for item in data["data"]) == list(range(batch_size))
+            count, dim = vectors.shape
+            assert count == batch_size and dim > 0
+            assert vectors.nbytes == batch_size * dim * 4, "Векторы должны храниться как float32"
+
+    @allure.title("Несуществующая модель эмбеддингов")
+    @allure.description("""Тест: запрос к несуществующей модели должен вернуть ошибку""")
+    @allure.severity(allure.severity_level.NORMAL)
+    def test_embeddings_invalid_model(self, api_base_url, api_headers, http_session):
+
+        with allure.step("Отправляем запрос с несуществующей моделью"):
+            response = http_session.post(f"{api_base_url}/embeddings",
+                                         json={"model": "NonExistentEmbeddings", "input": ["Тест"]},
+                                         headers=api_headers)
+
+        with allure.step("Проверяем, что возвращается один из ожидаемых кодов ошибки"):
+            assert response.status_code in [400, 404, 422]
+
+    @allure.title("Параллельные пакеты: пропускная способность")
+    @allure.description("""Тест: 64 текста пакетами по 16 в 2 потока. Все пакеты должны пройти,
+        пропускная способность (векторов в секунду) и задержка пакета прикладываются к отчету.
+        Полный перебор размеров пакета и потоков - benchmarks/bench_embeddings.py.
+        """)
+    @allure.severity(allure.severity_level.NORMAL)
+    def test_embeddings_concurrent_batches(self, embeddings_client):
+
+        with allure.step("Отправляем пакеты параллельно"):
+            started = time.perf_counter()
+            batches = list(embeddings_client.iter_batches(TEXTS[:64], batch_size=16, concurrency=2))
+            summary = throughput(batches, time.perf_counter() - started)
+            allure.attach(json.dumps(summary, ensure_ascii=False, indent=2), name="throughput",
+                          attachment_type=allure.attachment_type.JSON)
+
+        with allure.step("Проверяем, что все пакеты обработаны"):
+            errors = [batch.error for batch in batches if not batch.ok]
+            assert not errors, f"Ошибки пакетов: {errors}"
+            assert sum(len(batch.vectors) for batch in batches) == 64
@@ -0,0 +1,17 @@
+import socket
+
+import pytest
+import requests
+
+from .http_client import GigaChatSession
+
+
+def test_empty_getaddrinfo_is_a_connection_error(monkeypatch):
+    monkeypatch.setattr(socket, "getaddrinfo", lambda *args, **kwargs: [])
+    session = GigaChatSession()
+    session.trust_env = False
+    try:
+        with pytest.raises(requests.ConnectionError, match="getaddrinfo returned no addresses"):
+            session.get("http://gigachat.invalid/api/v1/models", timeout=1)
+    finally:
+        session.close()
@@ -0,0 +1,58 @@
+import json
+import os
+
+import allure
+import pytest
+
+from .loadgen import LoadGenerator, default_scenarios
+
+
+@pytest.mark.load
+@pytest.mark.expensive
+@allure.feature("GigaChat API")
+@allure.story("Нагрузка")
+class TestGigaChatLoad:
+    """Нагрузочный прогон chat/completions на сценариях функциональных тестов"""
+
+    @allure.title("Короткая нагрузка смесью запросов из функциональных тестов")
+    @allure.description("""Тест: нагрузка на chat/completions с теми же телами запросов, что и в
+        tests/test_gigachat_api.py. Режим (open/closed), частота, число потоков, длительность и разгон
+        задаются опциями --gigachat-load-*. Проверяем долю ошибок и, если задан, p99 задержки.
+        """)
+    @allure.severity(allure.severity_level.NORMAL)
+    def test_chat_completions_load(self, api_base_url, api_headers_factory, http_session, load_settings):
+
+        generator = LoadGenerator(
+            http_session, f"{api_base_url}/chat/completions", api_headers_factory,
+            scenarios=default_scenarios(), mode=load_settings["mode"], rps=load_settings["rps"],
+            concurrency=load_settings["concurrency"], duration=load_settings["duration"],
+            ramp_up=load_settings["ramp_up"],
+            # Метрики и токены ответов нагрузки учитываются в итогах прогона и бюджете
+            on_response=lambda response: http_session.metrics.publish(response, attach=False),
+        )
+
+        with allure.step(f"Подаем нагрузку ({load_settings['mode']}, {load_settings['duration']} с)"):
+            result = generator.run()
+            report = result.report()
+            summary = result.as_dict()
+            allure.attach(report, name="load_report", attachment_type=allure.attachment_type.TEXT)
+            allure.attach(json.dumps(summary, ensure_ascii=False, indent=2), name="load_summary",
+                          attachment_type=allure.attachment_type.JSON)
+            if load_settings["report_dir"]:
+                os.makedirs(load_settings["report_dir"], exist_ok=True)
+                path = os.path.join(load_settings["report_dir"], f"load-{http_session.metrics.run_id}.json")
+                with open(path, "w", encoding="utf-8") as fh:
+                    json.dump(summary, fh, ensure_ascii=False, indent=2)
+
+        with allure.step("Проверяем долю ошибок и задержки"):
+            assert result.completed > 0, "Ни один запрос не завершился"
+            assert result.error_rate <= load_settings["max_error_rate"], (
+                f"Доля ошибок {result.error_rate:.1%} больше допустимой "
+                f"{load_settings['max_error_rate']:.1%}. Коды ответа: {summary['statuses']}, "
+                f"ошибки: {summary['errors']}"
+            )
+            if load_settings["p99_limit"] is not None:
+                p99 = summary["latency"]["p99"]
+                assert p99 <= load_settings["p99_limit"], (
+                    f"p99 задержки {p99:.2f} с больше допустимых {load_settings['p99_limit']} с"
+                )
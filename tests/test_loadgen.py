@@ -0,0 +1,89 @@
+import threading
+import time
+
+import pytest
+
+from .conftest import load_selected
+from .loadgen import LatencyHistogram, LoadGenerator, default_scenarios
+
+
+class _SlowSession:
+    """Сессия, отвечающая с задержкой delay: API тормозит сильнее, чем растет нагрузка."""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.in_flight = self.peak = 0
+        self._lock = threading.Lock()
+
+    def post(self, url, **kwargs):
+        with self._lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        time.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+        response = type("Response", (), {})()
+        response.status_code = 200
+        return response
+
+
+@pytest.mark.parametrize("markexpr, selected", [
+    ("load", True),
+    ("load and not slow", True),
+    ("(gigachat or load)", True),
+    ("not load", False),
+    ("gigachat and not load", False),
+    ("overload", False),
+    ("load_slow", False),
+    ("", False),
+    (None, False),
+])
+def test_load_selected(markexpr, selected):
+    assert load_selected(markexpr) is selected
+
+
+@pytest.mark.parametrize("rps", [0, -1.0])
+def test_open_mode_rejects_non_positive_rps(rps):
+    with pytest.raises(ValueError):
+        LoadGenerator(_SlowSession(0), "http://stub/chat/completions", dict, mode="open", rps=rps)
+
+
+def test_open_mode_stops_at_deadline_when_api_is_slow():
+    session = _SlowSession(0.3)
+    generator = LoadGenerator(session, "http://stub/chat/completions", dict, scenarios=default_scenarios(),
+                              mode="open", rps=200, concurrency=2, duration=0.5, seed=1)
+    started = time.perf_counter()
+    result = generator.run()
+
+    # Доигрываются только запросы в работе: не больше concurrency, по одному delay
+    assert time.perf_counter() - started < 0.5 + 0.3 + 0.2
+    assert session.peak <= 2
+    assert result.completed <= 2 * (0.5 / 0.3 + 1)
+
+
+def test_histogram_percentiles_within_bucket_precision():
+    histogram = LatencyHistogram()
+    values = [i / 1000 for i in range(1, 1001)]
+    for value in values:
+        histogram.add(value)
+
+    for p in (50, 90, 99):
+        exact = values[int(p / 100 * len(values)) - 1]
+        assert histogram.percentile(p) == pytest.approx(exact, rel=LatencyHistogram.FACTOR - 1)
+    assert histogram.percentile(100) == 1.0
+    assert histogram.as_dict()["min"] == 0.001
+    assert histogram.as_dict()["mean"] == pytest.approx(0.5005)
+    assert sum(count for _, _, count in histogram.rows()) == 1000
+
+
+def test_histogram_edge_cases():
+    empty = LatencyHistogram()
+    assert empty.percentile(50) is None
+    assert empty.rows() == []
+
+    histogram = LatencyHistogram()
+    histogram.add(0.0)
+    histogram.add(2.5)
+    # Перцентиль не больше наблюдавшегося максимума
+    assert histogram.percentile(50) == LatencyHistogram.MIN_VALUE
+    assert histogram.percentile(99) == 2.5
@@ -0,0 +1,29 @@
+import pytest
+
+from . import perf_baseline
+from .perf_baseline import compare
+
+
+def test_compare_needs_enough_samples():
+    result = compare(1.0, [0.5] * (perf_baseline.DEFAULT_MIN_SAMPLES - 1))
+    assert result["verdict"] == "no-baseline"
+
+
+def test_compare_flags_regression_only_past_all_thresholds():
+    samples = [1.0, 1.1, 0.9, 1.0, 1.05, 0.95]
+    assert compare(2.0, samples)["verdict"] == "regression"
+    # В пределах шума окна
+    assert compare(1.1, samples)["verdict"] == "ok"
+    # Быстрее базовой линии - не регрессия
+    assert compare(0.2, samples)["verdict"] == "ok"
+
+
+def test_compare_stable_test_uses_std_floor_and_min_delta():
+    # Разброс окна нулевой: std не меньше MIN_STD_FRACTION от среднего
+    result = compare(0.013, [0.01] * 10)
+    assert result["std"] == pytest.approx(0.01 * perf_baseline.MIN_STD_FRACTION)
+    # z и относительный рост большие, но абсолютный меньше min_delta
+    assert result["z"] > perf_baseline.DEFAULT_Z
+    assert result["change"] > perf_baseline.DEFAULT_RATIO
+    assert result["verdict"] == "ok"
+    assert compare(1.3, [1.0] * 10)["verdict"] == "regression"
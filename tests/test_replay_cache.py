@@ -0,0 +1,98 @@
+import json
+import os
+import time
+
+import requests
+
+from . import replay_cache
+
+
+class _FakeAdapter:
+    """Основной адаптер: отвечает заданным кодом и считает запросы."""
+
+    def __init__(self, status):
+        self.status = status
+        self.sent = 0
+
+    def send(self, request, **kwargs):
+        self.sent += 1
+        response = requests.Response()
+        response.status_code = self.status
+        response.reason = "Not Found" if self.status == 404 else "OK"
+        response.headers["Content-Type"] = "application/json"
+        response._content = json.dumps({"status": self.status}).encode()
+        response.request = request
+        response.url = request.url
+        return response
+
+    def close(self):
+        pass
+
+
+def _request(model="no-such-model"):
+    return requests.Request(
+        "POST", "http://127.0.0.1:8080/api/v1/chat/completions",
+        json={"model": model, "messages": [{"role": "user", "content": "Привет"}]},
+    ).prepare()
+
+
+def _adapter(tmp_path, status):
+    inner = _FakeAdapter(status)
+    adapter = replay_cache.ReplayAdapter(inner, replay_cache.ReplayStore(str(tmp_path)), "replay")
+    adapter.enabled = True
+    return adapter, inner
+
+
+def test_cached_404_is_replayed(tmp_path):
+    adapter, inner = _adapter(tmp_path, 404)
+    first = adapter.send(_request())
+    second = adapter.send(_request())
+
+    assert inner.sent == 1
+    assert second.status_code == 404
+    assert second.json() == first.json()
+    assert getattr(second, "from_replay", False)
+
+
+def test_transient_and_auth_statuses_are_not_cached(tmp_path):
+    for status in (401, 429, 500, 503):
+        adapter, inner = _adapter(tmp_path / str(status), status)
+        adapter.send(_request())
+        adapter.send(_request())
+        assert inner.sent == 2, status
+
+
+def test_request_key_normalizes_payload():
+    url = "http://127.0.0.1:8080/api/v1/chat/completions"
+    body = {"model": "GigaChat", "temperature": 0.5, "max_tokens": 10,
+            "messages": [{"role": "user", "content": "Привет"}]}
+    key = replay_cache.request_key(url, json.dumps(body))
+
+    # Порядок полей, лишние поля запроса и сообщений на ключ не влияют
+    reordered = {"messages": [{"content": "Привет", "role": "user", "name": "x"}], "max_tokens": 10,
+                 "temperature": 0.5, "model": "GigaChat", "user": "someone"}
+    assert replay_cache.request_key(url, json.dumps(reordered)) == key
+    assert replay_cache.request_key(url, json.dumps({**body, "temperature": 0.7})) != key
+    assert replay_cache.request_key("http://127.0.0.1:9090/api/v1/chat/completions", json.dumps(body)) != key
+    # Адрес заглушки заменяется постоянным host
+    assert (replay_cache.request_key(url, json.dumps(body), host=replay_cache.STUB_HOST)
+            == replay_cache.request_key("http://127.0.0.1:9090/api/v1/chat/completions", json.dumps(body),
+                                        host=replay_cache.STUB_HOST))
+    assert replay_cache.request_key(url, json.dumps({**body, "stream": True})) is None
+    assert replay_cache.request_key(url, b"not json") is None
+
+
+def test_store_evicts_old_and_least_recently_used(tmp_path):
+    store = replay_cache.ReplayStore(str(tmp_path), max_bytes=10 ** 6, max_age=3600)
+    entry = {"recorded_at": time.time(), "status": 200, "reason": "OK", "headers": {}, "body": "{}"}
+    for key in ("old", "used", "unused"):
+        store.put(key, entry)
+    now = time.time()
+    os.utime(store._path("old"), (now - 7200, now - 7200))
+    os.utime(store._path("unused"), (now - 60, now - 60))
+    os.utime(store._path("used"), (now - 120, now - 120))
+    assert store.get("used") is not None
+
+    store.max_bytes = os.path.getsize(store._path("used"))
+    store.evict()
+    assert sorted(os.listdir(tmp_path)) == ["used.json.gz"]
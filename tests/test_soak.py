@@ -0,0 +1,39 @@
+import os
+import tracemalloc
+
+import _pytest
+
+from . import soak
+
+
+PYTEST_FILE = os.path.join(os.path.dirname(_pytest.__file__), "runner.py")
+STDLIB_FILE = os.path.join(soak._STDLIB_DIR, "dataclasses.py")
+
+
+def _traceback(*filenames):
+    # Конструктор Traceback принимает кадры в порядке _tracemalloc: последний вызов первым
+    return tracemalloc.Traceback(tuple((filename, 1) for filename in reversed(filenames)))
+
+
+def test_memory_kind_attributes_allocation_to_nearest_caller():
+    # Тест, вызванный из pytest, выделяет сам - это память теста, а не обвязки
+    assert soak.memory_kind(_traceback(PYTEST_FILE, __file__)) == "traced"
+    # Стандартная библиотека и сгенерированный код выделяют по просьбе pytest
+    assert soak.memory_kind(_traceback(__file__, PYTEST_FILE, STDLIB_FILE, "<string>")) == "harness"
+    assert soak.memory_kind(_traceback(PYTEST_FILE, __file__, STDLIB_FILE)) == "traced"
+    assert soak.memory_kind(_traceback(__file__, tracemalloc.__file__)) == "ignored"
+
+
+def test_leak_in_test_code_is_traced():
+    leak = []
+    tracemalloc.start(soak.DEFAULT_TRACEMALLOC_FRAMES)
+    try:
+        leak.extend(bytearray(1000) for _ in range(100))
+        snapshot = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    sizes = {}
+    for stat in snapshot.statistics("traceback"):
+        kind = soak.memory_kind(stat.traceback)
+        sizes[kind] = sizes.get(kind, 0) + stat.size
+    assert sizes.get("traced", 0) >= 100 * 1000
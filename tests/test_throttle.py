@@ -0,0 +1,109 @@
+import io
+import os
+import time
+
+import pytest
+import requests
+
+from . import throttle
+
+
+class _FakeAdapter:
+    """Основной адаптер: отвечает кодами statuses по очереди и считает запросы."""
+
+    def __init__(self, *statuses):
+        self.statuses = list(statuses)
+        self.sent = 0
+
+    def send(self, request, **kwargs):
+        self.sent += 1
+        response = requests.Response()
+        response.status_code = self.statuses.pop(0)
+        response.raw = io.BytesIO(b"")
+        # Повтор без паузы
+        response.headers["Retry-After"] = "0"
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+def _limiter(tmp_path):
+    return throttle.SharedLimiter(str(tmp_path / "throttle.json"), max_concurrency=2, run_id="test")
+
+
+def _request():
+    return requests.Request("POST", "http://127.0.0.1:8080/api/v1/chat/completions", json={}).prepare()
+
+
+def test_server_error_is_not_retried(tmp_path):
+    inner = _FakeAdapter(500, 200)
+    adapter = throttle.ThrottledAdapter(inner, _limiter(tmp_path))
+
+    assert adapter.send(_request()).status_code == 500
+    assert inner.sent == 1
+    assert adapter.retries == 0
+
+
+def test_gateway_errors_and_429_are_retried(tmp_path):
+    inner = _FakeAdapter(503, 429, 502, 200)
+    adapter = throttle.ThrottledAdapter(inner, _limiter(tmp_path))
+
+    assert adapter.send(_request()).status_code == 200
+    assert inner.sent == 4
+    assert (adapter.retries, adapter.throttled) == (3, 1)
+
+
+def test_parse_retry_after():
+    now = 1_700_000_000.0
+    assert throttle.parse_retry_after("2.5") == 2.5
+    assert throttle.parse_retry_after("-3") == 0.0
+    assert throttle.parse_retry_after("Tue, 14 Nov 2023 22:13:40 GMT", now=now) == 20.0
+    assert throttle.parse_retry_after("soon") is None
+    assert throttle.parse_retry_after(None) is None
+
+
+def test_limiter_aimd_window(tmp_path):
+    limiter = throttle.SharedLimiter(str(tmp_path / "throttle.json"), max_concurrency=4, run_id="test")
+    limiter.join()
+
+    lease, _ = limiter.acquire()
+    limiter.release(lease, status=429)
+    assert limiter.snapshot()["limit"] == 2.0
+    # Успешный ответ: окно растет на 1/limit, но не выше max_concurrency
+    lease, _ = limiter.acquire()
+    limiter.release(lease, status=200)
+    assert limiter.snapshot()["limit"] == 2.5
+    for _ in range(20):
+        lease, _ = limiter.acquire()
+        limiter.release(lease, status=200)
+    assert limiter.snapshot()["limit"] == 4.0
+    # 5xx окно не меняет
+    lease, _ = limiter.acquire()
+    limiter.release(lease, status=503)
+    assert limiter.snapshot() == {"limit": 4.0, "active": 0, "requests": 23, "throttled": 1, "wait": 0.0}
+
+
+def test_limiter_pauses_all_workers_after_retry_after(tmp_path):
+    limiter = throttle.SharedLimiter(str(tmp_path / "throttle.json"), run_id="test")
+    lease, _ = limiter.acquire()
+    limiter.release(lease, status=429, retry_after=30.0)
+
+    state = limiter._load()
+    wait, full = limiter._try_acquire("next", state, time.time())
+    assert wait == pytest.approx(30.0, abs=1)
+    assert not full
+
+
+def test_limiter_expires_abandoned_leases(tmp_path):
+    limiter = throttle.SharedLimiter(str(tmp_path / "throttle.json"), max_concurrency=1, run_id="test")
+    now = time.time()
+    state = limiter._load()
+    state["leases"]["stale"] = {"pid": os.getpid(), "at": now - throttle.LEASE_TIMEOUT - 1}
+
+    assert limiter._try_acquire("next", state, now) == (0.0, False)
+    assert set(state["leases"]) == {"next"}
+    # Слот занят живым запросом: ждем освобождения
+    _, full = limiter._try_acquire("third", state, now)
+    assert full
@@ -0,0 +1,92 @@
+import json
+import time
+
+import pytest
+
+from . import token_cache
+from .token_cache import TokenCache, parse_expires_at
+
+
+class _OAuth:
+    """OAuth без сети: выдает токены token-1, token-2, ... со сроком жизни ttl секунд."""
+
+    def __init__(self, ttl=1800.0):
+        self.ttl = ttl
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return {"access_token": f"token-{self.calls}", "expires_at": int((time.time() + self.ttl) * 1000)}
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "token.json")
+
+
+def _cache(path, oauth, key="key", **kwargs):
+    return TokenCache(oauth, path, key=key, **kwargs)
+
+
+def test_parse_expires_at_milliseconds_and_default():
+    assert parse_expires_at({"expires_at": 1_700_000_000_000}) == 1_700_000_000
+    assert parse_expires_at({"expires_at": 1_700_000_000}) == 1_700_000_000
+    assert parse_expires_at({}) == pytest.approx(time.time() + token_cache.DEFAULT_TOKEN_TTL, abs=5)
+
+
+def test_token_is_shared_through_file(cache_path):
+    oauth = _OAuth()
+    first, second = _cache(cache_path, oauth), _cache(cache_path, oauth)
+    try:
+        assert first.get() == second.get() == "token-1"
+        assert oauth.calls == 1
+    finally:
+        first.close()
+        second.close()
+
+
+def test_expired_token_is_fetched_again(cache_path):
+    oauth = _OAuth()
+    with open(cache_path, "w") as fh:
+        json.dump({"tokens": {"key": {"access_token": "stale", "expires_at": time.time() + 1},
+                              "other": {"access_token": "old", "expires_at": time.time() - 60}}}, fh)
+    cache = _cache(cache_path, oauth)
+    try:
+        assert cache.get() == "token-1"
+        with open(cache_path) as fh:
+            # Истекший токен другого ключа выброшен, токены ключей не смешиваются
+            assert set(json.load(fh)["tokens"]) == {"key"}
+    finally:
+        cache.close()
+
+
+def test_refresh_is_scheduled_refresh_margin_before_expiry(cache_path):
+    oauth = _OAuth(ttl=600.0)
+    cache = _cache(cache_path, oauth, refresh_margin=120)
+    try:
+        assert cache.get() == "token-1"
+        assert cache._timer.interval == pytest.approx(600.0 - 120, abs=1)
+        # Токен еще далеко от истечения: обновление не ходит в OAuth
+        cache._refresh()
+        assert oauth.calls == 1
+    finally:
+        cache.close()
+
+
+def test_short_lived_token_is_refreshed_in_background(cache_path):
+    oauth = _OAuth(ttl=60.0)
+    cache = _cache(cache_path, oauth, refresh_margin=120)
+    other = _cache(cache_path, oauth, refresh_margin=120)
+    try:
+        assert cache.get() == "token-1"
+        # Живет меньше refresh_margin: обновление через долю оставшегося времени
+        assert cache._timer.interval == pytest.approx(60.0 * token_cache.SHORT_TOKEN_REFRESH_FRACTION, abs=1)
+        cache._refresh()
+        assert oauth.calls == 2
+        assert cache.get() == "token-2"
+        # Другой процесс подхватывает обновленный токен из файла
+        assert other.get() == "token-2"
+        assert oauth.calls == 2
+    finally:
+        cache.close()
+        other.close()
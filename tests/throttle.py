@@ -0,0 +1,301 @@
+"""
+Общий для всех воркеров ограничитель запросов к GigaChat API.
+
+Когда набор запускается параллельно (несколько агентов Jenkins на одной машине,
+xdist, отдельные процессы), каждый воркер иначе шлет запросы независимо и
+упирается в 429. Здесь воркеры согласуются через файл состояния под файловой
+блокировкой (см. locking.py):
+
+- окно одновременных запросов на всех по AIMD: +1/limit за успешный ответ,
+  вдвое меньше на 429;
+- необязательный token bucket по частоте запросов (rps);
+- пауза для всех воркеров до Retry-After после 429.
+
+Состояние относится к одному прогону: когда к файлу присоединяется новый
+прогон (другой run_id или, без run_id, не осталось живых процессов прошлого),
+окно, паузы и итоги сбрасываются (см. locking.join_run).
+
+ThrottledAdapter повторяет запрос после 429 и 502/503/504, пока не исчерпан
+бюджет времени, и считает, сколько запросы ждали из-за ограничений - по этим
+цифрам подбирается число воркеров.
+"""
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from .locking import file_lock, join_run, leave_run, write_atomic
+
+DEFAULT_STATE_PATH = os.path.join(tempfile.gettempdir(), "gigachat-throttle.json")
+DEFAULT_CONCURRENCY = 4
+DEFAULT_RETRY_BUDGET = 30.0
+# Временные ошибки шлюза. 500 не повторяется: у API это ошибка запроса
+# (например, temperature выше 2), и повтор только тратит бюджет времени
+RETRY_STATUSES = (502, 503, 504)
+# Запрос, который держит слот дольше, считается брошенным (процесс убит и т.п.)
+LEASE_TIMEOUT = 300.0
+# Ожидание слота, занятого другим процессом: с такого интервала, вдвое больше
+# на каждой попытке, но не дольше MAX_SLOT_WAIT
+POLL_INTERVAL = 0.05
+MAX_SLOT_WAIT = 1.0
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 8.0
+
+
+def parse_retry_after(value, now=None):
+    """
+    Значение заголовка Retry-After в секундах (число секунд или HTTP-дата), None если нет.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - (now or time.time()))
+    except (TypeError, ValueError):
+        return None
+
+
+def _pid_alive(pid):
+    if os.name != "posix":
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SharedLimiter:
+    """
+    Ограничитель, состояние которого лежит в JSON-файле path и общее для всех процессов.
+
+    max_concurrency: верхняя граница окна AIMD на все воркеры
+    rps: частота запросов на все воркеры, 0 - без ограничения
+    run_id: id прогона, состояние других прогонов сбрасывается в join
+    """
+
+    def __init__(self, path=DEFAULT_STATE_PATH, max_concurrency=DEFAULT_CONCURRENCY, rps=0.0, run_id=None):
+        self.path = path
+        self.max_concurrency = max(1, max_concurrency)
+        self.rps = rps
+        self.run_id = run_id
+        self._counter = 0
+        self._local = threading.Lock()
+        # Освобождение слота в этом процессе будит ждущие потоки сразу
+        self._released = threading.Condition()
+        self._generation = 0
+
+    def _fresh(self):
+        return {
+            "limit": float(self.max_concurrency),
+            "tokens": max(1.0, self.rps),
+            "refilled": time.time(),
+            "blocked_until": 0.0,
+            "leases": {},
+            "totals": {"requests": 0, "throttled": 0, "wait": 0.0},
+        }
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as fh:
+                state = json.load(fh)
+        except (OSError, ValueError):
+            state = {}
+        if not isinstance(state, dict):
+            state = {}
+        for key, value in self._fresh().items():
+            state.setdefault(key, value)
+        state["limit"] = min(state["limit"], float(self.max_concurrency))
+        return state
+
+    def _save(self, state):
+        write_atomic(self.path, json.dumps(state).encode("utf-8"), mode=0o644)
+
+    def _update(self, change):
+        with file_lock(f"{self.path}.lock"):
+            state = self._load()
+            result = change(state, time.time())
+            self._save(state)
+        return result
+
+    def join(self):
+        """
+        Присоединяет процесс к прогону; состояние прошлого прогона сбрасывается.
+        """
+        self._update(lambda state, now: join_run(state, self.run_id, self._fresh))
+
+    def leave(self):
+        self._update(lambda state, now: leave_run(state))
+
+    def _try_acquire(self, lease_id, state, now):
+        for key, lease in list(state["leases"].items()):
+            if now - lease["at"] > LEASE_TIMEOUT or not _pid_alive(lease["pid"]):
+                del state["leases"][key]
+        if self.rps > 0:
+            capacity = max(1.0, self.rps)
+            state["tokens"] = min(capacity, state["tokens"] + (now - state["refilled"]) * self.rps)
+        state["refilled"] = now
+
+        waits = [state["blocked_until"] - now]
+        if self.rps > 0 and state["tokens"] < 1:
+            waits.append((1 - state["tokens"]) / self.rps)
+        wait = max(waits)
+        full = len(state["leases"]) >= max(1, int(state["limit"]))
+        if wait > 0 or full:
+            return wait, full
+        if self.rps > 0:
+            state["tokens"] -= 1
+        state["leases"][lease_id] = {"pid": os.getpid(), "at": now}
+        return 0.0, False
+
+    def acquire(self):
+        """
+        Ждет свободный слот. Возвращает (id слота, сколько секунд ждали).
+
+        Пауза после 429 и пополнение token bucket ждутся ровно до расчетного
+        времени. Когда заняты все слоты, ждем их освобождения: в этом процессе
+        release будит сразу, слоты других процессов проверяются с нарастающим
+        интервалом.
+        """
+        with self._local:
+            self._counter += 1
+            lease_id = f"{os.getpid()}-{threading.get_ident()}-{self._counter}"
+        started = time.monotonic()
+        slot_wait = POLL_INTERVAL
+        while True:
+            with self._released:
+                generation = self._generation
+            wait, full = self._update(lambda state, now: self._try_acquire(lease_id, state, now))
+            if wait <= 0 and not full:
+                return lease_id, time.monotonic() - started
+            if not full:
+                time.sleep(wait)
+                continue
+            with self._released:
+                if self._generation == generation:
+                    self._released.wait(max(wait, slot_wait))
+            slot_wait = min(slot_wait * 2, MAX_SLOT_WAIT)
+
+    def release(self, lease_id, status=None, retry_after=None, waited=0.0):
+        """
+        Освобождает слот и подстраивает окно по ответу:
+        429 - окно вдвое меньше и пауза для всех до Retry-After, успех - окно +1/limit.
+        """
+        def change(state, now):
+            state["leases"].pop(lease_id, None)
+            totals = state["totals"]
+            totals["requests"] += 1
+            totals["wait"] = round(totals["wait"] + waited, 4)
+            if status == 429:
+                totals["throttled"] += 1
+                state["limit"] = max(1.0, state["limit"] / 2)
+                if retry_after:
+                    state["blocked_until"] = max(state["blocked_until"], now + retry_after)
+            elif status is not None and status < 500:
+                state["limit"] = min(float(self.max_concurrency), state["limit"] + 1 / state["limit"])
+        self._update(change)
+        with self._released:
+            self._generation += 1
+            self._released.notify_all()
+
+    def snapshot(self):
+        """
+        Текущее состояние: окно, занятые слоты и итоги всех воркеров этого прогона.
+        """
+        with file_lock(f"{self.path}.lock"):
+            state = self._load()
+        return {"limit": round(state["limit"], 2), "active": len(state["leases"]), **state["totals"]}
+
+
+class ThrottledAdapter:
+    """
+    Адаптер requests (send и close, как у requests.adapters.BaseAdapter) поверх
+    основного (inner): берет слот у SharedLimiter перед каждым запросом и повторяет
+    429 и 502/503/504 в пределах retry_budget секунд. close выводит процесс из
+    прогона ограничителя (SharedLimiter.leave).
+
+    В response.timings добавляются throttle_wait (ожидание слота и пауз между
+    попытками) и attempts. Для stream=True слот освобождается после заголовков ответа.
+    """
+
+    def __init__(self, inner, limiter, retry_budget=DEFAULT_RETRY_BUDGET):
+        self.inner = inner
+        self.limiter = limiter
+        self.retry_budget = retry_budget
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self.wait = 0.0
+        self.max_wait = 0.0
+        self._lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        deadline = time.monotonic() + self.retry_budget
+        waited = 0.0
+        backoff = 0.0
+        attempt = 0
+        while True:
+            attempt += 1
+            lease_id, lease_wait = self.limiter.acquire()
+            waited += lease_wait
+            status = retry_after = None
+            try:
+                response = self.inner.send(request, **kwargs)
+                status = response.status_code
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            finally:
+                # В общие итоги идет и пауза перед этой попыткой
+                self.limiter.release(lease_id, status, retry_after, lease_wait + backoff)
+
+            if status == 429 or status in RETRY_STATUSES:
+                backoff = retry_after if retry_after is not None else \
+                    random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** (attempt - 1)))
+                if time.monotonic() + backoff < deadline:
+                    response.close()
+                    time.sleep(backoff)
+                    waited += backoff
+                    self._count(retry=True, throttled=status == 429)
+                    continue
+            self._count(waited=waited)
+            timings = getattr(response, "timings", None)
+            if timings is not None:
+                timings["throttle_wait"] = waited
+                timings["attempts"] = attempt
+            return response
+
+    def _count(self, retry=False, throttled=False, waited=None):
+        with self._lock:
+            if retry:
+                self.retries += 1
+                self.throttled += throttled
+                return
+            self.requests += 1
+            self.wait += waited
+            self.max_wait = max(self.max_wait, waited)
+
+    def close(self):
+        try:
+            self.limiter.leave()
+        finally:
+            self.inner.close()
+
+    def stats(self):
+        """
+        Итоги этого процесса и общие итоги всех воркеров прогона из файла состояния.
+        """
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "wait": round(self.wait, 3),
+            "max_wait": round(self.max_wait, 3),
+            "shared": self.limiter.snapshot(),
+        }
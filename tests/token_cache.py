@@ -0,0 +1,175 @@
+"""
+Кэш OAuth токена GigaChat на диске.
+
+Токен хранится в файле под файловой блокировкой, поэтому параллельные воркеры
+и последовательные запуски используют один действующий токен, а не ходят
+каждый раз в GIGACHAT_OAUTH_URL. Незадолго до expires_at токен обновляется
+в фоновом потоке, так что тесты не ждут OAuth запроса.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from .locking import file_lock, write_atomic
+
+logger = logging.getLogger(__name__)
+
+# Токен GigaChat живет 30 минут. Если expires_at в ответе нет - считаем так же.
+DEFAULT_TOKEN_TTL = 30 * 60
+# За сколько секунд до истечения обновлять токен в фоне
+DEFAULT_REFRESH_MARGIN = 120
+# Токен, до истечения которого осталось меньше этого, уже не отдаем в тесты
+MIN_TOKEN_LIFETIME = 10
+# Если токен живет меньше refresh_margin, обновляем его через такую долю
+# оставшегося времени жизни
+SHORT_TOKEN_REFRESH_FRACTION = 0.5
+
+
+def parse_expires_at(response_data):
+    """
+    Возвращает время истечения токена в секундах (unix time).
+    GigaChat отдает expires_at в миллисекундах.
+    """
+    expires_at = response_data.get("expires_at")
+    if not expires_at:
+        return time.time() + DEFAULT_TOKEN_TTL
+    expires_at = float(expires_at)
+    return expires_at / 1000 if expires_at > 1e11 else expires_at
+
+
+class TokenCache:
+    """
+    Кэш токена: память процесса -> файл на диске -> OAuth запрос.
+
+    fetch: функция без аргументов, возвращающая ответ OAuth (dict с access_token и expires_at)
+    path: путь к файлу кэша; в одном файле хранятся токены для разных key
+    key: идентификатор учетных данных (OAuth URL + ключ), токены для разных
+    ключей не смешиваются и не затирают друг друга
+    """
+
+    def __init__(self, fetch, path, key="", refresh_margin=DEFAULT_REFRESH_MARGIN):
+        self.fetch = fetch
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self.key = key
+        self.refresh_margin = refresh_margin
+        self.fetch_count = 0
+
+        self._token = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+        self._timer = None
+        self._closed = False
+
+    def get(self):
+        """
+        Возвращает действующий токен. Сетевой запрос выполняется только
+        если ни в памяти, ни на диске нет токена с запасом времени жизни.
+        """
+        if self._is_usable(self._expires_at):
+            return self._token
+        with self._lock:
+            if not self._is_usable(self._expires_at):
+                self._load_or_fetch(force=False)
+            return self._token
+
+    def close(self):
+        self._closed = True
+        if self._timer is not None:
+            self._timer.cancel()
+
+    @staticmethod
+    def _is_usable(expires_at, margin=MIN_TOKEN_LIFETIME):
+        return expires_at - time.time() > margin
+
+    def _read_tokens(self):
+        """
+        Все токены файла: dict ключ -> {"access_token", "expires_at"}.
+        """
+        try:
+            with open(self.path, "rb") as fh:
+                tokens = json.loads(fh.read()).get("tokens")
+        except (OSError, ValueError, AttributeError):
+            return {}
+        return tokens if isinstance(tokens, dict) else {}
+
+    def _load_or_fetch(self, force):
+        """
+        Под файловой блокировкой берет токен из файла, а если его нет или он
+        скоро истекает (force) - запрашивает новый и сохраняет в файл.
+        """
+        with file_lock(self.lock_path):
+            now = time.time()
+            # Истекшие токены других ключей из файла выбрасываем
+            tokens = {key: data for key, data in self._read_tokens().items()
+                      if isinstance(data, dict) and data.get("expires_at", 0) > now}
+            data = tokens.get(self.key)
+            margin = self.refresh_margin if force else MIN_TOKEN_LIFETIME
+            if not data or not data.get("access_token") or not self._is_usable(data["expires_at"], margin):
+                response_data = self.fetch()
+                self.fetch_count += 1
+                data = tokens[self.key] = {
+                    "access_token": response_data["access_token"],
+                    "expires_at": parse_expires_at(response_data),
+                }
+                write_atomic(self.path, json.dumps({"tokens": tokens}).encode())
+        self._token = data["access_token"]
+        self._expires_at = data["expires_at"]
+        self._schedule_refresh()
+
+    def _schedule_refresh(self):
+        if self._closed:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        lifetime = self._expires_at - time.time()
+        if lifetime > self.refresh_margin:
+            delay = lifetime - self.refresh_margin
+        else:
+            # Короткоживущий токен: иначе обновление шло бы каждую секунду
+            delay = max(lifetime * SHORT_TOKEN_REFRESH_FRACTION, 1.0)
+        self._timer = threading.Timer(delay, self._refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _refresh(self):
+        """
+        Фоновое обновление. Если другой процесс уже обновил токен -
+        просто подхватываем его из файла.
+        """
+        try:
+            with self._lock:
+                self._load_or_fetch(force=True)
+        except Exception:
+            logger.exception("Не удалось обновить токен GigaChat в фоне")
+            # Текущий токен еще жив, пробуем еще раз чуть позже
+            if not self._closed and self._is_usable(self._expires_at):
+                self._timer = threading.Timer(5.0, self._refresh)
+                self._timer.daemon = True
+                self._timer.start()
+
+
+def credentials_key(oauth_url, basic_auth_token):
+    """
+    Ключ кэша для пары OAuth URL + учетные данные (сами данные в файл не пишутся).
+    """
+    return hashlib.sha256(f"{oauth_url}|{basic_auth_token}".encode()).hexdigest()
+
+
+def default_cache_path(config=None):
+    """
+    Путь к файлу кэша токена: GIGACHAT_TOKEN_CACHE или каталог кэша pytest.
+    Без config (запуск вне pytest) - тот же файл в .pytest_cache текущего каталога.
+    """
+    path = os.getenv("GIGACHAT_TOKEN_CACHE")
+    if path:
+        return path
+    if config is None:
+        return os.path.join(".pytest_cache", "d", "gigachat", "token.json")
+    if getattr(config, "cache", None) is None:
+        return os.path.join(tempfile.gettempdir(), "gigachat-token.json")
+    return str(config.cache.mkdir("gigachat") / "token.json")
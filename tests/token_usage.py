@@ -0,0 +1,274 @@
+"""
+Учет расхода токенов за прогон.
+
+Записи метрик запросов к chat/completions (см. metrics.MetricsRecorder) приходят
+в слушатель observe_record, и usage каждого успешного ответа суммируется по
+модели, тесту и значению параметризации (temperature=0.5, model=GigaChat-2 и т.п.).
+Для каждой модели считается пропускная способность: токенов ответа в секунду
+генерации (completion_tokens / суммарное время запросов) и всего токенов в секунду.
+
+С бюджетом (--gigachat-token-budget) после его исчерпания оставшиеся тесты с
+меткой expensive пропускаются. Бюджет общий для всех воркеров и шардов прогона:
+расход складывается в файл под файловой блокировкой (SharedBudget), как
+состояние ограничителя в throttle.py. Итоги пишутся в JSON (для планирования
+мощностей), в environment.properties отчета Allure и в сводку прогона.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import pytest
+
+from . import allure_summary
+from .locking import file_lock, join_run, leave_run, write_atomic
+
+DEFAULT_PATH = os.path.join("gigachat-metrics", "token-usage.json")
+DEFAULT_BUDGET_PATH = os.path.join(tempfile.gettempdir(), "gigachat-token-budget.json")
+TOKEN_FIELDS = ("prompt_tokens", "completion_tokens", "total_tokens")
+# Так помечаются запросы вне теста (например, из фоновых потоков)
+OUTSIDE_TEST = "<session>"
+
+
+def _totals():
+    return {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "seconds": 0.0}
+
+
+def _with_rates(totals):
+    seconds = totals["seconds"]
+    return {
+        **totals,
+        "seconds": round(seconds, 3),
+        "completion_tokens_per_sec": round(totals["completion_tokens"] / seconds, 1) if seconds else None,
+        "tokens_per_sec": round(totals["total_tokens"] / seconds, 1) if seconds else None,
+    }
+
+
+def update_environment(alluredir, values):
+    """
+    Записывает ключи values в environment.properties каталога allure-results,
+    сохраняя остальные ключи файла.
+    """
+    path = os.path.join(alluredir, "environment.properties")
+    properties = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as fh:
+            for line in fh:
+                key, sep, value = line.rstrip("\n").partition("=")
+                if sep:
+                    properties[key.strip()] = value.strip()
+    properties.update({key: str(value) for key, value in values.items()})
+    os.makedirs(alluredir, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as fh:
+        for key, value in properties.items():
+            fh.write(f"{key}={value}\n")
+
+
+class SharedBudget:
+    """
+    Расход токенов прогона, общий для процессов: JSON-файл path.
+
+    Расход прошлого прогона сбрасывается, когда к файлу присоединяется новый
+    прогон (см. locking.join_run): с другим run_id или, если run_id не задан,
+    когда не осталось живых процессов прошлого прогона. Шардам на разных
+    машинах нужен файл на общем диске.
+    """
+
+    def __init__(self, path=DEFAULT_BUDGET_PATH, run_id=None):
+        self.path = path
+        self.run_id = run_id
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as fh:
+                state = json.load(fh)
+        except (OSError, ValueError):
+            state = {}
+        return state if isinstance(state, dict) else {}
+
+    def _update(self, change):
+        with file_lock(f"{self.path}.lock"):
+            state = self._load()
+            result = change(state)
+            write_atomic(self.path, json.dumps(state).encode("utf-8"), mode=0o644)
+        return result
+
+    def join(self):
+        self._update(lambda state: join_run(state, self.run_id, lambda: {"used": 0}))
+
+    def leave(self):
+        self._update(leave_run)
+
+    def add(self, tokens):
+        def change(state):
+            state["used"] = state.get("used", 0) + tokens
+        self._update(change)
+
+    def used(self):
+        # Файл пишется атомарно, читать можно без блокировки
+        return self._load().get("used", 0)
+
+
+class TokenUsage:
+    """
+    pytest-плагин учета токенов.
+
+    budget: бюджет токенов (total_tokens) на прогон, None - без ограничения
+    path: куда писать JSON с итогами (пустая строка - не писать)
+    shared: SharedBudget, через который бюджет делят воркеры и шарды прогона;
+    None - бюджет только этого процесса
+    """
+
+    def __init__(self, budget=None, path=DEFAULT_PATH, shared=None):
+        self.budget = budget
+        self.path = path
+        self.shared = shared if budget is not None else None
+        self.total = _totals()
+        self.models = defaultdict(_totals)
+        self.tests = defaultdict(_totals)
+        self.params = defaultdict(_totals)
+        self.skipped = []
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+
+    @property
+    def used(self):
+        return self.total["total_tokens"]
+
+    def spent(self):
+        """
+        Расход, который сравнивается с бюджетом: всего прогона или этого процесса.
+        """
+        return self.shared.used() if self.shared is not None else self.used
+
+    def exhausted(self):
+        return self.budget is not None and self.spent() >= self.budget
+
+    def requests_left(self):
+        """
+        Сколько запросов еще укладывается в бюджет при среднем расходе токенов
+        на ответ в этом процессе. None - бюджета нет или расход еще неизвестен.
+        """
+        if self.budget is None:
+            return None
+        left = self.budget - self.spent()
+        if left <= 0:
+            return 0
+        with self._lock:
+            requests, tokens = self.total["requests"], self.total["total_tokens"]
+        if not requests or not tokens:
+            return None
+        return int(left * requests // tokens)
+
+    def observe_record(self, record):
+        """
+        Слушатель MetricsRecorder.listeners: учитывает usage успешного ответа.
+        """
+        if record.get("status") != 200 or record.get("total_tokens") is None:
+            return
+        # Тест без значений параметризации: они учитываются отдельно в params
+        test = (record.get("test") or OUTSIDE_TEST).split("[")[0]
+        buckets = [self.total, self.models[record.get("model") or "default"], self.tests[test]]
+        buckets += [self.params[f"{name}={value}"] for name, value in record.get("params", {}).items()]
+        with self._lock:
+            for bucket in buckets:
+                bucket["requests"] += 1
+                bucket["seconds"] += record.get("total") or 0.0
+                for field in TOKEN_FIELDS:
+                    bucket[field] += record.get(field) or 0
+        if self.shared is not None:
+            self.shared.add(record.get("total_tokens") or 0)
+
+    def pytest_sessionstart(self, session):
+        if self.shared is not None:
+            self.shared.join()
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_runtest_setup(self, item):
+        if item.get_closest_marker("expensive") is None:
+            return
+        spent = self.spent()
+        if self.budget is not None and spent >= self.budget:
+            self.skipped.append(item.nodeid)
+            pytest.skip(f"Бюджет токенов исчерпан: использовано {spent} из {self.budget}")
+
+    def summary(self):
+        elapsed = time.monotonic() - self._started
+        return {
+            "budget": self.budget,
+            "used": self.used,
+            "run_used": self.spent() if self.shared is not None else None,
+            "exhausted": self.exhausted(),
+            "skipped": self.skipped,
+            "elapsed": round(elapsed, 3),
+            "run_tokens_per_sec": round(self.used / elapsed, 1) if elapsed else None,
+            "total": _with_rates(self.total),
+            "models": {model: _with_rates(totals) for model, totals in sorted(self.models.items())},
+            "tests": {test: _with_rates(totals) for test, totals in sorted(self.tests.items())},
+            "params": {param: _with_rates(totals) for param, totals in sorted(self.params.items())},
+        }
+
+    def environment(self):
+        """
+        Ключи для environment.properties отчета Allure.
+        """
+        values = {
+            "tokens.total": self.total["total_tokens"],
+            "tokens.prompt": self.total["prompt_tokens"],
+            "tokens.completion": self.total["completion_tokens"],
+        }
+        if self.budget is not None:
+            values["tokens.budget"] = self.budget
+            values["tokens.skipped_tests"] = len(self.skipped)
+        for model, totals in sorted(self.models.items()):
+            rates = _with_rates(totals)
+            values[f"tokens.{model}"] = totals["total_tokens"]
+            values[f"tokens_per_sec.{model}"] = rates["completion_tokens_per_sec"]
+        return values
+
+    def report(self):
+        total = self.total
+        lines = [f"tokens: {total['total_tokens']} (prompt {total['prompt_tokens']}, "
+                 f"completion {total['completion_tokens']}) in {total['requests']} requests"]
+        if self.budget is not None:
+            lines[0] += f", budget {self.budget}"
+            if self.shared is not None:
+                lines[0] += f" (all workers: {self.spent()})"
+            if self.skipped:
+                lines[0] += f", exhausted: {len(self.skipped)} expensive tests skipped"
+        lines.append(f"{'model':<24} {'requests':>8} {'prompt':>9} {'completion':>10} {'total':>9} "
+                     f"{'compl/s':>8} {'total/s':>8}")
+        for model, totals in sorted(self.models.items()):
+            rates = _with_rates(totals)
+            lines.append(f"{model[:24]:<24} {totals['requests']:>8} {totals['prompt_tokens']:>9} "
+                         f"{totals['completion_tokens']:>10} {totals['total_tokens']:>9} "
+                         f"{rates['completion_tokens_per_sec'] or 0:>8.1f} {rates['tokens_per_sec'] or 0:>8.1f}")
+        return "\n".join(lines)
+
+    def pytest_sessionfinish(self, session):
+        if self.shared is not None:
+            self.shared.leave()
+        if not self.total["requests"] and not self.skipped:
+            return
+        data = json.dumps(self.summary(), ensure_ascii=False, indent=1)
+        if self.path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            write_atomic(self.path, data.encode("utf-8"), mode=0o644)
+        alluredir = getattr(session.config.option, "allure_report_dir", None)
+        if alluredir:
+            update_environment(alluredir, self.environment())
+        allure_summary.report_summary("Расход токенов", [
+            ("token_usage", self.report(), allure_summary.TEXT),
+            ("token_usage.json", data, allure_summary.JSON),
+        ])
+
+    def pytest_terminal_summary(self, terminalreporter):
+        if not self.total["requests"] and not self.skipped:
+            return
+        terminalreporter.write_sep("-", "token usage")
+        for line in self.report().splitlines():
+            terminalreporter.write_line(line)
+        if self.path:
+            terminalreporter.write_line(f"details by test and parameter: {self.path}")
@@ -0,0 +1,101 @@
+"""
+Реестр валидаторов JSON схем.
+
+jsonschema.validate на каждом вызове проверяет саму схему по метасхеме и
+создает новый валидатор. Здесь валидатор для каждой схемы собирается один раз
+на процесс и кэшируется, а для частых схем (schema_chat_completion) есть
+быстрая структурная проверка. Полный валидатор запускается только если быстрая
+проверка не прошла - чтобы получить подробную ошибку. Сам jsonschema
+импортируется только тогда, когда понадобился полный валидатор.
+"""
+import threading
+
+from .profiling import phase
+from .schemas import schema_chat_completion
+
+_lock = threading.Lock()
+# id(schema) -> (schema, validator). Саму схему храним, чтобы id не переиспользовался.
+_validators = {}
+# id(schema) -> (schema, функция быстрой проверки)
+_fast_checks = {}
+
+
+def get_validator(schema):
+    """
+    Возвращает скомпилированный валидатор для схемы (с проверкой схемы по метасхеме
+    только при первом обращении).
+    """
+    cached = _validators.get(id(schema))
+    if cached is not None and cached[0] is schema:
+        return cached[1]
+    from jsonschema import validators
+
+    with _lock:
+        cls = validators.validator_for(schema)
+        cls.check_schema(schema)
+        validator = cls(schema)
+        _validators[id(schema)] = (schema, validator)
+    return validator
+
+
+def register_fast_check(schema, check):
+    """
+    Регистрирует быструю проверку для схемы. check(instance) должна возвращать True
+    только если instance гарантированно проходит схему. False означает
+    "не уверены" - тогда работает полный валидатор.
+    """
+    _fast_checks[id(schema)] = (schema, check)
+
+
+def validate(instance, schema):
+    """
+    Замена jsonschema.validate с тем же интерфейсом и теми же исключениями.
+    """
+    with phase("schema"):
+        fast = _fast_checks.get(id(schema))
+        if fast is not None and fast[0] is schema and fast[1](instance):
+            return
+        from jsonschema.exceptions import best_match
+
+        error = best_match(get_validator(schema).iter_errors(instance))
+    if error is not None:
+        raise error
+
+
+def _is_int(value):
+    # bool - подкласс int, но в JSON схеме это не integer
+    return type(value) is int
+
+
+def is_chat_completion(data):
+    """
+    Быстрая структурная проверка ответа chat/completions по schema_chat_completion.
+    """
+    if type(data) is not dict:
+        return False
+    if not (type(data.get("object")) is str and _is_int(data.get("created"))
+            and type(data.get("model")) is str):
+        return False
+
+    choices = data.get("choices")
+    if type(choices) is not list or not choices:
+        return False
+    for choice in choices:
+        if type(choice) is not dict:
+            return False
+        if not (_is_int(choice.get("index")) and type(choice.get("finish_reason")) is str):
+            return False
+        message = choice.get("message")
+        if type(message) is not dict:
+            return False
+        if not (type(message.get("role")) is str and type(message.get("content")) is str):
+            return False
+
+    usage = data.get("usage")
+    if type(usage) is not dict:
+        return False
+    return (_is_int(usage.get("prompt_tokens")) and _is_int(usage.get("completion_tokens"))
+            and _is_int(usage.get("total_tokens")))
+
+
+register_fast_check(schema_chat_completion, is_chat_completion)
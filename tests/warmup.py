@@ -0,0 +1,103 @@
+"""
+Быстрый старт прогона: фоновый прогрев и замер времени до первого запроса.
+
+Без прогрева первый тест сам ждет OAuth токен и холодное TCP+TLS соединение,
+и его задержка не похожа на установившуюся. Здесь ресурсы сессии (заглушка,
+HTTP-сессия, кэш токена, токен, соединение с API) готовятся в фоновом потоке,
+пока pytest собирает тесты, а фикстуры забирают готовое. Прогрев запускается
+только если среди выбранных тестов есть тесты API, поэтому --collect-only и
+прогоны без таких тестов сеть не трогают.
+"""
+import threading
+import time
+
+THREAD_NAME = "gigachat-warmup"
+
+
+class Warmup:
+    """
+    Последовательные шаги прогрева в одном фоновом потоке.
+
+    steps: список (имя, функция(results)); results - dict результатов уже
+    выполненных шагов. Если шаг упал, следующие не выполняются: фикстуры
+    создадут недостающие ресурсы сами и получат ту же ошибку уже в тесте.
+    """
+
+    def __init__(self, steps):
+        self.steps = steps
+        self.results = {}
+        self.timings = {}
+        self.error = None
+        self._taken = set()
+        self._thread = threading.Thread(target=self._run, name=THREAD_NAME, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        for name, step in self.steps:
+            started = time.perf_counter()
+            try:
+                self.results[name] = step(self.results)
+            except Exception as exc:
+                self.error = f"{name}: {type(exc).__name__}: {exc}"
+                return
+            finally:
+                self.timings[name] = time.perf_counter() - started
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+
+    def take(self, name):
+        """
+        Забирает результат шага name, дождавшись окончания прогрева.
+        Возвращает (True, результат) или (False, None), если шаг не выполнен.
+        Каждый результат отдается один раз - владельцем становится вызывающий.
+        """
+        self.join()
+        if name in self._taken or name not in self.results:
+            return False, None
+        self._taken.add(name)
+        return True, self.results[name]
+
+    def leftovers(self):
+        """
+        Результаты, которые так и не забрали фикстуры (их нужно закрыть).
+        """
+        self.join()
+        return [(name, result) for name, result in self.results.items() if name not in self._taken]
+
+    def stats(self):
+        return {"timings": dict(self.timings), "error": self.error}
+
+
+class StartupClock:
+    """
+    Время от старта прогона до сбора тестов, начала первого теста и первого
+    запроса к API из теста (секунды от started).
+    """
+
+    def __init__(self, started):
+        self.started = started
+        self.marks = {}
+        self.first_request = None
+
+    def mark(self, name):
+        self.marks.setdefault(name, time.perf_counter() - self.started)
+
+    def observe(self, request, response):
+        """
+        Наблюдатель GigaChatSession.add_observer: запоминает первый запрос теста
+        (запросы до начала первого теста и запросы самого прогрева не считаются).
+        """
+        if self.first_request is not None or "first_test" not in self.marks:
+            return
+        if threading.current_thread().name == THREAD_NAME:
+            return
+        self.mark("first_request")
+        timings = response.timings
+        self.first_request = {"ttfb": timings["ttfb"], "new_connection": timings["new_connection"]}
+
+    def stats(self):
+        return {"marks": dict(self.marks), "first_request": self.first_request}